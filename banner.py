@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+卡池参数声明
+每个卡池用一个字典描述，Banner在创建时把它编译成按"距上次出货抽数"索引的出货概率表，
+抽卡类、精确计算与向量化模拟都直接查表。新增同类卡池只需新增一份参数声明，不需要新的类。
+
+参数说明:
+    base_rate       基础出货(鸣潮5星/终末地6星)概率
+    rate_ramp       概率增长阶段 [(起始抽数, 结束抽数, 每抽增长)]，距上次出货第n抽的概率为
+                    base_rate + 各阶段已经过抽数 * 每抽增长
+    soft_pity       小保底 连续未出货该抽数必出货
+    hard_pity       大保底 连续未出UP该抽数必出UP (None表示没有)
+    up_rate         出货时为UP的概率
+    guarantee       大小保底 上一个出货非UP则下一个出货必定为UP
+    free_pity       每该抽数的整数倍赠送一个UP (None表示没有)
+    sub_rate        次一级(终末地5星)概率
+    sub_soft_pity   连续该抽数不出次一级或以上，则该抽必出次一级
+    ticket_yield    抽到各星级获得的武器票 {星级: 数量}
+    draw_need_ticket 武器池十连需要的武器票
+"""
+
+MC_CHARACTER_SPEC = {
+    "base_rate": 0.008,                 # 基础5星角色概率 0.8%
+    "rate_ramp": [
+        (66, 70, 0.04),                 # 第66~70抽之间每抽概率增长 4%
+        (71, 75, 0.08),                 # 第71~75抽之间每抽概率增长 8%
+        (76, 79, 0.10),                 # 第76~79抽之间每抽概率增长 10%
+    ],
+    "soft_pity": 79,                    # 小保底 79抽 (连续未出5星79抽必出5星)
+    "hard_pity": None,
+    "up_rate": 0.5,                     # up5星角色概率 50% (出5星时有50%是up)
+    "guarantee": True,                  # 上一个5星非UP，则下一个5星必定为UP
+    "free_pity": None,
+}
+
+MC_WEAPON_SPEC = {
+    "base_rate": 0.008,                 # 基础5星武器概率 0.8%
+    "rate_ramp": [
+        (66, 70, 0.04),                 # 第66~70抽之间每抽概率增长 4%
+        (71, 75, 0.08),                 # 第71~75抽之间每抽概率增长 8%
+        (76, 79, 0.10),                 # 第76~79抽之间每抽概率增长 10%
+    ],
+    "soft_pity": 79,                    # 小保底 79抽 (连续未出5星79抽必出UP5星)
+    "hard_pity": None,
+    "up_rate": 1.0,                     # up5星武器概率 100% (出5星时有100%是up)
+    "guarantee": False,
+    "free_pity": None,
+}
+
+ZMD_CHARACTER_SPEC = {
+    "base_rate": 0.008,                 # 基础6星角色概率 0.8%
+    "rate_ramp": [
+        (66, 79, 0.05),                 # 第66抽开始每抽6星概率增长 5%
+    ],
+    "soft_pity": 80,                    # 小保底 80抽 (连续未出6星80抽必出6星)
+    "hard_pity": 120,                   # 大保底 120抽 (连续未出up120抽必出up，只作用一次，出up后消失)
+    "up_rate": 0.5,                     # up6星角色概率 50% (出6星时有50%是up)
+    "guarantee": False,
+    "free_pity": 240,                   # 每240的整数倍都会送一个up (纯额外赠送，不影响其他保底机制)
+    "sub_rate": 0.08,                   # 5星角色概率 8%
+    "sub_soft_pity": 10,                # 连续10抽不出5星或以上，则第10抽必出5星
+    "ticket_yield": {6: 2000, 5: 200, 4: 20},   # 抽到6/5/4星角色获得的武器票
+}
+
+ZMD_WEAPON_SPEC = {
+    "base_rate": 0.04,                  # 基础6星武器概率 4%
+    "rate_ramp": [],
+    "soft_pity": 40,                    # 小保底 40抽 (连续未出6星40抽必出6星)
+    "hard_pity": 80,                    # 大保底 80抽 (连续未出up80抽必出up)
+    "up_rate": 0.25,                    # up6星武器概率 25% (出6星时有25%是up)
+    "guarantee": False,
+    "free_pity": None,
+    "draw_need_ticket": 1980,           # 需要1980武器票才能抽一次十连
+}
+
+# 没有大保底/赠送UP(参数为None)时编译为无穷大：
+# "距离 >= 上限"与"抽数 % 周期 == 0"的判定都不会触发，抽卡类、精确计算与向量化模拟不需要另外判断
+NO_PITY = float("inf")
+# 没有UP保底(UP概率小于1且没有大保底/赠送UP)时抽数无上界，精确计算在剩余概率低于该值时停止
+EXACT_TAIL_TOLERANCE = 1e-15
+
+def compile_pity(value):
+    return NO_PITY if value is None else value
+
+def compile_rate_table(spec):
+    """
+    把参数声明编译为出货概率表
+    返回: 列表rates, rates[n]为距上次出货第n抽的出货概率(不含大保底)，n >= soft_pity 时为1.0
+    """
+    rates = []
+    for pulls_since in range(spec["soft_pity"] + 1):
+        rate = spec["base_rate"]
+        for start, end, increase in spec["rate_ramp"]:
+            if pulls_since >= start:
+                rate += (min(pulls_since, end) - start + 1) * increase
+        if pulls_since >= spec["soft_pity"]:
+            rate = 1.0
+        rates.append(min(rate, 1.0))
+    return rates
+
+def compile_gap_cdf(rates):
+    """
+    由出货概率表计算相邻两次出货之间间隔抽数的累积分布
+    返回: 列表cdf, cdf[n-1]为间隔不超过n抽的概率(n = 1..soft_pity)
+    """
+    cdf = []
+    survive = 1.0
+    for rate in rates[1:]:
+        survive *= 1.0 - rate
+        cdf.append(1.0 - survive)
+    return cdf
+
+class Banner(object):
+    """
+    编译后的卡池：参数声明 + 出货概率表 + 出货间隔累积分布 + 大保底与赠送UP的周期(None编译为NO_PITY)
+    """
+    def __init__(self, spec, **overrides):
+        self.spec = dict(spec, **overrides)
+        self.rates = compile_rate_table(self.spec)
+        self.gap_cdf = compile_gap_cdf(self.rates)
+        self.hard_pity = compile_pity(self.spec.get("hard_pity"))
+        self.free_pity = compile_pity(self.spec.get("free_pity"))
+
+    def __getitem__(self, key):
+        return self.spec[key]
+
+    def get(self, key, default=None):
+        return self.spec.get(key, default)
+
+MC_CHARACTER = Banner(MC_CHARACTER_SPEC)
+MC_WEAPON = Banner(MC_WEAPON_SPEC)
+ZMD_CHARACTER = Banner(ZMD_CHARACTER_SPEC)
+ZMD_WEAPON = Banner(ZMD_WEAPON_SPEC)
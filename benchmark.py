@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准
+    单抽吞吐:   各抽卡类的pull_one / pull_ten，每秒抽数
+    整次模拟:   各模块的single_simulation与两个组合的single_simulation_combined，每秒模拟次数与每秒抽数
+    报告:       各模块根据1万次模拟的直方图生成报告(输出丢弃)，每秒报告数
+    并行扩展:   1..N个进程运行相同的批次，每秒模拟次数、加速比与并行效率
+    内存:       每项之后记录本进程与子进程的峰值常驻内存(resource.getrusage)
+结果写入JSON文件，便于对比不同版本或机器
+
+用法:
+    python benchmark.py [--pulls 200000] [--simulations 20000] [--processes 4] [--output benchmark_results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+from timeit import default_timer
+import mc_character
+import mc_weapon
+import zmd_character
+import zmd_weapon
+import mc_mix
+import zmd_mix
+from gacha_rng import derive_seed, split_batches
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.json")
+BENCHMARK_SEED = 20240101
+
+def peak_rss():
+    """
+    峰值常驻内存(KB): (本进程, 已回收的子进程中的最大值)
+    """
+    scale = 1024 if sys.platform == "darwin" else 1     # macOS的ru_maxrss单位为字节
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale)
+
+def _record(name, seconds, **counts):
+    """
+    一项结果: 用时、计数以及每秒计数
+    """
+    self_rss, children_rss = peak_rss()
+    result = {"name": name, "seconds": seconds, "peak_rss_kb": self_rss, "peak_rss_children_kb": children_rss}
+    for key, value in counts.items():
+        result[key] = value
+        result[key + "_per_sec"] = value / seconds if seconds > 0 else None
+    return result
+
+def bench_pull(name, gacha, method, num_calls, pulls_per_call):
+    """
+    在同一个实例上连续调用num_calls次抽卡方法
+    """
+    pull = getattr(gacha, method)
+    start = default_timer()
+    for _ in range(num_calls):
+        pull()
+    return _record(name, default_timer() - start, pulls=num_calls * pulls_per_call)
+
+def bench_simulation(name, simulate_one, num_simulations):
+    """
+    连续模拟num_simulations次，simulate_one()返回一次模拟的抽数
+    """
+    start = default_timer()
+    total_pulls = 0
+    for _ in range(num_simulations):
+        total_pulls += simulate_one()
+    return _record(name, default_timer() - start, simulations=num_simulations, pulls=total_pulls)
+
+class _Discard(object):
+    def write(self, text):
+        pass
+
+def bench_report(name, report, repeats):
+    """
+    重复生成报告repeats次，输出丢弃
+    """
+    stdout = sys.stdout
+    sys.stdout = _Discard()
+    try:
+        start = default_timer()
+        for _ in range(repeats):
+            report()
+        seconds = default_timer() - start
+    finally:
+        sys.stdout = stdout
+    return _record(name, seconds, reports=repeats)
+
+def bench_scaling(max_processes, num_simulations, batch_size):
+    """
+    用1..max_processes个进程运行mc_character获得1只UP的相同批次(进程池创建不计入用时)
+    """
+    tasks = [(1, size, derive_seed(BENCHMARK_SEED, batch_index))
+             for batch_index, size in split_batches(num_simulations, batch_size)]
+    results = []
+    for processes in range(1, max_processes + 1):
+        pool = Pool(processes=processes)
+        try:
+            start = default_timer()
+            for _ in pool.imap_unordered(mc_character.simulate_batch, tasks):
+                pass
+            seconds = default_timer() - start
+        finally:
+            pool.close()
+            pool.join()
+        result = _record("scaling_{}".format(processes), seconds, simulations=num_simulations)
+        result["processes"] = processes
+        result["speedup"] = results[0]["seconds"] / seconds if results else 1.0
+        result["efficiency"] = result["speedup"] / processes
+        results.append(result)
+    return results
+
+def run_benchmarks(num_pulls=200000, num_simulations=20000, max_processes=None, report_repeats=20,
+                   scaling_simulations=None, batch_size=2000, verbose=True):
+    """
+    运行全部基准，返回可JSON序列化的结果
+    """
+    max_processes = max_processes or cpu_count()
+    scaling_simulations = scaling_simulations or num_simulations * 5
+    rng = random.Random(BENCHMARK_SEED)
+
+    def run(bench, *args):
+        result = bench(*args)
+        if verbose:
+            print("{:<40} {:>8.3f}秒  ".format(result["name"], result["seconds"]) +
+                  "  ".join("{}/秒 {:.0f}".format(key[:-8], value)
+                            for key, value in sorted(result.items()) if key.endswith("_per_sec")))
+        return result
+
+    results = []
+    # 单抽吞吐
+    results.append(run(bench_pull, "mc_character.pull_one", mc_character.GachaCharacter(rng=rng), "pull_one",
+                       num_pulls, 1))
+    results.append(run(bench_pull, "mc_weapon.pull_one", mc_weapon.GachaWeapon(rng=rng), "pull_one", num_pulls, 1))
+    results.append(run(bench_pull, "zmd_character.pull_one", zmd_character.GachaCharacter(rng=rng), "pull_one",
+                       num_pulls, 1))
+    results.append(run(bench_pull, "zmd_weapon.pull_ten", zmd_weapon.GachaWeapon(rng=rng), "pull_ten",
+                       num_pulls // 10, 10))
+
+    # 整次模拟
+    for module in (mc_character, mc_weapon, zmd_character, zmd_weapon):
+        results.append(run(bench_simulation, "{}.single_simulation".format(module.__name__),
+                           lambda module=module: module.single_simulation(1, rng=rng), num_simulations))
+    for module in (mc_mix, zmd_mix):
+        results.append(run(bench_simulation, "{}.single_simulation_combined".format(module.__name__),
+                           lambda module=module: module.single_simulation_combined((1, 1), rng=rng),
+                           num_simulations))
+
+    # 报告
+    for module in (mc_character, mc_weapon, zmd_character, zmd_weapon):
+        histogram = module.simulate_batch((1, 10000, BENCHMARK_SEED)).counts
+        results.append(run(bench_report, "{}.create_histogram_report".format(module.__name__),
+                           lambda module=module, histogram=histogram: module.create_histogram_report(
+                               histogram, 1, 10000), report_repeats))
+    for module in (mc_mix, zmd_mix):
+        histogram = module.simulate_batch_combined((1, 1, 10000, BENCHMARK_SEED)).counts
+        results.append(run(bench_report, "{}.create_histogram_report".format(module.__name__),
+                           lambda module=module, histogram=histogram: module.create_histogram_report(
+                               histogram, 1, 1, 10000), report_repeats))
+
+    # 并行扩展
+    scaling = bench_scaling(max_processes, scaling_simulations, batch_size)
+    if verbose:
+        for result in scaling:
+            print("{}个进程: {:.0f}次模拟/秒, 加速比{:.2f}, 效率{:.0%}".format(
+                result["processes"], result["simulations_per_sec"], result["speedup"], result["efficiency"]))
+
+    self_rss, children_rss = peak_rss()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": cpu_count(),
+        "parameters": {
+            "pulls": num_pulls,
+            "simulations": num_simulations,
+            "report_repeats": report_repeats,
+            "scaling_simulations": scaling_simulations,
+            "batch_size": batch_size,
+        },
+        "results": results,
+        "scaling": scaling,
+        "peak_rss_kb": self_rss,
+        "peak_rss_children_kb": children_rss,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="抽卡模拟性能基准")
+    parser.add_argument("--pulls", type=int, default=200000, help="单抽吞吐测试的抽数")
+    parser.add_argument("--simulations", type=int, default=20000, help="整次模拟测试的模拟次数")
+    parser.add_argument("--processes", type=int, default=None, help="并行扩展测试的最大进程数，默认为CPU核数")
+    parser.add_argument("--report-repeats", type=int, default=20, help="报告测试的重复次数")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果JSON文件路径")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.pulls, args.simulations, args.processes, args.report_repeats)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("峰值内存: 本进程{}KB, 子进程{}KB".format(results["peak_rss_kb"], results["peak_rss_children_kb"]))
+    print("已保存: {}".format(args.output))
+
+if __name__ == "__main__":
+    main()
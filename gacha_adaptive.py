@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+自适应停止
+按轮提交模拟批次，每轮合并后检查期望与各分位数的置信区间，全部不超过容差时停止，否则继续直到上限。
+批次的划分和种子与固定次数的模拟相同，每轮的批次数固定(与进程数无关)，每轮等全部批次完成后才检查，
+因此停止位置只取决于主种子、batch_size与每轮批次数
+"""
+import math
+from gacha_stats import PullHistogram, histogram_value_at
+
+# 检查的分位数(%)，与报告中列出的分位数一致
+ADAPTIVE_PERCENTILES = [10, 25, 50, 75, 90]
+# 95%置信水平对应的正态分位数
+Z_95 = 1.959963984540054
+# 每轮的批次数，只在每轮结束时检查是否收敛；不能取进程数，否则停止位置会随机器变化
+ROUND_BATCHES = 4
+
+def mean_half_width(histogram, z=Z_95):
+    """
+    期望的置信区间半宽(正态近似)
+    """
+    if histogram.n <= 1:
+        return float("inf")
+    return z * math.sqrt(histogram.variance() / (histogram.n - 1))
+
+def percentile_half_width(histogram, p, z=Z_95):
+    """
+    p%分位数的置信区间半宽
+    不依赖分布的次序统计量区间：第k小样本不超过真实分位数的个数服从Binomial(n, q)，
+    按正态近似取排名 nq ± z*sqrt(nq(1-q)) 处的两个样本作为区间端点
+    """
+    n = histogram.n
+    if n <= 1:
+        return float("inf")
+    q = p / 100.0
+    spread = z * math.sqrt(n * q * (1 - q))
+    lower_rank = int(math.floor(n * q - spread))
+    upper_rank = int(math.ceil(n * q + spread))
+    if lower_rank < 0 or upper_rank > n - 1:
+        return float("inf")
+    lower = histogram_value_at(histogram.counts, lower_rank)
+    upper = histogram_value_at(histogram.counts, upper_rank)
+    return (upper - lower) / 2.0
+
+def half_widths(histogram, percentiles=ADAPTIVE_PERCENTILES, z=Z_95):
+    """
+    期望与各分位数的置信区间半宽
+    返回: [("期望", 半宽), ("P10", 半宽), ...]
+    """
+    result = [("期望", mean_half_width(histogram, z))]
+    for p in percentiles:
+        result.append(("P{}".format(p), percentile_half_width(histogram, p, z)))
+    return result
+
+def run_until_converged(pool, worker, make_task, max_simulations, batch_size, tolerance, round_batches=ROUND_BATCHES):
+    """
+    分轮模拟直到所有置信区间半宽都不超过tolerance，或达到max_simulations次
+    worker(task)返回PullHistogram；make_task(批次序号, 本批次数)生成任务，批次划分与split_batches一致
+    每轮round_batches批，只在轮与轮之间检查是否收敛
+    返回: (合并后的PullHistogram, half_widths结果, 是否收敛)
+    """
+    histogram = PullHistogram()
+    widths = half_widths(histogram)
+    batch_index = 0
+    while batch_index * batch_size < max_simulations:
+        tasks = []
+        while len(tasks) < round_batches and batch_index * batch_size < max_simulations:
+            start = batch_index * batch_size
+            tasks.append(make_task(batch_index, min(batch_size, max_simulations - start)))
+            batch_index += 1
+        for partial in pool.imap_unordered(worker, tasks):
+            histogram.merge(partial)
+
+        widths = half_widths(histogram)
+        if all(width <= tolerance for _, width in widths):
+            return histogram, widths, True
+    return histogram, widths, False
+
+def print_convergence_summary(histogram, widths, tolerance, converged):
+    """
+    打印自适应停止的结果
+    """
+    if converged:
+        print("自适应停止: 模拟{}次后所有95%置信区间半宽不超过{}抽".format(histogram.n, tolerance))
+    else:
+        print("自适应停止: 达到模拟次数上限{}次，仍有置信区间半宽超过{}抽".format(histogram.n, tolerance))
+    print("置信区间半宽: " + ", ".join("{} ±{:.2f}".format(name, width) for name, width in widths))
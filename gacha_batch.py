@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+各模块共用的批量模拟驱动
+simulate为模块级的单次模拟函数(single_simulation / single_simulation_combined)，按
+simulate(目标, rng=..., metrics=..., details=..., record_all=...) 调用，目标为UP数量或(角色数, 武器数)
+模块级函数按模块与函数名序列化，可以直接放在进程池任务的参数中，因此进程池任务都在本模块中定义，
+各模块只保留被其他模块当作进程池任务使用的薄包装(simulate_batch等)
+单卡池模块simulate_gacha_distribution的各运行方式也在本模块中：distribution_mode按参数选出唯一的运行方式
+(不支持的组合直接报错)，DISTRIBUTION_MODES为运行方式到处理函数的分派表
+"""
+import random
+from array import array
+from timeit import default_timer
+from gacha_stats import PullHistogram, SAMPLE_TYPECODE, samples_to_bytes, samples_from_bytes, pmf_to_histogram
+from gacha_rng import derive_seed, batch_rng, split_batches, locate_simulation
+from gacha_metrics import Metrics
+from gacha_samples import SampleFile, create_sample_file, write_batch
+from gacha_variance import SimulationEstimate, simulate_estimate_batch, print_estimate_summary
+from gacha_adaptive import run_until_converged, print_convergence_summary
+from gacha_cache import cached_value, cached_histogram
+
+def simulate_batch(args):
+    """
+    进程池任务：(simulate, 目标, 本批次数, 种子[, 是否启用计数器])
+    用本批的种子创建独立的随机数生成器，在进程内连续模拟，结果累加为直方图后返回
+    启用计数器时返回 (直方图, 计数器字典)
+    """
+    simulate, target, batch_size, seed = args[:4]
+    metrics = Metrics() if len(args) > 4 and args[4] else None
+    start = default_timer()
+    rng = random.Random(seed)
+    histogram = PullHistogram()
+    for _ in range(batch_size):
+        histogram.add(simulate(target, rng=rng, metrics=metrics))
+    if metrics is not None:
+        metrics.add_time("simulate", default_timer() - start)
+        return histogram, metrics.as_dict()
+    return histogram
+
+def simulate_batch_multi(args):
+    """
+    进程池任务：(simulate, 目标列表, 本批次数, 种子[, 是否启用计数器])，仅用于单卡池
+    每次模拟只跑到最大目标(record_all=True)，同时累加每个目标的直方图
+    返回: 与目标列表一一对应的直方图列表；启用计数器时返回 (直方图列表, 计数器字典)
+    """
+    simulate, target_up_counts, batch_size, seed = args[:4]
+    metrics = Metrics() if len(args) > 4 and args[4] else None
+    start = default_timer()
+    rng = random.Random(seed)
+    max_up_count = max(target_up_counts)
+    histograms = [PullHistogram() for _ in target_up_counts]
+    for _ in range(batch_size):
+        pulls_at_up = simulate(max_up_count, record_all=True, rng=rng, metrics=metrics)
+        for histogram, target_up_count in zip(histograms, target_up_counts):
+            histogram.add(pulls_at_up[target_up_count - 1] if target_up_count > 0 else 0)
+    if metrics is not None:
+        metrics.add_time("simulate", default_timer() - start)
+        return histograms, metrics.as_dict()
+    return histograms
+
+def simulate_batch_estimate(args):
+    """
+    进程池任务：(simulate, 目标, 本批次数, 种子, 方差缩减方法, 批次序号)
+    返回带标准误差统计量的gacha_variance.SimulationEstimate
+    """
+    simulate, target, batch_size, seed, method, batch_index = args
+    return simulate_estimate_batch(lambda rng: simulate(target, rng=rng), method, batch_size, seed, batch_index)
+
+def run_batches(pool, simulate, target, master_seed, batches):
+    """
+    在进程池中执行指定的批次 [(批次序号, 本批次数)]，返回合并后的直方图
+    """
+    tasks = [(simulate, target, size, derive_seed(master_seed, batch_index)) for batch_index, size in batches]
+    histogram = PullHistogram()
+    for partial in pool.imap_unordered(simulate_batch, tasks):
+        histogram.merge(partial)
+    return histogram
+
+def sample_batch(args):
+    """
+    进程池任务：(simulate, 目标, 本批次数, 种子)
+    模拟一批并按顺序保留每次模拟的抽数，返回array('H')打包的字节块
+    """
+    simulate, target, batch_size, seed = args
+    rng = random.Random(seed)
+    samples = array(SAMPLE_TYPECODE)
+    for _ in range(batch_size):
+        samples.append(simulate(target, rng=rng))
+    return samples_to_bytes(samples)
+
+def simulate_samples(pool, simulate, target, master_seed, num_simulations, batch_size=10000):
+    """
+    在进程池中模拟并收集每次模拟的抽数，按模拟序号排列(第i个与replay_simulation的第i次一致)
+    返回: array('H')，每个样本2字节(整数列表每项至少8字节)，进程间传输不需要逐个序列化整数
+    """
+    tasks = [(simulate, target, size, derive_seed(master_seed, batch_index))
+             for batch_index, size in split_batches(num_simulations, batch_size)]
+    samples = array(SAMPLE_TYPECODE)
+    for block in pool.imap(sample_batch, tasks):
+        samples_from_bytes(block, samples)
+    return samples
+
+def sample_batch_to_file(args):
+    """
+    进程池任务：(simulate, 模块的SAMPLE_FIELDS, 样本文件路径, 目标, 起始序号, 本批次数, 种子)
+    模拟一批，结果直接写入样本文件(gacha_samples)中本批的位置
+    """
+    simulate, available_fields, path, target, start, batch_size, seed = args
+    rng = random.Random(seed)
+    write_batch(path, start, batch_size, lambda: simulate(target, rng=rng, details=True), available_fields)
+
+def simulate_samples_to_file(pool, simulate, available_fields, path, target, master_seed, num_simulations,
+                             batch_size=10000, fields=("pulls",), **info):
+    """
+    在进程池中模拟，每次模拟的结果按模拟序号写入预分配的内存映射样本文件，主进程不保存样本
+    :param available_fields: 模块的SAMPLE_FIELDS，与simulate(details=True)返回的元组一一对应
+    :param fields: 保存的字段，可选available_fields
+    :param info: 写入文件头部的运行信息(如模块名)
+    返回: 只读打开的gacha_samples.SampleFile(可直接传给各模块的create_distribution_report)
+    """
+    create_sample_file(path, num_simulations, fields, available_fields,
+                       target=list(target) if isinstance(target, tuple) else target,
+                       seed=master_seed, batch_size=batch_size, **info)
+    tasks = [(simulate, available_fields, path, target, batch_index * batch_size, size,
+              derive_seed(master_seed, batch_index))
+             for batch_index, size in split_batches(num_simulations, batch_size)]
+    for _ in pool.imap_unordered(sample_batch_to_file, tasks):
+        pass
+    return SampleFile(path)
+
+def replay_simulation(simulate, target, master_seed, index, batch_size=10000, **kwargs):
+    """
+    重放主种子为master_seed的模拟中第index次(从0开始)的结果，batch_size需与原模拟一致
+    kwargs传给最后一次simulate调用(如record_all)
+    """
+    batch_index, offset = locate_simulation(index, batch_size)
+    rng = batch_rng(master_seed, batch_index)
+    for _ in range(offset):
+        simulate(target, rng=rng)
+    return simulate(target, rng=rng, **kwargs)
+
+# simulate_gacha_distribution中互斥的模拟方式，设置其中一个选项即使用该方式
+OPTION_MODES = ("variance_reduction", "tolerance", "cache", "samples_path", "raw_samples")
+# 需要进程池的运行方式
+POOL_MODES = ("single_pass", "simulation") + OPTION_MODES
+# 各运行方式可以同时使用的其他选项
+MODE_OPTIONS = {
+    "exact": ("cache",),
+    "vectorized": (),
+    "single_pass": ("metrics_path",),
+    "simulation": ("metrics_path",),
+    "variance_reduction": (),
+    "tolerance": (),
+    "cache": (),
+    "samples_path": ("sample_fields",),
+    "raw_samples": (),
+}
+
+def distribution_mode(modes, engine="simulation", single_pass=None, **options):
+    """
+    按simulate_gacha_distribution的参数选出运行方式，组合不受支持时抛出ValueError
+    :param modes: 模块支持的运行方式(模块的分派表)
+    :param engine: "simulation"时按选项确定模拟方式，其他值为该计算方式本身(如"exact")
+    :param single_pass: None为不设置选项时使用单趟模式；True要求单趟模式，False为逐个目标普通模拟(不使用单趟模式)
+    :param options: 各选项的值，None与False视为未设置
+    :return: 运行方式名称(DISTRIBUTION_MODES的键)
+    """
+    chosen = sorted(name for name, value in options.items() if value is not None and value is not False)
+    if engine != "simulation":
+        if engine not in modes or engine in POOL_MODES:
+            raise ValueError("不支持的计算方式: {}".format(engine))
+        mode = engine
+        if single_pass:
+            chosen.append("single_pass")
+    else:
+        selected = [name for name in OPTION_MODES if name in chosen]
+        if len(selected) > 1:
+            raise ValueError("{}不能同时使用".format(", ".join(selected)))
+        if selected:
+            mode = selected[0]
+            if single_pass:
+                chosen.append("single_pass")
+        else:
+            mode = "simulation" if single_pass is False else "single_pass"
+    unsupported = [name for name in chosen if name != mode and name not in MODE_OPTIONS[mode]]
+    if unsupported:
+        raise ValueError("{}不支持: {}".format(mode, ", ".join(unsupported)))
+    return mode
+
+class DistributionRun(object):
+    """
+    simulate_gacha_distribution一次运行的参数与状态，传给分派表中的处理函数
+    module为单卡池模块(提供single_simulation、simulate_batch_multi、cache_params、calculate_exact_distribution、
+    create_histogram_report、create_distribution_report与SAMPLE_FIELDS)，name为写入文件的模块名
+    组合模块(mc_mix/zmd_mix)的main也用它传递参数，处理函数直接使用组合模块自己的函数，module为None
+    """
+    def __init__(self, module, name, pool, target_up_counts, master_seed, num_simulations, batch_size, metrics=None,
+                 **options):
+        self.module = module
+        self.name = name
+        self.pool = pool
+        self.target_up_counts = target_up_counts
+        self.master_seed = master_seed
+        self.num_simulations = num_simulations
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.options = options
+        self.single_pass_histograms = None      # 单趟模式：所有目标的直方图，第一个目标时计算
+        self.previous_estimate = None           # 方差缩减：上一目标的结果，用于报告两目标之差
+
+    def batch_tasks(self, target, *extra):
+        """
+        固定次数模拟的全部批次任务 (single_simulation, 目标, 本批次数, 种子, *extra)
+        """
+        return [(self.module.single_simulation, target, size, derive_seed(self.master_seed, batch_index)) + extra
+                for batch_index, size in split_batches(self.num_simulations, self.batch_size)]
+
+    def merge_metrics(self, partial):
+        """
+        启用计数器时拆出任务返回的计数器字典并合并，返回结果部分
+        """
+        if self.metrics is None:
+            return partial
+        partial, counts = partial
+        self.metrics.merge(counts)
+        return partial
+
+def run_exact(run, target_up_count):
+    """
+    马尔可夫链/动态规划精确计算(可使用结果缓存)
+    """
+    module = run.module
+    pmf = cached_value(run.options.get("cache"), module.cache_params(target_up_count, "exact"),
+                       lambda: module.calculate_exact_distribution(target_up_count))
+    module.create_histogram_report(pmf_to_histogram(pmf, run.num_simulations), target_up_count, run.num_simulations)
+
+def run_single_pass(run, target_up_count):
+    """
+    单趟模式：每次模拟跑到最大目标并记录每个UP的抽数，一批模拟得到所有目标的直方图
+    """
+    if run.single_pass_histograms is None:
+        run.single_pass_histograms = {}
+        try:
+            histograms = [PullHistogram() for _ in run.target_up_counts]
+            for partial in run.pool.imap_unordered(simulate_batch_multi,
+                                                   run.batch_tasks(run.target_up_counts, run.metrics is not None)):
+                for histogram, part in zip(histograms, run.merge_metrics(partial)):
+                    histogram.merge(part)
+            run.single_pass_histograms = dict(zip(run.target_up_counts, histograms))
+        except Exception as e:
+            print("并行计算出错: {}".format(e))
+    if target_up_count in run.single_pass_histograms:
+        run.module.create_histogram_report(run.single_pass_histograms[target_up_count].counts, target_up_count,
+                                           run.num_simulations)
+
+def run_simulation(run, target_up_count):
+    """
+    普通模拟：每个任务模拟一批并在进程内累加直方图，主进程只合并
+    """
+    try:
+        histogram = PullHistogram()
+        for partial in run.pool.imap_unordered(simulate_batch,
+                                               run.batch_tasks(target_up_count, run.metrics is not None)):
+            histogram.merge(run.merge_metrics(partial))
+    except Exception as e:
+        print("并行计算出错: {}".format(e))
+        return
+    run.module.create_histogram_report(histogram.counts, target_up_count, run.num_simulations)
+
+def run_variance_reduction(run, target_up_count):
+    """
+    方差缩减：按所选方法模拟，报告标准误差及与上一目标之差(共同随机数)
+    """
+    method = run.options["variance_reduction"]
+    try:
+        tasks = [(run.module.single_simulation, target_up_count, size, derive_seed(run.master_seed, batch_index),
+                  method, batch_index)
+                 for batch_index, size in split_batches(run.num_simulations, run.batch_size)]
+        estimate = SimulationEstimate(method)
+        for partial in run.pool.imap_unordered(simulate_batch_estimate, tasks):
+            estimate.merge(partial)
+    except Exception as e:
+        print("并行计算出错: {}".format(e))
+        return
+    run.module.create_histogram_report(estimate.histogram.counts, target_up_count, run.num_simulations)
+    print_estimate_summary(estimate, run.previous_estimate)
+    run.previous_estimate = estimate
+
+def run_tolerance(run, target_up_count):
+    """
+    自适应停止：分轮模拟，容易收敛的目标提前结束
+    """
+    tolerance = run.options["tolerance"]
+    try:
+        histogram, half_widths, converged = run_until_converged(
+            run.pool, simulate_batch,
+            lambda batch_index, size: (run.module.single_simulation, target_up_count, size,
+                                       derive_seed(run.master_seed, batch_index)),
+            run.num_simulations, run.batch_size, tolerance)
+    except Exception as e:
+        print("并行计算出错: {}".format(e))
+        return
+    run.module.create_histogram_report(histogram.counts, target_up_count, histogram.n)
+    print_convergence_summary(histogram, half_widths, tolerance, converged)
+
+def run_cache(run, target_up_count):
+    """
+    结果缓存：已有足够样本时直接报告，否则只补充缺少的批次
+    """
+    module = run.module
+    try:
+        histogram = cached_histogram(
+            run.options["cache"], module.cache_params(target_up_count, "simulation"), run.num_simulations,
+            run.batch_size, run.master_seed,
+            lambda seed, batches: run_batches(run.pool, module.single_simulation, target_up_count, seed, batches))
+    except Exception as e:
+        print("并行计算出错: {}".format(e))
+        return
+    module.create_histogram_report(histogram.counts, target_up_count, histogram.n)
+
+def run_samples_path(run, target_up_count):
+    """
+    样本文件：每次模拟的结果写入内存映射文件(路径可含{target})，报告从文件分块流式统计
+    """
+    module = run.module
+    path = run.options["samples_path"].format(target=target_up_count)
+    try:
+        sample_file = simulate_samples_to_file(
+            run.pool, module.single_simulation, module.SAMPLE_FIELDS, path, target_up_count, run.master_seed,
+            run.num_simulations, run.batch_size, run.options.get("sample_fields") or ("pulls",), module=run.name)
+    except Exception as e:
+        print("并行计算出错: {}".format(e))
+        return
+    with sample_file:
+        module.create_distribution_report(sample_file, target_up_count, run.num_simulations)
+    print("样本已保存: {}".format(path))
+
+def run_raw_samples(run, target_up_count):
+    """
+    保留原始样本：收集每次模拟的抽数(紧凑存储)，由create_distribution_report生成报告
+    """
+    try:
+        samples = simulate_samples(run.pool, run.module.single_simulation, target_up_count, run.master_seed,
+                                   run.num_simulations, run.batch_size)
+    except Exception as e:
+        print("并行计算出错: {}".format(e))
+        return
+    run.module.create_distribution_report(samples, target_up_count, run.num_simulations)
+
+# 运行方式 -> 处理函数(run, 目标)，模块在此基础上增加自己的计算方式(如"vectorized")
+DISTRIBUTION_MODES = {
+    "exact": run_exact,
+    "single_pass": run_single_pass,
+    "simulation": run_simulation,
+    "variance_reduction": run_variance_reduction,
+    "tolerance": run_tolerance,
+    "cache": run_cache,
+    "samples_path": run_samples_path,
+    "raw_samples": run_raw_samples,
+}
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+计算结果的磁盘缓存
+以 卡池参数 + 目标 + 计算方式 的哈希为键，每个条目保存为一个JSON文件：
+    精确计算保存概率分布，模拟保存PullHistogram以及主种子、batch_size和下一批的序号，
+    再次请求更多模拟次数时只补充缺少的批次(沿用同一主种子继续派生)，不重新模拟已有的部分
+缓存总大小超过上限时按最近使用时间(文件修改时间，读取时更新)淘汰最旧的条目
+"""
+import hashlib
+import json
+import os
+import time
+from gacha_stats import PullHistogram
+from gacha_rng import split_batches
+
+# 模拟逻辑或条目格式变化时修改，使旧条目失效
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".gacha_cache")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def cache_key(params):
+    """
+    参数字典的哈希(键顺序无关)
+    """
+    text = json.dumps(dict(params, version=CACHE_VERSION), sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ResultCache(object):
+    """
+    目录中的JSON条目，文件名为参数哈希
+    """
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, params):
+        """
+        读取参数对应的条目，不存在时返回None
+        """
+        path = self._path(cache_key(params))
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        # 更新修改时间，作为最近使用时间
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def store(self, params, entry):
+        """
+        写入条目(先写临时文件再改名，避免留下不完整的文件)，然后按大小上限淘汰
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = self._path(cache_key(params))
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "w") as f:
+            json.dump(dict(entry, params=params), f)
+        os.rename(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        总大小超过上限时从最久未使用的条目开始删除
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """
+        删除所有条目
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+
+def cached_value(cache, params, compute):
+    """
+    精确计算结果的缓存：命中时直接返回，否则调用compute()计算并保存(结果需可JSON序列化)
+    """
+    if cache is None:
+        return compute()
+    entry = cache.load(params)
+    if entry is not None:
+        return entry["value"]
+    value = compute()
+    cache.store(params, {"value": value, "created": time.time()})
+    return value
+
+def cached_histogram(cache, params, num_simulations, batch_size, master_seed, run_batches):
+    """
+    模拟结果的缓存：已有样本不少于num_simulations时直接返回，否则只补充缺少的部分
+    run_batches(master_seed, [(批次序号, 本批次数)])返回这些批次合并后的PullHistogram；
+    补充时沿用条目中的主种子与batch_size，从下一批的序号继续
+    返回: PullHistogram (样本数可能多于num_simulations)
+    """
+    if cache is None:
+        return run_batches(master_seed, split_batches(num_simulations, batch_size))
+
+    entry = cache.load(params)
+    if entry is None:
+        histogram = PullHistogram()
+        next_batch = 0
+    else:
+        histogram = PullHistogram.from_dict(entry["histogram"])
+        master_seed = entry["master_seed"]
+        batch_size = entry["batch_size"]
+        next_batch = entry["next_batch"]
+
+    missing = num_simulations - histogram.n
+    if missing > 0:
+        batches = [(next_batch + batch_index, size) for batch_index, size in split_batches(missing, batch_size)]
+        histogram.merge(run_batches(master_seed, batches))
+        next_batch += len(batches)
+        cache.store(params, {
+            "histogram": histogram.as_dict(),
+            "master_seed": master_seed,
+            "batch_size": batch_size,
+            "next_batch": next_batch,
+            "created": time.time(),
+        })
+    return histogram
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+多卡池抽卡计划
+按顺序抽取若干期卡池，每期有自己的目标UP数量和可选的抽数上限(达到上限仍未达成则放弃该期，转到下一期)。
+每个卡池类型是一条保底"轨道"，轨道状态在同类卡池之间继承：
+    mc_character:  (距上次5星的抽数, 上一个5星是否为UP)   小保底与大小保底都继承
+    mc_weapon:     (距上次5星的抽数,)
+    zmd_character: (距上次6星的抽数,)   只继承6星小保底；大保底(has_hard_pity)与每240抽赠送UP按期计算
+    zmd_weapon:    (距上次6星的抽数,)   只继承6星小保底；大保底(距上次UP的抽数)按期计算，只能十连抽
+每期对每个起始状态做一次精确的逐抽动态规划(逐抽的状态转移即各模块精确计算所用的pull_transitions)，
+得到 (结束状态, 是否达成) 的抽数分布(按起始状态缓存)，
+再把整个计划的 (各轨道状态, 是否全部达成) 分布逐期传递下去，不需要对每个玩家从头模拟
+"""
+import math
+import mc_character
+import mc_weapon
+import zmd_character
+import zmd_weapon
+from gacha_stats import convolve_pmf, pmf_to_histogram, histogram_mean, histogram_percentile, histogram_variance
+
+# 每种卡池: (抽卡类, 初始轨道状态, 每次抽卡的抽数粒度, 逐抽的状态转移)
+# 状态转移与各模块的精确计算共用同一个函数(pull_transitions)
+CAMPAIGN_POOLS = {
+    "mc_character": (mc_character.GachaCharacter, (0, True), 1, mc_character.pull_transitions),
+    "mc_weapon": (mc_weapon.GachaWeapon, (0,), 1, mc_weapon.pull_transitions),
+    "zmd_character": (zmd_character.GachaCharacter, (0,), 1, zmd_character.pull_transitions),
+    "zmd_weapon": (zmd_weapon.GachaWeapon, (0,), 10, zmd_weapon.pull_transitions),
+}
+
+# 各卡池类型默认参数的抽卡实例(只读取参数)
+_gachas = {}
+# 单期结果缓存 {(卡池类型, 目标, 抽数上限, 起始轨道状态): {(结束轨道状态, 是否达成): pmf}}
+_outcome_cache = {}
+
+def _gacha(pool):
+    if pool not in _gachas:
+        _gachas[pool] = CAMPAIGN_POOLS[pool][0]()
+    return _gachas[pool]
+
+def _banner_start(pool, track_state):
+    """
+    轨道状态 -> 本期的起始状态(加上按期计算的保底)
+    """
+    if pool == "zmd_character":
+        return (track_state[0], True)   # (距上次6星的抽数, 是否还有大保底)
+    if pool == "zmd_weapon":
+        return (track_state[0], 0)      # (距上次6星的抽数, 距上次UP的抽数)
+    return track_state
+
+def _banner_end(pool, banner_state):
+    """
+    本期的结束状态 -> 继承到下一期的轨道状态
+    """
+    if pool in ("zmd_character", "zmd_weapon"):
+        return (banner_state[0],)
+    return banner_state
+
+def banner_outcomes(pool, target_up_count, track_state, max_pulls=None):
+    """
+    从轨道状态track_state出发抽一期卡池，直到获得target_up_count个UP或本期抽数达到max_pulls
+    十连卡池在整个十连抽完后才结算(中途达成时剩余的抽数照常推进保底)
+    返回: {(结束轨道状态, 是否达成): pmf} pmf[n]为本期恰好抽n抽后以该状态结束的概率(按起始状态缓存)
+    """
+    key = (pool, target_up_count, max_pulls, track_state)
+    if key in _outcome_cache:
+        return _outcome_cache[key]
+
+    gacha = _gacha(pool)
+    granularity, pull_transitions = CAMPAIGN_POOLS[pool][2:]
+    if max_pulls is not None and max_pulls % granularity:
+        raise ValueError("{} 的抽数上限必须是{}的倍数".format(pool, granularity))
+
+    outcomes = {}
+    # {(本期状态, 已获得UP数): 概率}，已获得UP数在达到目标后不再增加
+    states = {(_banner_start(pool, track_state), 0): 1.0}
+    current_pull = 0
+    while states:
+        if current_pull % granularity == 0:
+            # 结算已达成或已到抽数上限的状态
+            for (banner_state, up_count), prob in list(states.items()):
+                if up_count >= target_up_count:
+                    reached = True
+                elif max_pulls is not None and current_pull >= max_pulls:
+                    reached = False
+                else:
+                    continue
+                pmf = outcomes.setdefault((_banner_end(pool, banner_state), reached), [])
+                while len(pmf) <= current_pull:
+                    pmf.append(0.0)
+                pmf[current_pull] += prob
+                del states[(banner_state, up_count)]
+            if not states:
+                break
+
+        current_pull += 1
+        next_states = {}
+        for (banner_state, up_count), prob in states.items():
+            for next_state, transition_prob, up_gained in pull_transitions(gacha, banner_state, current_pull):
+                if transition_prob <= 0:
+                    continue
+                next_key = (next_state, min(up_count + up_gained, target_up_count))
+                next_states[next_key] = next_states.get(next_key, 0.0) + prob * transition_prob
+        states = next_states
+
+    _outcome_cache[key] = outcomes
+    return outcomes
+
+def _add_pmf(distribution, key, pmf):
+    """
+    distribution[key] += pmf (按位相加，长度取较长者)
+    """
+    current = distribution.get(key)
+    if current is None:
+        distribution[key] = pmf
+        return
+    if len(current) < len(pmf):
+        current, pmf = pmf, current
+        distribution[key] = current
+    for pulls, prob in enumerate(pmf):
+        current[pulls] += prob
+
+def _track_campaign(pool, track_banners, initial_state):
+    """
+    一条轨道上按顺序的各期卡池 [(计划中的序号, 卡池)]
+    返回: ({是否全部达成: 本轨道总抽数的pmf}, {计划中的序号: 该期达成概率}, {最终轨道状态: 概率})
+    """
+    # {(轨道状态, 目前为止是否全部达成): 本轨道总抽数的pmf}
+    distribution = {(initial_state, True): [1.0]}
+    banner_success = {}
+    final_states = {}
+    for position, (index, banner) in enumerate(track_banners):
+        last = position == len(track_banners) - 1
+        next_distribution = {}
+        reached_prob = 0.0
+        for (track_state, all_reached), total_pmf in distribution.items():
+            if not banner.get("carry_pity", True):
+                track_state = CAMPAIGN_POOLS[pool][1]
+            outcomes = banner_outcomes(pool, banner["target"], track_state, banner.get("max_pulls"))
+            mass = sum(total_pmf)
+            merged = {}
+            for (end_state, reached), banner_pmf in outcomes.items():
+                banner_mass = sum(banner_pmf)
+                if reached:
+                    reached_prob += mass * banner_mass
+                if last:
+                    # 最后一期之后不再需要轨道状态，先合并各结束状态再卷积
+                    final_states[end_state] = final_states.get(end_state, 0.0) + mass * banner_mass
+                    end_state = None
+                _add_pmf(merged, (end_state, all_reached and reached), list(banner_pmf))
+            for next_key, banner_pmf in merged.items():
+                # 给定起始状态时本期抽数与之前的抽数相互独立，总抽数分布为两者的卷积
+                _add_pmf(next_distribution, next_key, convolve_pmf(banner_pmf, total_pmf))
+        distribution = next_distribution
+        banner_success[index] = reached_prob
+
+    totals = {}
+    for (_, all_reached), total_pmf in distribution.items():
+        _add_pmf(totals, all_reached, list(total_pmf))
+    return totals, banner_success, final_states
+
+def plan_campaign(banners, initial_states=None):
+    """
+    计算整个抽卡计划的总抽数分布
+    各轨道使用不同的卡池与随机数，相互独立：每条轨道单独逐期传递状态分布，最后把各轨道的总抽数分布卷积
+    :param banners: 按顺序的卡池列表 [{"pool": 卡池类型, "target": 目标UP数, "max_pulls": 本期抽数上限(可省略),
+                    "carry_pity": 是否继承上一期同类卡池的保底(可省略，默认True)}]
+    :param initial_states: 各轨道的初始状态 {卡池类型: 轨道状态}，默认从零开始
+    :return: {"pmf": 总抽数分布, "success": 全部达成的概率, "banner_success": 每期达成的概率,
+              "success_pmf": 全部达成时的总抽数分布(未归一化), "final_states": {卡池类型: {最终轨道状态: 概率}}}
+    """
+    initial_states = initial_states or {}
+    pmf = [1.0]
+    success_pmf = [1.0]
+    banner_success = [0.0] * len(banners)
+    final_states = {}
+    for pool in sorted(set(banner["pool"] for banner in banners)):
+        track_banners = [(index, banner) for index, banner in enumerate(banners) if banner["pool"] == pool]
+        initial_state = tuple(initial_states.get(pool, CAMPAIGN_POOLS[pool][1]))
+        totals, track_success, final_states[pool] = _track_campaign(pool, track_banners, initial_state)
+        for index, success in track_success.items():
+            banner_success[index] = success
+
+        # 本轨道的总抽数分布(不论是否达成)
+        track_pmf = {}
+        for total_pmf in totals.values():
+            _add_pmf(track_pmf, None, list(total_pmf))
+        pmf = convolve_pmf(pmf, track_pmf[None])
+        success_pmf = convolve_pmf(success_pmf, totals.get(True, [0.0]))
+
+    return {
+        "pmf": pmf,
+        "success": sum(success_pmf),
+        "banner_success": banner_success,
+        "success_pmf": success_pmf,
+        "final_states": final_states,
+    }
+
+def print_campaign_report(banners, result):
+    """
+    打印抽卡计划的结果
+    """
+    print("\n抽卡计划:")
+    print("-" * 60)
+    for index, (banner, success) in enumerate(zip(banners, result["banner_success"])):
+        limit = "不限" if banner.get("max_pulls") is None else "{}抽".format(banner["max_pulls"])
+        print("第{}期 {:<14} 目标{}个UP  上限{:<6} 达成概率 {:.2f}%".format(
+            index + 1, banner["pool"], banner["target"], limit, success * 100))
+    print("全部达成概率: {:.2f}%".format(result["success"] * 100))
+
+    # 按一百万人的期望人数换算为直方图
+    histogram = pmf_to_histogram(result["pmf"], 1000000)
+    mean = histogram_mean(histogram)
+    print("\n总抽数期望: {:.2f}抽".format(mean))
+    print("总抽数标准差: {:.2f}".format(math.sqrt(histogram_variance(histogram, mean))))
+    for p in [10, 25, 50, 75, 90]:
+        print("{}% 分位数: {} 抽".format(p, int(histogram_percentile(histogram, p))))
+
+def main():
+    # 示例计划：mc角色池连续三期，第二期最多抽80抽
+    banners = [
+        {"pool": "mc_character", "target": 1},
+        {"pool": "mc_character", "target": 1, "max_pulls": 80},
+        {"pool": "mc_character", "target": 2},
+        {"pool": "mc_weapon", "target": 1},
+    ]
+    # 当前已垫30抽，上一个5星为UP
+    initial_states = {"mc_character": (30, True)}
+    result = plan_campaign(banners, initial_states)
+    print_campaign_report(banners, result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+从玩家当前保底状态出发的条件预测
+各模块的精确计算都接受起始状态(state参数)，这里按 (模块, 目标, 状态) 缓存剩余抽数的分布及其累积分布，
+同一状态的后续查询直接复用：期望为常数时间，"n抽内达成的概率"为一次下标访问，分位数为一次二分查找
+状态格式(可由各抽卡类的get_state()得到，列表会转换为元组):
+    mc_character:  (距上次5星的抽数, 上一个5星是否为UP)
+    mc_weapon:     (距上次5星的抽数,)
+    zmd_character: (距上次6星的抽数, 距上次5星的抽数, 是否还有大保底, 总抽数)
+    zmd_weapon:    (距上次6星的抽数, 距上次UP的抽数)
+    mc_mix:        (角色池状态, 武器池状态)
+    zmd_mix:       (角色池状态, 武器池状态, 当前武器票)
+目标为还需要的UP数量
+缓存键只保留精确计算用到的状态差异(见reduce_forecast_state)，例如终末地角色池只需要 总抽数 % 240；
+zmd_mix的角色池部分与武器池部分在zmd_mix中按各自的状态缓存，新的组合状态只需组合两者，不重新推进角色池
+"""
+from bisect import bisect_left
+import mc_character
+import mc_weapon
+import zmd_character
+import zmd_weapon
+import mc_mix
+import zmd_mix
+
+FORECAST_MODULES = {
+    "mc_character": mc_character,
+    "mc_weapon": mc_weapon,
+    "zmd_character": zmd_character,
+    "zmd_weapon": zmd_weapon,
+}
+# zmd_mix精确计算的截断阈值(与成功概率表一致)
+ZMD_MIX_TOLERANCE = 1e-12
+
+# 已计算的条件分布 {(模块名, 目标, 武器目标, 状态): Forecast}
+_forecast_cache = {}
+
+class Forecast(object):
+    """
+    剩余抽数的分布，构造时预先计算累积分布与期望
+    """
+    def __init__(self, pmf):
+        self.pmf = pmf
+        self.cdf = []
+        cumulative = 0.0
+        for prob in pmf:
+            cumulative += prob
+            self.cdf.append(min(cumulative, 1.0))
+        self.mean = sum(pulls * prob for pulls, prob in enumerate(pmf))
+
+    def probability_within(self, pulls):
+        """
+        再抽pulls抽以内达成目标的概率
+        """
+        if pulls < 0:
+            return 0.0
+        return self.cdf[min(pulls, len(self.cdf) - 1)]
+
+    def percentile(self, p):
+        """
+        p%分位数：达成概率不低于p%所需的最少抽数
+        """
+        return min(bisect_left(self.cdf, p / 100.0 - 1e-12), len(self.cdf) - 1)
+
+def freeze_state(state):
+    """
+    将(可能来自JSON的)嵌套列表状态转换为可哈希的元组
+    """
+    if isinstance(state, (list, tuple)):
+        return tuple(freeze_state(item) for item in state)
+    return state
+
+def reduce_forecast_state(name, state):
+    """
+    去掉精确计算用不到的状态差异，得到的状态与原状态的剩余抽数分布相同
+    """
+    if state is None:
+        return None
+    if name == "zmd_character":
+        return zmd_character.reduce_state(state)
+    if name == "zmd_mix":
+        character_state, weapon_state, weapon_ticket = state
+        return (zmd_character.reduce_state(character_state, keep_five_star=True), weapon_state, weapon_ticket)
+    return state
+
+def _compute_pmf(name, target_up_count, weapon_count, state):
+    if name == "mc_mix":
+        return mc_mix.calculate_exact_combined_distribution(target_up_count, weapon_count, state)
+    if name == "zmd_mix":
+        pmf, dropped = zmd_mix.calculate_exact_combined_distribution(
+            target_up_count, weapon_count, tolerance=ZMD_MIX_TOLERANCE, state=state)
+        return pmf
+    if name not in FORECAST_MODULES:
+        raise ValueError("未知的卡池: {}".format(name))
+    return FORECAST_MODULES[name].calculate_exact_distribution(target_up_count, state=state)
+
+def forecast(name, target_up_count, state=None, weapon_count=1):
+    """
+    从state出发，还需要target_up_count个UP(组合时另需weapon_count把UP武器)的剩余抽数分布
+    :param name: "mc_character" / "mc_weapon" / "zmd_character" / "zmd_weapon" / "mc_mix" / "zmd_mix"
+    :param state: 当前状态，格式见模块说明，None表示从零开始
+    :param weapon_count: 组合中还需要的UP武器数量，单卡池忽略
+    :return: Forecast (按状态缓存，多次查询同一状态不重复计算)
+    """
+    state = reduce_forecast_state(name, freeze_state(state))
+    if name not in ("mc_mix", "zmd_mix"):
+        weapon_count = None
+    key = (name, target_up_count, weapon_count, state)
+    result = _forecast_cache.get(key)
+    if result is None:
+        result = Forecast(_compute_pmf(name, target_up_count, weapon_count, state))
+        _forecast_cache[key] = result
+    return result
+
+def clear_forecast_cache():
+    _forecast_cache.clear()
+
+def main():
+    # 示例：mc角色池已垫60抽且上一个5星歪了(下一个5星必定UP)
+    examples = [
+        ("mc_character", 1, (60, False), None),
+        ("mc_character", 2, (60, False), None),
+        ("zmd_character", 1, (30, 5, True, 100), None),
+        ("mc_mix", 1, ((60, False), (20,)), 1),
+    ]
+    for name, target_up_count, state, weapon_count in examples:
+        result = forecast(name, target_up_count, state, weapon_count or 1)
+        print("{} 状态{} 还需{}个UP: 期望{:.2f}抽, 中位数{}抽, 90%分位数{}抽, 50抽内达成{:.2f}%".format(
+            name, state, target_up_count, result.mean, result.percentile(50), result.percentile(90),
+            result.probability_within(50) * 100))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+保底机制计数器与分阶段计时
+抽卡类和组合模拟的循环接受可选的metrics参数，为None(默认)时热路径上只有一次"is not None"判断；
+启用时记录各机制的触发次数(如软保底、大保底、240抽赠送UP、大小保底、十连5星保底、武器票十连)与各阶段用时。
+进程池任务在进程内累加，返回as_dict()的结果，主进程用merge合并，最后与报告一起保存为JSON
+"""
+import json
+from timeit import default_timer
+
+class Metrics(object):
+    """
+    计数器 {名称: 次数} 与计时器 {名称: 累计秒数}，可跨进程合并
+    """
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def timed(self, name, func):
+        """
+        包装func，每次调用的用时累加到计时器name(用于循环中反复调用的抽卡方法)
+        """
+        add_time = self.add_time
+
+        def wrapper(*args):
+            start = default_timer()
+            result = func(*args)
+            add_time(name, default_timer() - start)
+            return result
+        return wrapper
+
+    def merge(self, other):
+        """
+        合并另一部分结果(Metrics或as_dict()的字典)，返回self
+        """
+        if isinstance(other, dict):
+            other = Metrics.from_dict(other)
+        for name, value in other.counters.items():
+            self.count(name, value)
+        for name, seconds in other.timers.items():
+            self.add_time(name, seconds)
+        return self
+
+    def as_dict(self):
+        return {"counters": dict(self.counters), "timers": dict(self.timers)}
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        metrics.counters = dict(data.get("counters", {}))
+        metrics.timers = dict(data.get("timers", {}))
+        return metrics
+
+def write_metrics(path, metrics, **info):
+    """
+    保存为JSON: {"counters": ..., "timers": ..., 以及info中的运行信息}
+    """
+    data = metrics.as_dict()
+    data.update(info)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
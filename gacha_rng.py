@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+可复现的并行随机数流
+模拟按固定大小切成批次，每批的种子由 主种子 + 批次序号 经SHA-256派生（计数器式派生，不依赖其他批次），
+每批使用自己的random.Random实例。批次的划分只取决于模拟次数和batch_size，
+因此同一主种子无论用1个还是64个进程、任务以什么顺序完成，合并出的直方图都完全一致，
+第i次模拟也可以只凭主种子和序号i单独重放
+"""
+import hashlib
+import random
+
+def new_master_seed():
+    """
+    未指定主种子时生成一个（取自全局random，调用random.seed(x)后同样可复现；
+    32位以内，可以直接传给NumPy的RandomState）
+    """
+    return random.getrandbits(32)
+
+def derive_seed(master_seed, batch_index):
+    """
+    由主种子和批次序号派生该批的种子(64位整数)
+    """
+    digest = hashlib.sha256("{}:{}".format(master_seed, batch_index).encode("ascii")).hexdigest()
+    return int(digest[:16], 16)
+
+def batch_rng(master_seed, batch_index):
+    """
+    返回该批专用的随机数生成器
+    """
+    return random.Random(derive_seed(master_seed, batch_index))
+
+def split_batches(num_simulations, batch_size):
+    """
+    将num_simulations次模拟按batch_size切分
+    返回: [(批次序号, 本批模拟次数)]
+    """
+    return [(start // batch_size, min(batch_size, num_simulations - start))
+            for start in range(0, num_simulations, batch_size)]
+
+def locate_simulation(index, batch_size):
+    """
+    第index次模拟(从0开始)所在的批次序号，以及它是该批中的第几次模拟
+    """
+    return index // batch_size, index % batch_size
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+内存映射的原始样本文件，用于远超内存的模拟次数
+文件预先分配好全部空间，进程池任务各自映射文件，把本批的结果直接写到本批的位置，主进程不保存任何样本
+格式:
+    8字节标识 + 4字节头部长度 + JSON头部(字段、类型、样本数及运行信息，补空格对齐到8字节)
+    之后按字段分列存放，每列为该字段全部样本的定长小端整数(抽数与星数uint16，武器票uint32)
+分列存放使得只读抽数时可以整块读入array，报告按块流式统计，不需要逐条解析记录
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from gacha_stats import build_histogram_chunks
+
+SAMPLE_FILE_MAGIC = b"GACHASMP"
+SAMPLE_FILE_VERSION = 1
+# 各字段的存储类型，未列出的字段为uint16
+FIELD_TYPECODES = {
+    "weapon_ticket": "I",
+}
+# 流式读取时每块的样本数
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+def field_typecode(name):
+    return FIELD_TYPECODES.get(name, "H")
+
+def _column_sizes(header):
+    return [header["num_records"] * array(typecode).itemsize for typecode in header["typecodes"]]
+
+def create_sample_file(path, num_records, fields=("pulls",), available_fields=None, **info):
+    """
+    创建并预分配样本文件(稀疏文件，未写入的部分不占磁盘)
+    :param fields: 要保存的字段
+    :param available_fields: 模块能提供的字段(SAMPLE_FIELDS)，用于提前检查fields
+    :param info: 写入头部的运行信息(模块、目标、主种子等)
+    """
+    fields = list(fields)
+    if available_fields is not None:
+        unknown = [name for name in fields if name not in available_fields]
+        if unknown:
+            raise ValueError("不支持的字段: {}，可选: {}".format(", ".join(unknown), ", ".join(available_fields)))
+    header = dict(info, version=SAMPLE_FILE_VERSION, fields=fields, num_records=num_records,
+                  typecodes=[field_typecode(name) for name in fields])
+    text = json.dumps(header, sort_keys=True).encode("utf-8")
+    text += b" " * (-(len(SAMPLE_FILE_MAGIC) + 4 + len(text)) % 8)
+    data_offset = len(SAMPLE_FILE_MAGIC) + 4 + len(text)
+    with open(path, "wb") as f:
+        f.write(SAMPLE_FILE_MAGIC + struct.pack("<I", len(text)) + text)
+        f.truncate(data_offset + sum(_column_sizes(header)))
+
+class SampleFile(object):
+    """
+    打开已创建的样本文件并映射到内存
+    writable为True时用于进程池任务写入本批的结果
+    """
+    def __init__(self, path, writable=False):
+        self.path = path
+        self._file = open(path, "r+b" if writable else "rb")
+        prefix = self._file.read(len(SAMPLE_FILE_MAGIC) + 4)
+        if prefix[:len(SAMPLE_FILE_MAGIC)] != SAMPLE_FILE_MAGIC:
+            self._file.close()
+            raise ValueError("不是样本文件: {}".format(path))
+        header_length = struct.unpack("<I", prefix[len(SAMPLE_FILE_MAGIC):])[0]
+        self.header = json.loads(self._file.read(header_length).decode("utf-8"))
+        self.fields = self.header["fields"]
+        self.typecodes = self.header["typecodes"]
+        self.num_records = self.header["num_records"]
+        # 各列的起始位置
+        self._offsets = []
+        offset = len(prefix) + header_length
+        for size in _column_sizes(self.header):
+            self._offsets.append(offset)
+            offset += size
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self._map = mmap.mmap(self._file.fileno(), 0, access=access)
+
+    def __len__(self):
+        return self.num_records
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _locate(self, field, start, count):
+        index = self.fields.index(field)
+        itemsize = array(self.typecodes[index]).itemsize
+        begin = self._offsets[index] + start * itemsize
+        return index, begin, begin + count * itemsize
+
+    def write_column(self, field, start, values):
+        """
+        把array values写到字段field的第start条开始的位置
+        """
+        index, begin, end = self._locate(field, start, len(values))
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        self._map[begin:end] = values.tobytes() if hasattr(values, "tobytes") else values.tostring()
+
+    def read_column(self, field, start, count):
+        """
+        读取字段field从第start条开始的count条，返回array
+        """
+        index, begin, end = self._locate(field, start, min(count, self.num_records - start))
+        values = array(self.typecodes[index])
+        data = self._map[begin:end]
+        if hasattr(values, "frombytes"):
+            values.frombytes(data)
+        else:
+            values.fromstring(data)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def iter_chunks(self, field="pulls", chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        按模拟顺序分块读取字段field，每块为一个array
+        """
+        for start in range(0, self.num_records, chunk_size):
+            yield self.read_column(field, start, chunk_size)
+
+    def histogram(self, field="pulls", chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        流式统计字段field的直方图(抽数的分位数等由直方图精确计算)
+        """
+        return build_histogram_chunks(self.iter_chunks(field, chunk_size))
+
+def write_batch(path, start, batch_size, simulate_one, available_fields):
+    """
+    在进程池任务中调用：连续模拟batch_size次，结果写入样本文件从第start条开始的位置
+    simulate_one()返回按available_fields排列的元组，只保存文件中的字段
+    """
+    with SampleFile(path, writable=True) as sample_file:
+        indices = [available_fields.index(name) for name in sample_file.fields]
+        columns = [array(typecode) for typecode in sample_file.typecodes]
+        for _ in range(batch_size):
+            result = simulate_one()
+            for column, index in zip(columns, indices):
+                column.append(result[index])
+        for name, column in zip(sample_file.fields, columns):
+            sample_file.write_column(name, start, column)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+跨机器的分片模拟
+一次模拟按 split_batches(模拟次数, batch_size) 切成批次，第b批的种子为 derive_seed(主种子, b)，
+第i个分片(共N个)只运行序号 b % N == i 的批次，把各目标的PullHistogram(直方图与抽数和、平方和)保存为JSON分片文件。
+分片文件可以在不同机器上生成后直接复制到一起，merge合并后生成报告；
+主种子、batch_size与目标列表相同时，结果与单机运行(simulate_gacha_distribution的单趟模式 /
+simulate_optimized_strategy)完全一致。合并的结果仍是分片文件格式，可以继续与其他分片合并
+
+用法:
+    python gacha_shard.py run mc_character --targets 1 2 --simulations 100000000 --seed 42 --shards 8 --shard 0
+    python gacha_shard.py run zmd_mix --targets 1,1 2,1 --simulations 100000000 --seed 42 --shards 8 --shard 3
+    python gacha_shard.py merge mc_character_shard*.json [--output merged.json] [--allow-partial]
+"""
+import argparse
+import json
+import os
+from multiprocessing import Pool, cpu_count
+import mc_character
+import mc_weapon
+import zmd_character
+import zmd_weapon
+import mc_mix
+import zmd_mix
+from gacha_stats import PullHistogram
+from gacha_rng import derive_seed, split_batches
+
+# 分片文件格式变化时修改
+SHARD_VERSION = 1
+SHARD_MODULES = {
+    "mc_character": mc_character,
+    "mc_weapon": mc_weapon,
+    "zmd_character": zmd_character,
+    "zmd_weapon": zmd_weapon,
+    "mc_mix": mc_mix,
+    "zmd_mix": zmd_mix,
+}
+MIX_MODULES = ("mc_mix", "zmd_mix")
+# 合并时必须一致的参数
+SHARD_KEYS = ("version", "module", "banner", "targets", "seed", "num_simulations", "batch_size")
+
+def shard_batches(num_simulations, batch_size, num_shards, shard):
+    """
+    第shard个分片(从0开始)负责的批次 [(批次序号, 本批模拟次数)]
+    """
+    if not 0 <= shard < num_shards:
+        raise ValueError("分片序号应在0到{}之间".format(num_shards - 1))
+    return split_batches(num_simulations, batch_size)[shard::num_shards]
+
+def banner_spec(name, targets):
+    """
+    卡池参数(与结果缓存的键相同，转换为JSON中的形式)，用于检查各分片使用相同的卡池
+    """
+    module = SHARD_MODULES[name]
+    if name in MIX_MODULES:
+        character_count, weapon_count = targets[0]
+        spec = module.cache_params_combined(character_count, weapon_count, "simulation")["banner"]
+    else:
+        spec = module.cache_params(targets[0], "simulation")["banner"]
+    return json.loads(json.dumps(spec))
+
+def run_shard(name, targets, num_simulations, seed, num_shards, shard, batch_size=10000, processes=None):
+    """
+    运行一个分片
+    :param targets: 单卡池为UP数量列表(单趟模式，一次模拟得到所有目标)；组合为[(角色数, 武器数)]列表
+    :return: 分片数据(可JSON序列化)
+    """
+    module = SHARD_MODULES[name]
+    batches = shard_batches(num_simulations, batch_size, num_shards, shard)
+    histograms = [PullHistogram() for _ in targets]
+    pool = Pool(processes=processes or min(cpu_count(), 4))
+    try:
+        if name in MIX_MODULES:
+            # 与simulate_optimized_strategy相同：每个目标组合使用同一主种子的全部批次
+            for histogram, (character_count, weapon_count) in zip(histograms, targets):
+                tasks = [(character_count, weapon_count, size, derive_seed(seed, batch_index))
+                         for batch_index, size in batches]
+                for partial in pool.imap_unordered(module.simulate_batch_combined, tasks):
+                    histogram.merge(partial)
+        else:
+            # 与simulate_gacha_distribution的单趟模式相同
+            tasks = [(targets, size, derive_seed(seed, batch_index)) for batch_index, size in batches]
+            for partial in pool.imap_unordered(module.simulate_batch_multi, tasks):
+                for histogram, part in zip(histograms, partial):
+                    histogram.merge(part)
+    finally:
+        pool.close()
+        pool.join()
+
+    return {
+        "version": SHARD_VERSION,
+        "module": name,
+        "banner": banner_spec(name, targets),
+        "targets": [list(target) if name in MIX_MODULES else target for target in targets],
+        "seed": seed,
+        "num_simulations": num_simulations,
+        "batch_size": batch_size,
+        "shard": "{}/{}".format(shard, num_shards),
+        "batches": [batch_index for batch_index, size in batches],
+        "histograms": [histogram.as_dict() for histogram in histograms],
+    }
+
+def save_shard(data, path):
+    """
+    写入分片文件(先写临时文件再改名，避免留下不完整的文件)
+    """
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp_path, "w") as f:
+        json.dump(data, f, sort_keys=True)
+    os.rename(temp_path, path)
+
+def load_shard(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != SHARD_VERSION:
+        raise ValueError("分片文件版本不符: {}".format(path))
+    return data
+
+def merge_shards(shards, allow_partial=False):
+    """
+    合并任意一组分片数据
+    参数不一致或批次重复时报错；缺少批次时报错，allow_partial为True时按已有批次合并
+    :return: 合并后的分片数据
+    """
+    if not shards:
+        raise ValueError("没有分片")
+    first = shards[0]
+    for data in shards[1:]:
+        for key in SHARD_KEYS:
+            if data[key] != first[key]:
+                raise ValueError("分片参数不一致: {}".format(key))
+
+    seen = set()
+    histograms = [PullHistogram() for _ in first["targets"]]
+    for data in shards:
+        duplicated = seen.intersection(data["batches"])
+        if duplicated:
+            raise ValueError("批次重复: {}".format(sorted(duplicated)[:10]))
+        seen.update(data["batches"])
+        for histogram, part in zip(histograms, data["histograms"]):
+            histogram.merge(PullHistogram.from_dict(part))
+
+    missing = len(split_batches(first["num_simulations"], first["batch_size"])) - len(seen)
+    if missing and not allow_partial:
+        raise ValueError("缺少{}个批次".format(missing))
+
+    merged = dict(first)
+    merged["shard"] = "merged"
+    merged["batches"] = sorted(seen)
+    merged["histograms"] = [histogram.as_dict() for histogram in histograms]
+    return merged
+
+def print_merged_report(data):
+    """
+    用各模块原有的报告格式输出合并结果
+    """
+    module = SHARD_MODULES[data["module"]]
+    for target, part in zip(data["targets"], data["histograms"]):
+        histogram = PullHistogram.from_dict(part)
+        if data["module"] in MIX_MODULES:
+            character_count, weapon_count = target
+            module.create_histogram_report(histogram.counts, character_count, weapon_count, histogram.n)
+        else:
+            module.create_histogram_report(histogram.counts, target, histogram.n)
+
+def parse_targets(name, items):
+    if name in MIX_MODULES:
+        return [tuple(int(x) for x in item.split(",")) for item in items]
+    return [int(item) for item in items]
+
+def main():
+    parser = argparse.ArgumentParser(description="跨机器的分片模拟与合并")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="运行一个分片并保存")
+    run_parser.add_argument("name", choices=sorted(SHARD_MODULES), help="模块")
+    run_parser.add_argument("--targets", nargs="+", default=["1"], metavar="目标",
+                            help="单卡池为UP数量，组合为 角色数,武器数；与单机运行的目标列表一致时结果相同")
+    run_parser.add_argument("--simulations", type=int, required=True, help="全部分片合计的模拟次数")
+    run_parser.add_argument("--seed", type=int, required=True, help="主种子，所有分片必须相同")
+    run_parser.add_argument("--shards", type=int, required=True, help="分片总数")
+    run_parser.add_argument("--shard", type=int, required=True, help="本分片序号(从0开始)")
+    run_parser.add_argument("--batch-size", type=int, default=10000, help="每批模拟次数，所有分片必须相同")
+    run_parser.add_argument("--processes", type=int, default=None, help="进程数，默认为CPU核数(最多4)")
+    run_parser.add_argument("--output", default=None, help="分片文件路径，默认为 模块_shard序号of总数.json")
+
+    merge_parser = subparsers.add_parser("merge", help="合并分片文件并生成报告")
+    merge_parser.add_argument("files", nargs="+", help="分片文件")
+    merge_parser.add_argument("--output", default=None, help="保存合并结果(仍为分片文件格式)")
+    merge_parser.add_argument("--allow-partial", action="store_true", help="允许缺少批次，按已有批次合并")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        data = run_shard(args.name, parse_targets(args.name, args.targets), args.simulations, args.seed,
+                         args.shards, args.shard, args.batch_size, args.processes)
+        output = args.output or "{}_shard{}of{}.json".format(args.name, args.shard, args.shards)
+        save_shard(data, output)
+        print("已保存: {} ({}个批次)".format(output, len(data["batches"])))
+    elif args.command == "merge":
+        merged = merge_shards([load_shard(path) for path in args.files], args.allow_partial)
+        print("合并{}个分片文件, 模拟次数: {}, 随机种子: {}".format(
+            len(args.files), PullHistogram.from_dict(merged["histograms"][0]).n, merged["seed"]))
+        if args.output:
+            save_shard(merged, args.output)
+            print("已保存: {}".format(args.output))
+        print_merged_report(merged)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
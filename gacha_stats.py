@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+抽数分布统计工具
+直方图为列表, histogram[n]为恰好n抽完成的人数(模拟)或期望人数(精确概率分布换算)
+需要保留每次模拟的原始抽数时，样本用array('H')紧凑存储(每个样本2字节)，进程池任务以字节块返回
+"""
+from array import array
+
+# 原始样本的存储类型：无符号16位整数，单次模拟最多65535抽
+SAMPLE_TYPECODE = "H"
+
+def samples_to_bytes(samples):
+    """
+    将array样本转换为字节块(进程池任务的返回值，序列化只是一次内存复制)
+    """
+    return samples.tobytes() if hasattr(samples, "tobytes") else samples.tostring()
+
+def samples_from_bytes(data, samples=None):
+    """
+    将字节块(bytes/bytearray/memoryview)解包并追加到samples(默认新建)，返回该array
+    """
+    if samples is None:
+        samples = array(SAMPLE_TYPECODE)
+    data = data.tobytes() if isinstance(data, memoryview) else bytes(data)
+    if hasattr(samples, "frombytes"):
+        samples.frombytes(data)
+    else:
+        samples.fromstring(data)
+    return samples
+
+def as_samples(data):
+    """
+    报告函数接受的样本：列表、array，或按SAMPLE_TYPECODE打包的字节块
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return samples_from_bytes(data)
+    return data
+
+def build_histogram(data):
+    """
+    将每次模拟的抽数(列表、array、打包的字节块，或可分块读取的样本文件gacha_samples.SampleFile)转换为直方图
+    """
+    if hasattr(data, "iter_chunks"):
+        return build_histogram_chunks(data.iter_chunks())
+    return build_histogram_chunks([as_samples(data)])
+
+def build_histogram_chunks(chunks):
+    """
+    逐块累加直方图，内存只与单块大小和最大抽数有关(百分位数等再由直方图精确计算)
+    """
+    histogram = [0]
+    for chunk in chunks:
+        if not chunk:
+            continue
+        max_pulls = max(chunk)
+        if max_pulls >= len(histogram):
+            histogram.extend([0] * (max_pulls + 1 - len(histogram)))
+        for pulls in chunk:
+            histogram[pulls] += 1
+    return histogram
+
+def pmf_to_histogram(pmf, num_simulations):
+    """
+    将精确概率分布按模拟次数换算为期望人数直方图，便于沿用原有报告格式
+    """
+    return [p * num_simulations for p in pmf]
+
+def histogram_total(histogram):
+    """
+    直方图总人数
+    """
+    return sum(histogram)
+
+def histogram_max(histogram):
+    """
+    直方图中出现过的最大抽数
+    """
+    for pulls in range(len(histogram) - 1, -1, -1):
+        if histogram[pulls] > 0:
+            return pulls
+    return 0
+
+def histogram_mean(histogram):
+    """
+    计算期望
+    """
+    total = histogram_total(histogram)
+    if total <= 0:
+        return 0
+    return sum(pulls * count for pulls, count in enumerate(histogram)) / float(total)
+
+def histogram_variance(histogram, mean):
+    """
+    计算方差
+    """
+    total = histogram_total(histogram)
+    if total <= 1:
+        return 0
+    return sum((pulls - mean) ** 2 * count for pulls, count in enumerate(histogram)) / float(total)
+
+def histogram_value_at(histogram, index):
+    """
+    返回排序后第index个(从0开始)样本的抽数
+    """
+    cumulative = 0
+    for pulls, count in enumerate(histogram):
+        cumulative += count
+        if cumulative > index:
+            return pulls
+    return histogram_max(histogram)
+
+def histogram_median(histogram):
+    """
+    计算中位数(与calculate_median一致)
+    """
+    n = int(round(histogram_total(histogram)))
+    if n % 2 == 0:
+        return (histogram_value_at(histogram, n//2 - 1) + histogram_value_at(histogram, n//2)) / 2.0
+    else:
+        return histogram_value_at(histogram, n//2)
+
+def histogram_percentile(histogram, p):
+    """
+    计算p%分位数(与报告中排序取下标的方式一致)
+    """
+    n = int(round(histogram_total(histogram)))
+    index = int((p / 100.0) * (n - 1))
+    return histogram_value_at(histogram, index)
+
+def convolve_pmf(pmf_a, pmf_b):
+    """
+    两个相互独立抽数分布之和的分布(离散卷积)
+    """
+    result = [0.0] * (len(pmf_a) + len(pmf_b) - 1)
+    for i, p in enumerate(pmf_a):
+        if p == 0:
+            continue
+        for j, q in enumerate(pmf_b):
+            result[i + j] += p * q
+    return result
+
+class PullHistogram(object):
+    """
+    可合并的抽数直方图累加器
+    counts[n]为恰好n抽完成的次数，并累计样本数、抽数和与抽数平方和（均为整数，合并没有误差）
+    进程池中每个任务在本地累加，主进程只需合并，内存占用与最大抽数成正比而与模拟次数无关
+    """
+    def __init__(self):
+        self.counts = []        # 直方图
+        self.n = 0              # 样本数
+        self.sum = 0            # 抽数和
+        self.sum_sq = 0         # 抽数平方和
+
+    def add(self, pulls, count=1):
+        """
+        记录count次恰好pulls抽完成的结果
+        """
+        if pulls >= len(self.counts):
+            self.counts.extend([0] * (pulls + 1 - len(self.counts)))
+        self.counts[pulls] += count
+        self.n += count
+        self.sum += pulls * count
+        self.sum_sq += pulls * pulls * count
+
+    def merge(self, other):
+        """
+        合并另一个累加器的结果
+        """
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for pulls, count in enumerate(other.counts):
+            self.counts[pulls] += count
+        self.n += other.n
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        return self
+
+    def mean(self):
+        """
+        计算期望
+        """
+        if self.n <= 0:
+            return 0
+        return self.sum / float(self.n)
+
+    def variance(self):
+        """
+        计算方差(与calculate_variance一致，除以样本数)
+        """
+        if self.n <= 1:
+            return 0
+        mean = self.mean()
+        return max(self.sum_sq / float(self.n) - mean * mean, 0.0)
+
+    def median(self):
+        """
+        计算中位数
+        """
+        return histogram_median(self.counts)
+
+    def percentile(self, p):
+        """
+        计算p%分位数
+        """
+        return histogram_percentile(self.counts, p)
+
+    def as_dict(self):
+        """
+        转换为可JSON序列化的字典
+        """
+        return {"counts": self.counts, "n": self.n, "sum": self.sum, "sum_sq": self.sum_sq}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        由as_dict的结果恢复
+        """
+        histogram = cls()
+        histogram.counts = list(data["counts"])
+        histogram.n = data["n"]
+        histogram.sum = data["sum"]
+        histogram.sum_sq = data["sum_sq"]
+        return histogram
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+卡池参数扫描
+对参数网格(如 up_rate x hard_pity)中的每个点，用 Banner(卡池参数声明, **覆盖参数) 编译出卡池并计算抽数分布，
+输出每个点、每个目标的期望与分位数表格。
+所有网格点的批次一起提交到同一个进程池；各网格点的第b批使用相同的种子(共同随机数)，
+网格点之间的差异不受抽样噪声的独立叠加影响；每次模拟只跑到最大目标(单趟模式)得到所有目标的结果。
+也可以用 engine="exact" 对每个网格点做精确计算
+"""
+import itertools
+import random
+from multiprocessing import Pool, cpu_count
+from banner import Banner, MC_CHARACTER_SPEC, MC_WEAPON_SPEC, ZMD_CHARACTER_SPEC, ZMD_WEAPON_SPEC
+from gacha_stats import PullHistogram, pmf_to_histogram, histogram_mean, histogram_percentile
+from gacha_rng import new_master_seed, derive_seed, split_batches
+
+# 可扫描的模块及其卡池参数声明
+SWEEP_SPECS = {
+    "mc_character": MC_CHARACTER_SPEC,
+    "mc_weapon": MC_WEAPON_SPEC,
+    "zmd_character": ZMD_CHARACTER_SPEC,
+    "zmd_weapon": ZMD_WEAPON_SPEC,
+}
+# 各模块的抽卡类名
+SWEEP_CLASSES = {
+    "mc_character": "GachaCharacter",
+    "mc_weapon": "GachaWeapon",
+    "zmd_character": "GachaCharacter",
+    "zmd_weapon": "GachaWeapon",
+}
+# 各模块可扫描的参数：只列出影响获得UP所需抽数的参数，
+# 模块不使用的参数(如鸣潮的hard_pity/free_pity、终末地的guarantee)以及只影响5星或武器票的参数会得到完全相同的行
+SWEEP_PARAMETERS = {
+    "mc_character": ("base_rate", "rate_ramp", "soft_pity", "up_rate", "guarantee"),
+    "mc_weapon": ("base_rate", "rate_ramp", "soft_pity", "up_rate"),
+    "zmd_character": ("base_rate", "rate_ramp", "soft_pity", "hard_pity", "up_rate", "free_pity"),
+    "zmd_weapon": ("base_rate", "rate_ramp", "soft_pity", "hard_pity", "up_rate"),
+}
+SWEEP_PERCENTILES = [10, 25, 50, 75, 90]
+
+# 进程内已编译的卡池 {(模块名, 覆盖参数): Banner}
+_banner_cache = {}
+
+def expand_grid(grid):
+    """
+    将 {参数名: [取值, ...]} 展开为覆盖参数字典的列表(笛卡尔积，按参数名排序)
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+def _banner(module_name, overrides):
+    """
+    编译(并在进程内缓存)覆盖参数后的卡池
+    """
+    key = (module_name, repr(sorted(overrides.items())))
+    if key not in _banner_cache:
+        _banner_cache[key] = Banner(SWEEP_SPECS[module_name], **overrides)
+    return _banner_cache[key]
+
+def _module(module_name):
+    return __import__(module_name)
+
+def simulate_sweep_batch(args):
+    """
+    进程池任务：在一个网格点上模拟一批(单趟模式)
+    返回: (网格点序号, 与target_up_counts一一对应的直方图列表)
+    """
+    module_name, point_index, overrides, target_up_counts, batch_size, seed = args
+    module = _module(module_name)
+    banner = _banner(module_name, overrides)
+    rng = random.Random(seed)
+    max_up_count = max(target_up_counts)
+    histograms = [PullHistogram() for _ in target_up_counts]
+    for _ in range(batch_size):
+        pulls_at_up = module.single_simulation(max_up_count, record_all=True, rng=rng, banner=banner)
+        for histogram, target_up_count in zip(histograms, target_up_counts):
+            histogram.add(pulls_at_up[target_up_count - 1] if target_up_count > 0 else 0)
+    return point_index, histograms
+
+def exact_sweep_point(args):
+    """
+    进程池任务：在一个网格点上精确计算各目标的概率分布
+    返回: (网格点序号, 与target_up_counts一一对应的pmf列表)
+    """
+    module_name, point_index, overrides, target_up_counts = args
+    module = _module(module_name)
+    banner = _banner(module_name, overrides)
+    gacha = getattr(module, SWEEP_CLASSES[module_name])(banner=banner)
+    return point_index, [module.calculate_exact_distribution(target_up_count, gacha) for target_up_count in
+                         target_up_counts]
+
+def run_sweep(module_name, grid, target_up_counts=(1,), num_simulations=100000, batch_size=10000, seed=None,
+              engine="simulation", pool=None):
+    """
+    参数扫描
+    :param module_name: "mc_character" / "mc_weapon" / "zmd_character" / "zmd_weapon"
+    :param grid: {参数名: [取值, ...]}，参数名同banner中的卡池参数声明，只能使用SWEEP_PARAMETERS中该模块的参数，
+                 否则抛出ValueError
+    :param target_up_counts: 目标UP数量列表
+    :param num_simulations: 每个网格点的模拟次数（精确计算时用于换算分位数）
+    :param seed: 主种子，所有网格点共用(共同随机数)
+    :param engine: "simulation" 蒙特卡洛模拟; "exact" 精确计算
+    :param pool: 共用的进程池，为None时临时创建
+    :return: 行列表 [{"overrides": 覆盖参数, "target": 目标, "mean": 期望, "percentiles": {p: 分位数}, "n": 样本数}]
+    """
+    if module_name not in SWEEP_PARAMETERS:
+        raise ValueError("不支持的模块: {}".format(module_name))
+    unsupported = [name for name in sorted(grid) if name not in SWEEP_PARAMETERS[module_name]]
+    if unsupported:
+        raise ValueError("{}不支持扫描参数: {}，可选: {}".format(
+            module_name, ", ".join(unsupported), ", ".join(SWEEP_PARAMETERS[module_name])))
+    target_up_counts = list(target_up_counts)
+    points = expand_grid(grid)
+    own_pool = pool is None
+    if own_pool:
+        pool = Pool(processes=min(cpu_count(), 4))
+
+    results = [None] * len(points)
+    try:
+        if engine == "exact":
+            tasks = [(module_name, point_index, overrides, target_up_counts)
+                     for point_index, overrides in enumerate(points)]
+            for point_index, pmfs in pool.imap_unordered(exact_sweep_point, tasks):
+                results[point_index] = [pmf_to_histogram(pmf, num_simulations) for pmf in pmfs]
+        else:
+            master_seed = seed if seed is not None else new_master_seed()
+            # 所有网格点的所有批次作为一个作业提交；相同批次序号使用相同种子
+            tasks = [(module_name, point_index, overrides, target_up_counts, size, derive_seed(master_seed, batch_index))
+                     for batch_index, size in split_batches(num_simulations, batch_size)
+                     for point_index, overrides in enumerate(points)]
+            results = [[PullHistogram() for _ in target_up_counts] for _ in points]
+            for point_index, histograms in pool.imap_unordered(simulate_sweep_batch, tasks):
+                for histogram, part in zip(results[point_index], histograms):
+                    histogram.merge(part)
+            results = [[histogram.counts for histogram in histograms] for histograms in results]
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+
+    rows = []
+    for overrides, histograms in zip(points, results):
+        for target_up_count, histogram in zip(target_up_counts, histograms):
+            rows.append({
+                "overrides": overrides,
+                "target": target_up_count,
+                "mean": histogram_mean(histogram),
+                "percentiles": dict((p, histogram_percentile(histogram, p)) for p in SWEEP_PERCENTILES),
+                "n": int(round(sum(histogram))),
+            })
+    return rows
+
+def print_sweep_table(rows):
+    """
+    打印扫描结果表格
+    """
+    header = "{:<36} {:<8} {:<12}".format("参数", "目标", "期望") + \
+        "".join("{:<8}".format("P{}".format(p)) for p in SWEEP_PERCENTILES)
+    print(header)
+    print("-" * 100)
+    for row in rows:
+        overrides = ", ".join("{}={}".format(name, value) for name, value in sorted(row["overrides"].items()))
+        print("{:<34} {:<6} {:<10.2f}".format(overrides, row["target"], row["mean"]) +
+              "".join("{:<8}".format(row["percentiles"][p]) for p in SWEEP_PERCENTILES))
+
+def main():
+    # 扫描的模块与参数网格
+    module_name = "zmd_character"
+    grid = {
+        "up_rate": [0.5, 0.55],
+        "hard_pity": [100, 120],
+    }
+    target_up_counts = [1, 2]
+    # 每个网格点的模拟次数
+    num_simulations = 100000
+    # 计算方式: "simulation" 蒙特卡洛模拟; "exact" 精确计算
+    engine = "simulation"
+
+    print("=" * 100)
+    print("参数扫描: {} {}".format(module_name, grid))
+    print("=" * 100)
+    rows = run_sweep(module_name, grid, target_up_counts, num_simulations, engine=engine)
+    print_sweep_table(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+预计算的成功概率表
+由精确计算的抽数分布累加得到 P(n抽以内获得至少k个UP) = P(获得第k个UP所需抽数 <= n)，n = 0..horizon，
+保存为JSON；查询只做一次列表下标访问，不进行任何模拟或计算。
+    单卡池: mc_character / mc_weapon / zmd_character / zmd_weapon，k = 1..max_up
+    组合:   mc_mix  (抽数为角色池+武器池总抽数)
+            zmd_mix (抽数为角色池抽数，武器池只用武器票十连)，目标为(角色UP数, 武器UP数)
+
+用法:
+    python gacha_table.py build [--horizon 1000] [--max-up 7] [--output gacha_table.json]
+    python gacha_table.py query mc_character 150 [--up 1]
+    python gacha_table.py query zmd_mix 200 --up 1 --weapon 1
+"""
+import argparse
+import json
+import os
+import mc_character
+import mc_weapon
+import zmd_character
+import zmd_weapon
+import mc_mix
+import zmd_mix
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gacha_table.json")
+DEFAULT_HORIZON = 1000
+DEFAULT_MAX_UP = 7
+DEFAULT_MIX_TARGETS = [(1, 1), (2, 1)]
+
+BANNER_MODULES = {
+    "mc_character": mc_character,
+    "mc_weapon": mc_weapon,
+    "zmd_character": zmd_character,
+    "zmd_weapon": zmd_weapon,
+}
+
+def _mc_mix_pmf(character_count, weapon_count):
+    return mc_mix.calculate_exact_combined_distribution(character_count, weapon_count)
+
+def _zmd_mix_pmf(character_count, weapon_count):
+    pmf, dropped = zmd_mix.calculate_exact_combined_distribution(character_count, weapon_count, tolerance=1e-12)
+    return pmf
+
+MIX_PMFS = {
+    "mc_mix": _mc_mix_pmf,
+    "zmd_mix": _zmd_mix_pmf,
+}
+
+def success_curve(pmf, horizon):
+    """
+    由抽数分布得到 curve[n] = P(抽数 <= n), n = 0..horizon
+    """
+    curve = []
+    cumulative = 0.0
+    for pulls in range(horizon + 1):
+        if pulls < len(pmf):
+            cumulative += pmf[pulls]
+        curve.append(min(cumulative, 1.0))
+    return curve
+
+def _mix_key(character_count, weapon_count):
+    return "{},{}".format(character_count, weapon_count)
+
+def build_table(horizon=DEFAULT_HORIZON, max_up=DEFAULT_MAX_UP, mix_targets=DEFAULT_MIX_TARGETS, verbose=True):
+    """
+    计算成功概率表
+    返回: {"horizon": horizon, "banners": {模块名: [k=1的曲线, k=2的曲线, ...]},
+           "mixes": {模块名: {"角色数,武器数": 曲线}}}
+    """
+    table = {"horizon": horizon, "banners": {}, "mixes": {}}
+    for name in sorted(BANNER_MODULES):
+        module = BANNER_MODULES[name]
+        table["banners"][name] = []
+        for up_count in range(1, max_up + 1):
+            if verbose:
+                print("计算 {} 获得{}个UP...".format(name, up_count))
+            pmf = module.calculate_exact_distribution(up_count)
+            table["banners"][name].append(success_curve(pmf, horizon))
+    for name in sorted(MIX_PMFS):
+        table["mixes"][name] = {}
+        for character_count, weapon_count in mix_targets:
+            if verbose:
+                print("计算 {} {}个UP角色+{}把UP武器...".format(name, character_count, weapon_count))
+            pmf = MIX_PMFS[name](character_count, weapon_count)
+            table["mixes"][name][_mix_key(character_count, weapon_count)] = success_curve(pmf, horizon)
+    return table
+
+def save_table(table, path=DEFAULT_TABLE_PATH):
+    with open(path, "w") as f:
+        json.dump(table, f)
+
+def load_table(path=DEFAULT_TABLE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+def query(table, name, pulls, up_count=1, weapon_count=None):
+    """
+    P(pulls抽以内达成目标)
+    单卡池: 目标为至少up_count个UP；组合: 目标为up_count个UP角色 + weapon_count把UP武器
+    超出预计算范围且该点概率尚未到1时抛出ValueError
+    """
+    if name in table["mixes"]:
+        key = _mix_key(up_count, 1 if weapon_count is None else weapon_count)
+        if key not in table["mixes"][name]:
+            raise ValueError("{} 未预计算目标 {}".format(name, key))
+        curve = table["mixes"][name][key]
+    elif name in table["banners"]:
+        curves = table["banners"][name]
+        if up_count <= 0:
+            return 1.0
+        if up_count > len(curves):
+            raise ValueError("{} 只预计算到{}个UP".format(name, len(curves)))
+        curve = curves[up_count - 1]
+    else:
+        raise ValueError("未知的卡池: {}".format(name))
+
+    if pulls < 0:
+        return 0.0
+    if pulls >= len(curve):
+        if curve[-1] >= 1.0 - 1e-12:
+            return 1.0
+        raise ValueError("超出预计算范围({}抽)".format(len(curve) - 1))
+    return curve[pulls]
+
+def main():
+    parser = argparse.ArgumentParser(description="预计算的成功概率表: P(n抽以内达成目标)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    build_parser = subparsers.add_parser("build", help="精确计算并保存概率表")
+    build_parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="最大抽数")
+    build_parser.add_argument("--max-up", type=int, default=DEFAULT_MAX_UP, help="单卡池最大UP数")
+    build_parser.add_argument("--mix", action="append", default=None, metavar="角色数,武器数",
+                              help="组合目标，可重复指定，默认1,1与2,1")
+    build_parser.add_argument("--output", default=DEFAULT_TABLE_PATH, help="保存路径")
+
+    query_parser = subparsers.add_parser("query", help="查询成功概率")
+    query_parser.add_argument("name", help="卡池: " + " / ".join(sorted(BANNER_MODULES) + sorted(MIX_PMFS)))
+    query_parser.add_argument("pulls", type=int, help="抽数")
+    query_parser.add_argument("--up", type=int, default=1, help="UP(角色)数量")
+    query_parser.add_argument("--weapon", type=int, default=None, help="组合中的UP武器数量")
+    query_parser.add_argument("--table", default=DEFAULT_TABLE_PATH, help="概率表路径")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        mix_targets = DEFAULT_MIX_TARGETS
+        if args.mix:
+            mix_targets = [tuple(int(x) for x in item.split(",")) for item in args.mix]
+        table = build_table(args.horizon, args.max_up, mix_targets)
+        save_table(table, args.output)
+        print("已保存: {}".format(args.output))
+    elif args.command == "query":
+        table = load_table(args.table)
+        probability = query(table, args.name, args.pulls, args.up, args.weapon)
+        print("{:.4f}%".format(probability * 100))
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
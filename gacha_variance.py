@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+方差缩减模拟
+抽卡类通过rng参数取随机数，这里提供替换普通随机数流的生成器：
+    "antithetic"  对偶变量：模拟成对进行，第二次依次使用第一次随机数的1-u
+    "sobol"       随机化Sobol序列：每批中第i次模拟使用Sobol序列第i个点的各坐标作为依次用到的随机数，
+                  每批使用独立的随机数字移位(digital shift)，超出维数的随机数用普通随机数补齐
+    "crn"         共同随机数：普通模拟，用于比较目标之间的差值
+各方法下各目标的第b批都使用相同的种子(共同随机数)，批次之间相互独立，因此可以用逐批均值之差估计
+相邻目标期望之差的标准误差；报告同时给出独立模拟时差值的标准误差(两目标标准误差的平方和开方)作为对照
+
+Sobol序列只有SOBOL_DIMENSIONS(21)维，只覆盖一次模拟中最先用到的21个随机数，之后全部是普通随机数：
+    鸣潮角色/武器   直接跳到下一次出5星(出货间隔1个随机数，角色另有判定UP的1个)，21维覆盖获得前几个UP的全部随机数
+    终末地角色/武器 逐抽/逐十连模拟(每抽至少1个随机数)，21维只覆盖前21抽，之后的抽数不受Sobol序列影响
+目标为1时各模块的实测结果(python gacha_variance.py，1024次×32批，相当于普通模拟的倍数样本):
+    模块            每次随机数  对偶变量  Sobol序列  共同随机数下目标2与1之差的标准误差(独立模拟)
+    mc_character    2.5         3.3       约2000     0.20 (0.38)
+    mc_weapon       1.0         2.7       约1000     0.11 (0.22)
+    zmd_character   82.6        1.0       1.5        0.24 (0.36)
+    zmd_weapon      55.9        1.0       3.0        0.14 (0.25)
+终末地卡池的Sobol序列收益有限，对偶变量没有收益；Sobol序列的倍数由32批的均值估计，只表示数量级
+"""
+import argparse
+import math
+import random
+from gacha_stats import PullHistogram
+
+VARIANCE_REDUCTION_NAMES = {
+    None: "无",
+    "antithetic": "对偶变量",
+    "sobol": "随机化Sobol序列",
+    "crn": "共同随机数",
+}
+
+# Sobol序列第2~21维的参数 (多项式次数s, 系数a, 初始方向数m)，取自Joe & Kuo的new-joe-kuo-6.21201
+_SOBOL_PARAMETERS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+_SOBOL_BITS = 32
+SOBOL_DIMENSIONS = len(_SOBOL_PARAMETERS) + 1
+
+def _sobol_direction_numbers(s, a, m):
+    """
+    由本原多项式参数递推出一维的方向数 V[k] (k = 0..31)
+    """
+    v = [0] * _SOBOL_BITS
+    for k in range(s):
+        v[k] = m[k] << (_SOBOL_BITS - 1 - k)
+    for k in range(s, _SOBOL_BITS):
+        value = v[k - s] ^ (v[k - s] >> s)
+        for i in range(1, s):
+            if (a >> (s - 1 - i)) & 1:
+                value ^= v[k - i]
+        v[k] = value
+    return v
+
+# 各维的方向数，第1维为van der Corput序列
+_SOBOL_DIRECTIONS = [[1 << (_SOBOL_BITS - 1 - k) for k in range(_SOBOL_BITS)]] + \
+    [_sobol_direction_numbers(s, a, m) for s, a, m in _SOBOL_PARAMETERS]
+
+class SobolSequence(object):
+    """
+    按Gray码顺序逐点生成Sobol序列(整数形式，每维32位)
+    """
+    def __init__(self, dimensions=SOBOL_DIMENSIONS):
+        self.directions = _SOBOL_DIRECTIONS[:dimensions]
+        self.index = 0
+        self.point = [0] * len(self.directions)
+
+    def next_point(self):
+        """
+        返回当前点并前进到下一个点
+        """
+        point = list(self.point)
+        # 第index+1个点 = 当前点异或(index最低位的0所在位)对应的方向数
+        bit = 0
+        index = self.index
+        while index & 1:
+            index >>= 1
+            bit += 1
+        for j, directions in enumerate(self.directions):
+            self.point[j] ^= directions[bit]
+        self.index += 1
+        return point
+
+class SobolRandom(object):
+    """
+    一次模拟用到的随机数：依次取Sobol点的各坐标(经数字移位)，坐标用完后由pad_rng补齐
+    """
+    def __init__(self, point, shift, pad_rng):
+        scale = 1.0 / (1 << _SOBOL_BITS)
+        self.values = [(x ^ s) * scale for x, s in zip(point, shift)]
+        self.position = 0
+        self.pad_rng = pad_rng
+
+    def random(self):
+        if self.position < len(self.values):
+            u = self.values[self.position]
+            self.position += 1
+            return u
+        return self.pad_rng.random()
+
+    def choice(self, seq):
+        return seq[min(int(self.random() * len(seq)), len(seq) - 1)]
+
+class AntitheticRandom(object):
+    """
+    对偶变量：第一次模拟记录用到的随机数，reflect()后第二次模拟依次使用1-u，超出记录的部分用新随机数
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.recorded = []
+        self.position = None
+
+    def random(self):
+        if self.position is None:
+            u = self.rng.random()
+            self.recorded.append(u)
+            return u
+        if self.position < len(self.recorded):
+            u = 1.0 - self.recorded[self.position]
+            self.position += 1
+            return u
+        return self.rng.random()
+
+    def choice(self, seq):
+        return seq[min(int(self.random() * len(seq)), len(seq) - 1)]
+
+    def reflect(self):
+        """
+        切换到对偶模拟
+        """
+        self.position = 0
+
+class SimulationEstimate(object):
+    """
+    方差缩减模拟的结果：抽数直方图 + 估计标准误差所需的统计量
+    batch_stats记录每批的(样本数, 抽数和)，antithetic模式另记录每对均值的矩，均可跨进程合并
+    """
+    def __init__(self, method=None):
+        self.method = method
+        self.histogram = PullHistogram()
+        self.batch_stats = {}       # {批次序号: (样本数, 抽数和)}
+        self.pair_count = 0         # 对偶样本对数
+        self.pair_sum = 0.0         # 每对均值之和
+        self.pair_sum_sq = 0.0      # 每对均值平方和
+
+    def add_pair(self, first, second):
+        """
+        记录一对对偶样本
+        """
+        self.histogram.add(first)
+        self.histogram.add(second)
+        pair_mean = (first + second) / 2.0
+        self.pair_count += 1
+        self.pair_sum += pair_mean
+        self.pair_sum_sq += pair_mean * pair_mean
+
+    def merge(self, other):
+        """
+        合并另一部分结果
+        """
+        self.histogram.merge(other.histogram)
+        self.batch_stats.update(other.batch_stats)
+        self.pair_count += other.pair_count
+        self.pair_sum += other.pair_sum
+        self.pair_sum_sq += other.pair_sum_sq
+        return self
+
+    def batch_means(self):
+        """
+        每批的均值 {批次序号: 均值}
+        """
+        return dict((batch_index, total / float(n)) for batch_index, (n, total) in self.batch_stats.items() if n > 0)
+
+    def standard_error(self):
+        """
+        期望抽数估计的标准误差，无法估计时返回None
+        普通模拟按独立样本计算；对偶变量按每对均值计算；Sobol序列按各批(独立随机移位)均值计算
+        """
+        histogram = self.histogram
+        if self.method == "antithetic":
+            if self.pair_count <= 1:
+                return None
+            mean = self.pair_sum / self.pair_count
+            variance = max(self.pair_sum_sq / self.pair_count - mean * mean, 0.0)
+            return math.sqrt(variance / (self.pair_count - 1))
+        if self.method == "sobol":
+            return _standard_error_of_mean(list(self.batch_means().values()))
+        if histogram.n <= 1:
+            return None
+        return math.sqrt(histogram.variance() / (histogram.n - 1))
+
+    def efficiency(self):
+        """
+        方差缩减倍数：达到相同标准误差，普通模拟需要的样本数是本方法的多少倍
+        """
+        standard_error = self.standard_error()
+        if not standard_error or self.histogram.n <= 1:
+            return None
+        return self.histogram.variance() / self.histogram.n / (standard_error * standard_error)
+
+def _standard_error_of_mean(values):
+    """
+    独立同分布样本均值的标准误差
+    """
+    n = len(values)
+    if n <= 1:
+        return None
+    mean = sum(values) / float(n)
+    variance = sum((x - mean) ** 2 for x in values) / float(n - 1)
+    return math.sqrt(variance / n)
+
+def difference_standard_error(estimate, previous):
+    """
+    共同随机数下两个目标期望之差的标准误差(按相同批次的均值之差计算)，无法估计时返回None
+    """
+    means = estimate.batch_means()
+    previous_means = previous.batch_means()
+    differences = [means[b] - previous_means[b] for b in means if b in previous_means]
+    return _standard_error_of_mean(differences)
+
+def independent_difference_standard_error(estimate, previous):
+    """
+    两个目标独立模拟时期望之差的标准误差(用于对照共同随机数的效果)，无法估计时返回None
+    """
+    standard_error = estimate.standard_error()
+    previous_error = previous.standard_error()
+    if standard_error is None or previous_error is None:
+        return None
+    return math.sqrt(standard_error * standard_error + previous_error * previous_error)
+
+def simulate_estimate_batch(simulate_one, method, batch_size, seed, batch_index):
+    """
+    按method模拟一批
+    simulate_one(rng)返回一次模拟的抽数；seed为本批种子(同时用于Sobol序列的随机移位与补齐)
+    method为None或"crn"时为普通模拟
+    返回: SimulationEstimate
+    """
+    if method not in VARIANCE_REDUCTION_NAMES:
+        raise ValueError("不支持的方差缩减方法: {}".format(method))
+    rng = random.Random(seed)
+    estimate = SimulationEstimate(method)
+    histogram = estimate.histogram
+    total_before = histogram.sum
+
+    if method == "antithetic":
+        for _ in range(batch_size // 2):
+            pair_rng = AntitheticRandom(rng)
+            first = simulate_one(pair_rng)
+            pair_rng.reflect()
+            estimate.add_pair(first, simulate_one(pair_rng))
+        if batch_size % 2:
+            histogram.add(simulate_one(rng))
+    elif method == "sobol":
+        sequence = SobolSequence()
+        shift = [rng.getrandbits(_SOBOL_BITS) for _ in range(SOBOL_DIMENSIONS)]
+        for _ in range(batch_size):
+            histogram.add(simulate_one(SobolRandom(sequence.next_point(), shift, rng)))
+    else:
+        for _ in range(batch_size):
+            histogram.add(simulate_one(rng))
+
+    estimate.batch_stats[batch_index] = (batch_size, histogram.sum - total_before)
+    return estimate
+
+def print_estimate_summary(estimate, previous=None):
+    """
+    打印标准误差，以及(共同随机数下)与上一个目标期望之差
+    """
+    standard_error = estimate.standard_error()
+    print("方差缩减: {}".format(VARIANCE_REDUCTION_NAMES.get(estimate.method, estimate.method)))
+    if standard_error is None:
+        print("期望抽数标准误差: 样本或批次不足，无法估计")
+    else:
+        efficiency = estimate.efficiency()
+        print("期望抽数标准误差: {:.4f} (相当于普通模拟的{:.2f}倍样本)".format(
+            standard_error, efficiency if efficiency else 0))
+    if previous is not None:
+        difference = estimate.histogram.mean() - previous.histogram.mean()
+        difference_error = difference_standard_error(estimate, previous)
+        independent_error = independent_difference_standard_error(estimate, previous)
+        if difference_error is not None:
+            print("与上一目标的期望差: {:.2f} ± {:.4f} (共同随机数; 独立模拟为 ± {:.4f})".format(
+                difference, difference_error, independent_error or 0))
+
+class _CountingRandom(object):
+    """
+    记录一次模拟用到的随机数个数
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.count = 0
+
+    def random(self):
+        self.count += 1
+        return self.rng.random()
+
+    def choice(self, seq):
+        return seq[min(int(self.random() * len(seq)), len(seq) - 1)]
+
+def compare_methods(simulate_one, num_batches=32, batch_size=1024, seed=0, methods=(None, "antithetic", "sobol")):
+    """
+    在本进程中用相同的批次种子按各方法模拟，比较期望抽数的标准误差
+    返回: {方法: SimulationEstimate}
+    """
+    estimates = {}
+    for method in methods:
+        estimate = SimulationEstimate(method)
+        for batch_index in range(num_batches):
+            estimate.merge(simulate_estimate_batch(simulate_one, method, batch_size, seed + batch_index, batch_index))
+        estimates[method] = estimate
+    return estimates
+
+def random_draws(simulate_one, num_simulations=1000, seed=0):
+    """
+    一次模拟平均用到的随机数个数(与SOBOL_DIMENSIONS比较可知Sobol序列覆盖的比例)
+    """
+    rng = random.Random(seed)
+    total = 0
+    for _ in range(num_simulations):
+        counter = _CountingRandom(rng)
+        simulate_one(counter)
+        total += counter.count
+    return total / float(num_simulations)
+
+def main():
+    """
+    各模块(目标为1)的方差缩减效果，以及共同随机数下目标1与目标2期望之差的标准误差
+    """
+    parser = argparse.ArgumentParser(description="各模块方差缩减效果")
+    parser.add_argument("--batches", type=int, default=32, help="批次数")
+    parser.add_argument("--batch-size", type=int, default=1024, help="每批模拟次数")
+    parser.add_argument("--seed", type=int, default=0, help="第一批的种子")
+    args = parser.parse_args()
+
+    # 各模块导入本模块，在这里导入以避免循环导入
+    import mc_character
+    import mc_weapon
+    import zmd_character
+    import zmd_weapon
+    modules = [mc_character, mc_weapon, zmd_character, zmd_weapon]
+
+    print("{}次 × {}批，Sobol序列维数: {}".format(args.batch_size, args.batches, SOBOL_DIMENSIONS))
+    for module in modules:
+        simulate_one = lambda rng: module.single_simulation(1, rng=rng)
+        print("\n{} (每次模拟平均用到{:.1f}个随机数)".format(module.__name__, random_draws(simulate_one)))
+        estimates = compare_methods(simulate_one, args.batches, args.batch_size, args.seed)
+        for method in (None, "antithetic", "sobol"):
+            estimate = estimates[method]
+            print("    {}: 期望 {:.2f}, 标准误差 {:.4f}, 相当于普通模拟的{:.2f}倍样本".format(
+                VARIANCE_REDUCTION_NAMES[method], estimate.histogram.mean(), estimate.standard_error(),
+                estimate.efficiency()))
+
+        # 共同随机数：目标1与目标2使用相同的批次种子
+        first, second = [compare_methods(lambda rng: module.single_simulation(target, rng=rng), args.batches,
+                                         args.batch_size, args.seed, methods=("crn",))["crn"]
+                         for target in (1, 2)]
+        print("    {}: 目标2与目标1的期望差 {:.2f}, 标准误差 {:.4f} (独立模拟为 {:.4f})".format(
+            VARIANCE_REDUCTION_NAMES["crn"], second.histogram.mean() - first.histogram.mean(),
+            difference_standard_error(second, first), independent_difference_standard_error(second, first)))
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,34 @@
 # -*- coding: utf-8 -*-
 import random
+from bisect import bisect_right
 from multiprocessing import Pool, cpu_count
 import math
+import sys
+import gacha_batch
+from banner import MC_CHARACTER, EXACT_TAIL_TOLERANCE
+from gacha_rng import new_master_seed
+from gacha_metrics import Metrics, write_metrics
+from gacha_stats import build_histogram, histogram_max, histogram_mean, \
+    histogram_median, histogram_percentile, histogram_variance
+
+# 样本文件(gacha_samples)可保存的字段，与single_simulation(details=True)返回的元组一一对应
+SAMPLE_FIELDS = ("pulls", "five_star")
 
 class GachaCharacter(object):
-    def __init__(self):
-        # 基础参数
-        self.base_rate = 0.008              # 基础5星角色概率 0.8%
-        self.up_rate = 0.5                  # up5星角色概率 50% (出5星时有50%是up)
-        self.pity_threshold_1 = (66, 70)    # 概率开始增长的抽数阈值1 (出5星后重置概率，第66~70抽之间增加)
-        self.rate_increase_1 = 0.04         # 每抽概率增长 4%
-        self.pity_threshold_2 = (71, 75)    # 概率开始增长的抽数阈值2 (出5星后重置概率，第71~75抽之间增加)
-        self.rate_increase_2 = 0.08         # 每抽概率增长 8%
-        self.pity_threshold_3 = (76, 79)    # 概率开始增长的抽数阈值3 (出5星后重置概率，第76~79抽之间增加)
-        self.rate_increase_3 = 0.10         # 每抽概率增长 10%
-
-        self.soft_pity = 79                 # 小保底 79抽 (连续未出5星79抽必出5星)
+    def __init__(self, banner=None, rng=None, metrics=None):
+        # 基础参数 (见banner.MC_CHARACTER_SPEC)
+        if banner is None:
+            banner = MC_CHARACTER
+        self.banner = banner
+        self.rng = rng if rng is not None else random   # 随机数生成器 (默认使用全局random模块)
+        self.metrics = metrics                          # 保底机制计数器 (gacha_metrics.Metrics，None为不记录)
+        self.base_rate = banner["base_rate"]        # 基础5星角色概率
+        self.up_rate = banner["up_rate"]            # up5星角色概率 (出5星时为up的概率)
+        self.rate_ramp = banner["rate_ramp"]        # 概率增长阶段 [(起始抽数, 结束抽数, 每抽增长)]
+        self.soft_pity = banner["soft_pity"]        # 小保底 (连续未出5星该抽数必出5星)
+        self.guarantee = banner["guarantee"]        # 大小保底 (上一个5星非UP，则下一个5星必定为UP)
+        self.five_star_rates = banner.rates         # 5星概率表 (按距上次5星的抽数索引)
+        self.five_star_gap_cdf = banner.gap_cdf     # 相邻两次5星间隔抽数的累积分布
 
         # 计数器
         self.total_pulls = 0                # 总抽数
@@ -25,6 +38,12 @@ class GachaCharacter(object):
         self.last_up_five_star_pull = 0     # 上次出UP的抽数
         self.last_five_star_was_up = True   # 上一个5星是否为UP（初始化为True避免第一次就触发）
 
+    def get_five_star_rate(self, pulls_since_five_star):
+        """
+        计算距上次5星第pulls_since_five_star抽时的5星概率
+        """
+        return self.five_star_rates[min(pulls_since_five_star, self.soft_pity)]
+
     def pull_one(self):
         """
         单次抽卡
@@ -33,50 +52,97 @@ class GachaCharacter(object):
         self.total_pulls += 1
         current_pull = self.total_pulls
 
-        # 计算当前5星概率
+        # 查表得到当前5星概率
         pulls_since_five_star = current_pull - self.last_five_star_pull
-        
-        # 基础概率
-        five_star_rate = self.base_rate
-        
-        # 根据抽数增加概率
-        if self.pity_threshold_1[0] <= pulls_since_five_star <= self.pity_threshold_1[1]:
-            five_star_rate += (pulls_since_five_star - self.pity_threshold_1[0] + 1) * self.rate_increase_1
-        elif self.pity_threshold_2[0] <= pulls_since_five_star <= self.pity_threshold_2[1]:
-            five_star_rate += (self.pity_threshold_1[1] - self.pity_threshold_1[0] + 1) * self.rate_increase_1 + \
-                             (pulls_since_five_star - self.pity_threshold_2[0] + 1) * self.rate_increase_2
-        elif self.pity_threshold_3[0] <= pulls_since_five_star <= self.pity_threshold_3[1]:
-            five_star_rate += (self.pity_threshold_1[1] - self.pity_threshold_1[0] + 1) * self.rate_increase_1 + \
-                             (self.pity_threshold_2[1] - self.pity_threshold_2[0] + 1) * self.rate_increase_2 + \
-                             (pulls_since_five_star - self.pity_threshold_3[0] + 1) * self.rate_increase_3
-
-        # 软保底：79抽必出5星
-        if pulls_since_five_star >= self.soft_pity:
-            five_star_rate = 1.0
+        five_star_rate = self.five_star_rates[pulls_since_five_star]
 
         # 抽卡判定
-        if random.random() <= five_star_rate:
+        if self.rng.random() <= five_star_rate:
             # 出5星
             self.five_star_count += 1
             self.last_five_star_pull = current_pull
 
             # 判定是否UP
             # 大小保底机制：如果上一个5星非UP，则下一个5星必定为UP
-            if not self.last_five_star_was_up:
+            guaranteed = self.guarantee and not self.last_five_star_was_up
+            if guaranteed:
                 is_up = True
                 self.last_five_star_was_up = True  # 重置标记
             else:
-                is_up = random.random() <= self.up_rate
+                is_up = self.rng.random() <= self.up_rate
                 self.last_five_star_was_up = is_up  # 记录本次是否为UP
 
             if is_up:
                 self.up_five_star_count += 1
                 self.last_up_five_star_pull = current_pull
 
+            if self.metrics is not None:
+                self.count_five_star(pulls_since_five_star, guaranteed, is_up)
             return (5, is_up)
         else:
             # 未出5星
-            return (random.choice([3, 4]), False)  # 简化非5星掉落逻辑
+            return (self.rng.choice([3, 4]), False)  # 简化非5星掉落逻辑
+
+    def skip_to_five_star(self):
+        """
+        直接跳到下一次出5星（事件跳跃）
+        按间隔抽数的累积分布用一个随机数反查出本次5星所在的抽数，只在出5星时判定UP，
+        结果分布与逐抽调用pull_one直到出5星一致
+        返回: (星级, 是否UP)
+        """
+        cdf = self.five_star_gap_cdf
+        pulls_since_five_star = self.total_pulls - self.last_five_star_pull
+        u = self.rng.random()
+        if pulls_since_five_star > 0:
+            # 已经连续pulls_since_five_star抽未出5星，按条件分布抽取
+            survived = cdf[pulls_since_five_star - 1]
+            u = survived + u * (1.0 - survived)
+        gap = min(bisect_right(cdf, u) + 1, len(cdf))
+
+        self.total_pulls = self.last_five_star_pull + gap
+        current_pull = self.total_pulls
+
+        # 出5星
+        self.five_star_count += 1
+        self.last_five_star_pull = current_pull
+
+        # 判定是否UP
+        # 大小保底机制：如果上一个5星非UP，则下一个5星必定为UP
+        guaranteed = self.guarantee and not self.last_five_star_was_up
+        if guaranteed:
+            is_up = True
+            self.last_five_star_was_up = True  # 重置标记
+        else:
+            is_up = self.rng.random() <= self.up_rate
+            self.last_five_star_was_up = is_up  # 记录本次是否为UP
+
+        if is_up:
+            self.up_five_star_count += 1
+            self.last_up_five_star_pull = current_pull
+
+        if self.metrics is not None:
+            self.count_five_star(gap, guaranteed, is_up)
+        return (5, is_up)
+
+    def count_five_star(self, pulls_since_five_star, guaranteed, is_up):
+        """
+        记录一次出5星触发的机制(仅在启用计数器时调用)
+        """
+        metrics = self.metrics
+        metrics.count("five_star")
+        if pulls_since_five_star >= self.soft_pity:
+            metrics.count("soft_pity")
+        if guaranteed:
+            metrics.count("guarantee")
+        if is_up:
+            metrics.count("up")
+
+    def get_state(self):
+        """
+        当前的保底状态，用于从该状态继续计算剩余抽数的分布(见calculate_exact_distribution的state参数)
+        返回: (距上次5星的抽数, 上一个5星是否为UP)
+        """
+        return (self.total_pulls - self.last_five_star_pull, self.last_five_star_was_up)
 
     def reset(self):
         """
@@ -89,19 +155,126 @@ class GachaCharacter(object):
         self.last_up_five_star_pull = 0
         self.last_five_star_was_up = True
 
-def single_simulation(target_up_count):
+def single_simulation(target_up_count, record_all=False, rng=None, banner=None, metrics=None, details=False):
     """
     单次模拟函数，用于并行处理
     返回获得指定数量UP所需的抽数
+    record_all为True时返回列表，第k-1项为获得第k只UP时的抽数(k = 1..target_up_count)，
+    一次模拟即可同时得到所有较小目标的结果
+    rng: 随机数生成器，默认使用全局random模块
+    banner: 卡池参数(banner.Banner)，默认使用本模块的卡池
+    metrics: gacha_metrics.Metrics，记录模拟次数、抽数与保底机制的触发次数，默认不记录
+    details: 为True时(record_all为False)返回与SAMPLE_FIELDS对应的元组
     """
-    gacha = GachaCharacter()
+    gacha = GachaCharacter(banner=banner, rng=rng, metrics=metrics)
+    pulls_at_up = []
     
-    # 持续抽卡直到获得目标数量的UP
+    # 持续抽卡直到获得目标数量的UP（直接跳到每次出5星，不逐抽模拟）
     while gacha.up_five_star_count < target_up_count:
-        gacha.pull_one()
+        gacha.skip_to_five_star()
+        if record_all:
+            # 一抽可能同时获得多个UP，本抽越过的每个UP数都记为当前抽数
+            while len(pulls_at_up) < min(gacha.up_five_star_count, target_up_count):
+                pulls_at_up.append(gacha.total_pulls)
     
+    if metrics is not None:
+        metrics.count("simulations")
+        metrics.count("pulls", gacha.total_pulls)
+    if record_all:
+        return pulls_at_up
+    if details:
+        return gacha.total_pulls, gacha.five_star_count
     return gacha.total_pulls
 
+def simulate_batch(args):
+    """
+    进程池任务：(目标, 本批次数, 种子[, 是否启用计数器])，见gacha_batch.simulate_batch
+    """
+    return gacha_batch.simulate_batch((single_simulation,) + tuple(args))
+
+def simulate_batch_multi(args):
+    """
+    进程池任务：(目标列表, 本批次数, 种子[, 是否启用计数器])，见gacha_batch.simulate_batch_multi
+    """
+    return gacha_batch.simulate_batch_multi((single_simulation,) + tuple(args))
+
+def cache_params(target_up_count, engine, gacha=None):
+    """
+    结果缓存的键参数：卡池参数(决定了GachaCharacter的全部基础参数)、目标与计算方式
+    """
+    if gacha is None:
+        gacha = GachaCharacter()
+    return {"module": "mc_character", "banner": gacha.banner.spec, "target": target_up_count, "engine": engine}
+
+def replay_simulation(target_up_count, master_seed, index, batch_size=10000, record_all=False):
+    """
+    重放主种子为master_seed的模拟中第index次(从0开始)的结果
+    batch_size需与原模拟一致；单趟模式的结果用最大目标加record_all=True重放
+    """
+    return gacha_batch.replay_simulation(single_simulation, target_up_count, master_seed, index, batch_size,
+                                         record_all=record_all)
+
+def pull_transitions(gacha, banner_state, current_pull=None):
+    """
+    抽一抽的状态转移，精确计算与多卡池计划(gacha_campaign)共用
+    banner_state: (距上次5星的抽数, 上一个5星是否为UP)；current_pull不影响转移
+    返回: [(下一状态, 概率, 获得的UP数)]
+    """
+    pulls_since_five_star, last_five_star_was_up = banner_state
+    pulls_since_five_star += 1
+    five_star_rate = gacha.five_star_rates[min(pulls_since_five_star, gacha.soft_pity)]
+    # 上一个5星非UP则必定UP，否则按up_rate判定
+    up_prob = five_star_rate * (gacha.up_rate if last_five_star_was_up or not gacha.guarantee else 1.0)
+    return [
+        ((pulls_since_five_star, last_five_star_was_up), 1.0 - five_star_rate, 0),
+        ((0, True), up_prob, 1),
+        ((0, False), five_star_rate - up_prob, 0),
+    ]
+
+def calculate_exact_distribution(target_up_count, gacha=None, state=None):
+    """
+    精确计算获得指定数量UP所需抽数的概率分布（马尔可夫链，无需模拟）
+    状态: ((距上次5星的抽数, 上一个5星是否为UP), 已获得UP数)，逐抽按pull_transitions转移
+    state: 起始保底状态 (距上次5星的抽数, 上一个5星是否为UP)，见GachaCharacter.get_state；默认从零开始
+    返回: 列表pmf, pmf[n]为从起始状态再抽n抽恰好获得第target_up_count只UP的概率
+    没有大小保底(guarantee为False)且up_rate小于1时抽数无上界，剩余概率低于EXACT_TAIL_TOLERANCE时停止
+    """
+    if gacha is None:
+        gacha = GachaCharacter()
+    if target_up_count <= 0:
+        return [1.0]
+
+    unbounded = not gacha.guarantee and gacha.up_rate < 1.0
+    pmf = [0.0]
+    start = tuple(state) if state is not None else (0, True)
+    states = {(start, 0): 1.0}
+    current_pull = 0
+    # 转移与抽数无关，按保底状态缓存(去掉概率为0的转移)，逐抽复用
+    transitions = {}
+    while states:
+        current_pull += 1
+        next_states = {}
+        finished = 0.0
+        for (banner_state, up_count), prob in states.items():
+            options = transitions.get(banner_state)
+            if options is None:
+                options = transitions[banner_state] = [option for option in pull_transitions(gacha, banner_state)
+                                                       if option[1] > 0]
+            for next_state, transition_prob, up_gained in options:
+                if up_count + up_gained >= target_up_count:
+                    finished += prob * transition_prob
+                elif prob * transition_prob > 0:
+                    # 概率下溢为0的状态不再保留
+                    key = (next_state, up_count + up_gained)
+                    next_states[key] = next_states.get(key, 0.0) + prob * transition_prob
+
+        pmf.append(finished)
+        states = next_states
+        if unbounded and sum(states.values()) < EXACT_TAIL_TOLERANCE:
+            break
+
+    return pmf
+
 def calculate_variance(data, mean):
     """
     计算方差
@@ -125,10 +298,17 @@ def create_distribution_report(data, target_up_count, num_simulations):
     """
     创建分布报告（打印形式）
     """
+    create_histogram_report(build_histogram(data), target_up_count, num_simulations)
+
+def create_histogram_report(histogram, target_up_count, num_simulations):
+    """
+    根据抽数直方图创建分布报告（打印形式）
+    histogram[n]为恰好n抽获得目标的人数，精确分布时为期望人数
+    """
     # 计算基本统计数据
-    avg_pulls = sum(data) / float(len(data))
-    median_pulls = calculate_median(data)
-    variance = calculate_variance(data, avg_pulls)
+    avg_pulls = histogram_mean(histogram)
+    median_pulls = histogram_median(histogram)
+    variance = histogram_variance(histogram, avg_pulls)
     std_deviation = math.sqrt(variance)
     
     print "\n获得{}只UP角色的统计信息:".format(target_up_count)
@@ -137,32 +317,28 @@ def create_distribution_report(data, target_up_count, num_simulations):
     print "方差: {:.2f}".format(variance)
     print "标准差: {:.2f}".format(std_deviation)
     # 计算并显示指定百分位数的抽数
-    sorted_data = sorted(data)
     percentiles = [10, 25, 50, 75, 90]
     print("\n分位数信息:")
     print("-" * 30)
     for p in percentiles:
-        index = int((p / 100.0) * (len(sorted_data) - 1))
-        percentile_value = sorted_data[index]
+        percentile_value = histogram_percentile(histogram, p)
         print("{}% 分位数: {} 抽".format(p, int(percentile_value)))
 
     # 按10抽为单位分组
-    max_pulls = max(data) if data else 0
+    max_pulls = histogram_max(histogram)
     if max_pulls == 0:
         print "无有效数据"
         return
     
     # 创建区间
     bins = range(1, max_pulls + 11, 10)
-    histogram = [0] * (len(bins) - 1)
-    max_pull_histogram = 0
+    bin_histogram = [0] * (len(bins) - 1)
+    max_pull_histogram = histogram[max_pulls]
     
     # 统计各区间的数量
-    for pulls in data:
-        bin_index = min((pulls - 1) // 10, len(histogram) - 1)
-        histogram[bin_index] += 1
-        if pulls == max_pulls:
-            max_pull_histogram += 1
+    for pulls in range(1, max_pulls + 1):
+        bin_index = min((pulls - 1) // 10, len(bin_histogram) - 1)
+        bin_histogram[bin_index] += histogram[pulls]
     
     # 打印分布表
     print "\n获得{}只UP角色所需抽数分布:".format(target_up_count)
@@ -174,8 +350,8 @@ def create_distribution_report(data, target_up_count, num_simulations):
     max_bin_count = 0
     max_bin_range = ""
     
-    for i in range(len(histogram)):
-        count = histogram[i]
+    for i in range(len(bin_histogram)):
+        count = bin_histogram[i]
         if count > 0:
             percentage = count * 100.0 / num_simulations
             cumulative += count
@@ -193,7 +369,7 @@ def create_distribution_report(data, target_up_count, num_simulations):
             
             print "{:<10} {:<10} {:<10} {:<15}".format(
                 "{}-{}".format(bins[i], bins[i]+9),
-                count,
+                int(round(count)),
                 cumulative_percentage_str,
                 percentage_str
             )
@@ -205,22 +381,59 @@ def create_distribution_report(data, target_up_count, num_simulations):
         print "保底数据(保底人数大于5%时显示):"
         print "{:<10} {:<10} {:<15.2f}".format(
             "{}-{}".format(max_pulls, max_pulls),
-            max_pull_histogram,
+            int(round(max_pull_histogram)),
             max_pulls_percentage
         )
     
     print "-" * 50
-    print "累计人数: {}".format(cumulative)
+    print "累计人数: {}".format(int(round(cumulative)))
     print "累计占比: {:.2f}%".format(cumulative_percentage if 'cumulative_percentage' in locals() else 0)
     print "最大抽数区间: {} (人数: {}, 占比: {:.2f}%)".format(
-        max_bin_range, max_bin_count, max_bin_count * 100.0 / num_simulations)
+        max_bin_range, int(round(max_bin_count)), max_bin_count * 100.0 / num_simulations)
     print "=" * 50
 
-def simulate_gacha_distribution(num_simulations=10000):
+def run_vectorized(run, target_up_count):
+    """
+    NumPy向量化模拟(simulate_gacha_distribution的engine="vectorized")
+    """
+    import mc_vectorized  # 需要NumPy，仅在使用向量化模拟时导入
+    results = mc_vectorized.simulate_character_population(target_up_count, run.num_simulations, seed=run.master_seed)
+    create_histogram_report(mc_vectorized.population_histogram(results), target_up_count, run.num_simulations)
+
+# simulate_gacha_distribution的运行方式 -> 处理函数(见gacha_batch.distribution_mode)
+DISTRIBUTION_MODES = dict(gacha_batch.DISTRIBUTION_MODES, vectorized=run_vectorized)
+
+def simulate_gacha_distribution(num_simulations=10000, engine="simulation", batch_size=10000, single_pass=None,
+                                seed=None, variance_reduction=None, tolerance=None,
+                                cache=None, metrics_path=None, raw_samples=False,
+                                samples_path=None, sample_fields=None):
     """
     模拟抽卡分布并生成报告
+    engine之外的模拟方式(单趟、方差缩减、自适应停止、结果缓存、样本文件、原始样本)互斥，各自只接受说明中的选项，
+    不支持的参数组合抛出ValueError(见gacha_batch.distribution_mode)
+    :param num_simulations: 模拟次数（精确计算时用于换算报告中的人数）
+    :param engine: "simulation" 蒙特卡洛模拟; "exact" 马尔可夫链精确计算; "vectorized" NumPy向量化模拟
+    :param batch_size: 每个进程池任务连续模拟的次数
+    :param single_pass: 不设置其他模拟方式时默认为单趟模式：每次模拟只跑到最大目标，所有目标的报告来自同一批模拟；
+                        False为逐个目标普通模拟
+    :param seed: 主种子，相同的主种子与batch_size得到完全相同的结果(与进程数无关)，为None时随机生成
+    :param variance_reduction: 方差缩减方法 None/"antithetic"/"sobol"/"crn"(见gacha_variance)，
+                               启用时逐个目标模拟(各目标使用相同的批次种子即共同随机数)并报告标准误差，
+                               "crn"为普通模拟，报告与上一目标之差的标准误差(及独立模拟时的对照)
+    :param tolerance: 自适应停止的容差(抽)，设置后num_simulations作为模拟次数上限，逐个目标分轮模拟，
+                      直到期望与10/25/50/75/90分位数的95%置信区间半宽都不超过该值
+    :param cache: gacha_cache.ResultCache，命中时直接使用已保存的结果，模拟次数不足时只补充缺少的部分(也可用于精确计算)
+    :param metrics_path: 设置后各批次记录保底机制触发次数与用时，合并后保存到该JSON文件(仅用于单趟模式与普通模拟)
+    :param raw_samples: 为True时保留每次模拟的抽数(array('H')打包传输)，由create_distribution_report生成报告
+    :param samples_path: 设置后把每次模拟的结果写入该内存映射样本文件(可含{target}，按目标分别保存)，
+                         报告从文件分块流式统计，适合远超内存的模拟次数
+    :param sample_fields: 样本文件保存的字段，可选SAMPLE_FIELDS，默认只保存抽数(仅用于samples_path)
     """
     target_up_counts = [1,]
+    mode = gacha_batch.distribution_mode(DISTRIBUTION_MODES, engine, single_pass,
+                                         variance_reduction=variance_reduction, tolerance=tolerance, cache=cache,
+                                         metrics_path=metrics_path, raw_samples=raw_samples,
+                                         samples_path=samples_path, sample_fields=sample_fields)
 
     # 确定并行进程数
     num_processes = min(cpu_count(), 4)  # 限制最多使用4个进程，避免过度占用CPU
@@ -229,23 +442,32 @@ def simulate_gacha_distribution(num_simulations=10000):
     print "开始鸣潮角色模拟计算..."
     print "=" * 50
     print "模拟次数: {}".format(num_simulations)
-    
+
+    # 主种子：每批的随机数种子都由它和批次序号派生
+    master_seed = seed if seed is not None else new_master_seed()
+    print "随机种子: {}".format(master_seed)
+
+    # 保底机制计数器：各批次在进程内计数，主进程合并
+    metrics = Metrics() if metrics_path is not None else None
+
+    # 所有目标共用一个进程池，避免每个目标重新创建进程
+    pool = Pool(processes=num_processes) if mode in gacha_batch.POOL_MODES else None
+    run = gacha_batch.DistributionRun(sys.modules[__name__], "mc_character", pool, target_up_counts, master_seed,
+                                      num_simulations, batch_size, metrics,
+                                      variance_reduction=variance_reduction, tolerance=tolerance, cache=cache,
+                                      samples_path=samples_path, sample_fields=sample_fields)
+
     for target_up_count in target_up_counts:
         print "\n正在计算获得{}只UP的分布...".format(target_up_count)
-        
-        # 使用进程池进行并行计算
-        try:
-            pool = Pool(processes=num_processes)
-            tasks = [target_up_count] * num_simulations
-            results = pool.map(single_simulation, tasks)
-            pool.close()
-            pool.join()
-        except Exception as e:
-            print "并行计算出错: {}".format(e)
-            continue
-        
-        # 生成分布报告
-        create_distribution_report(results, target_up_count, num_simulations)
+        DISTRIBUTION_MODES[mode](run, target_up_count)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if metrics is not None:
+        write_metrics(metrics_path, metrics, module="mc_character", seed=master_seed, num_simulations=num_simulations)
+        print "计数器已保存: {}".format(metrics_path)
     
     print "\n参数设置:"
     gacha = GachaCharacter()  # 创建实例只是为了访问参数
@@ -1,78 +1,208 @@
 # -*- coding: utf-8 -*-
 import random
 import math
+import gacha_batch
+import mc_character
+import mc_weapon
 from mc_character import GachaCharacter
 from mc_weapon import GachaWeapon
+from gacha_stats import build_histogram, pmf_to_histogram, convolve_pmf, histogram_max, histogram_mean, \
+    histogram_median, histogram_percentile, histogram_variance, PullHistogram
+from gacha_rng import new_master_seed, derive_seed, split_batches
+from gacha_adaptive import run_until_converged, print_convergence_summary
+from gacha_cache import cached_value, cached_histogram
+from gacha_metrics import Metrics, write_metrics
 from multiprocessing import Pool, cpu_count
 
-def single_simulation_combined(args):
+# 样本文件(gacha_samples)可保存的字段，与single_simulation_combined(details=True)返回的元组一一对应
+SAMPLE_FIELDS = ("pulls", "character_five_star", "weapon_five_star")
+
+def single_simulation_combined(args, rng=None, metrics=None, details=False):
     """
     单次模拟函数，用于并行处理
     返回获得指定数量UP角色和UP武器所需的抽数
+    rng: 随机数生成器，默认使用全局random模块
+    metrics: gacha_metrics.Metrics，记录保底机制触发次数与角色池/武器池抽卡用时，默认不记录
+    details: 为True时返回与SAMPLE_FIELDS对应的元组
     """
     character_count, weapon_count = args
     # 创建新的角色池和武器池实例
-    char_gacha = GachaCharacter()
-    weapon_gacha = GachaWeapon()
+    char_gacha = GachaCharacter(rng=rng, metrics=metrics)
+    weapon_gacha = GachaWeapon(rng=rng, metrics=metrics)
+    pull_character = char_gacha.pull_one
+    pull_weapon = weapon_gacha.pull_one
+    if metrics is not None:
+        pull_character = metrics.timed("character_pulls", pull_character)
+        pull_weapon = metrics.timed("weapon_pulls", pull_weapon)
     
     # 模拟直到达到目标
     while (char_gacha.up_five_star_count < character_count or weapon_gacha.up_five_star_count < weapon_count):
         # 抽角色池
         if char_gacha.up_five_star_count < character_count:
-            char_gacha.pull_one()
+            pull_character()
 
         # 抽武器池
         if weapon_gacha.up_five_star_count < weapon_count:
-            weapon_gacha.pull_one()
+            pull_weapon()
     
+    if metrics is not None:
+        metrics.count("simulations")
+        metrics.count("pulls", char_gacha.total_pulls + weapon_gacha.total_pulls)
+    if details:
+        return char_gacha.total_pulls + weapon_gacha.total_pulls, char_gacha.five_star_count, \
+               weapon_gacha.five_star_count
     # 返回总抽数（只需要角色抽数，因为武器是用票抽的）
     return char_gacha.total_pulls + weapon_gacha.total_pulls
 
-def simulate_optimized_strategy(character_count, weapon_count, num_simulations=100000):
+def simulate_batch_combined(args):
+    """
+    进程池任务：(角色数, 武器数, 本批次数, 种子[, 是否启用计数器])，见gacha_batch.simulate_batch
+    """
+    character_count, weapon_count = args[:2]
+    return gacha_batch.simulate_batch((single_simulation_combined, (character_count, weapon_count)) + tuple(args[2:]))
+
+def cache_params_combined(character_count, weapon_count, engine, **extra):
+    """
+    结果缓存的键参数：角色池与武器池的卡池参数、目标与计算方式
+    """
+    params = {
+        "module": "mc_mix",
+        "banner": [GachaCharacter().banner.spec, GachaWeapon().banner.spec],
+        "target": [character_count, weapon_count],
+        "engine": engine,
+    }
+    params.update(extra)
+    return params
+
+def replay_simulation_combined(character_count, weapon_count, master_seed, index, batch_size=10000):
+    """
+    重放主种子为master_seed的模拟中第index次(从0开始)的结果，batch_size需与原模拟一致
+    """
+    return gacha_batch.replay_simulation(single_simulation_combined, (character_count, weapon_count), master_seed,
+                                         index, batch_size)
+
+def simulate_optimized_strategy(character_count, weapon_count, num_simulations=100000, batch_size=10000,
+                                pool=None, seed=None, tolerance=None, cache=None, metrics=None):
     """
     模拟优化策略：利用角色抽卡获得的武器票抽取武器
     :param character_count: 需要的UP角色数量
     :param weapon_count: 需要的UP武器数量
     :param num_simulations: 模拟次数
-    :return: 平均抽数列表
+    :param batch_size: 每个进程池任务连续模拟的次数
+    :param pool: 共用的进程池，为None时临时创建
+    :param seed: 主种子，相同的主种子与batch_size得到完全相同的结果(与进程数无关)，为None时随机生成
+    :param tolerance: 自适应停止的容差(抽)，设置后num_simulations作为模拟次数上限，分轮模拟直到期望与
+                      10/25/50/75/90分位数的95%置信区间半宽都不超过该值
+    :param cache: gacha_cache.ResultCache，命中时直接使用已保存的结果，模拟次数不足时只补充缺少的部分
+    :param metrics: gacha_metrics.Metrics，设置后各批次记录保底机制触发次数与用时并合并到其中(仅用于固定次数模拟)
+    tolerance与cache不能同时使用，metrics不能与两者之一同时使用，否则抛出ValueError
+    并行计算出错时，固定次数模拟回退到串行计算(结果相同)；自适应停止与结果缓存直接抛出异常。临时创建的进程池总会关闭
+    :return: 抽数直方图累加器PullHistogram
+             (早期版本返回每次模拟抽数的列表，需要列表时使用simulate_optimized_strategy_results)
     """
-    
+    if tolerance is not None and cache is not None:
+        raise ValueError("tolerance, cache不能同时使用")
+    if metrics is not None and (tolerance is not None or cache is not None):
+        raise ValueError("metrics仅用于固定次数模拟，不能与tolerance或cache同时使用")
+
     # 确定并行进程数
     num_processes = min(cpu_count(), 4)  # 限制最多使用4个进程，避免过度占用CPU
     
     print("模拟次数: {}".format(num_simulations))
+
+    # 主种子：每批的随机数种子都由它和批次序号派生
+    master_seed = seed if seed is not None else new_master_seed()
+    print("随机种子: {}".format(master_seed))
+    tasks = [(character_count, weapon_count, size, derive_seed(master_seed, batch_index), metrics is not None)
+             for batch_index, size in split_batches(num_simulations, batch_size)]
     
     # 使用进程池进行并行计算
-    try:
+    own_pool = pool is None
+    if own_pool:
         pool = Pool(processes=num_processes)
-        tasks = [(character_count, weapon_count)] * num_simulations
-        results = pool.map(single_simulation_combined, tasks)
-        pool.close()
-        pool.join()
-        
-        return results
-
-    except Exception as e:
-        print("并行计算出错: {}".format(e))
-        # 出错时回退到串行计算
-        total_pulls_list = []
-        for i in range(num_simulations):
-            # 创建新的角色池和武器池实例
-            char_gacha = GachaCharacter()
-            weapon_gacha = GachaWeapon()
-            
-            # 模拟直到达到目标
-            while (char_gacha.up_five_star_count < character_count or weapon_gacha.up_five_star_count < weapon_count):
-                # 抽角色池
-                if char_gacha.up_five_star_count < character_count:
-                    char_gacha.pull_one()
+    try:
+        if tolerance is not None:
+            # 自适应停止：分轮模拟，置信区间足够窄时提前结束(出错时直接抛出，不回退)
+            histogram, half_widths, converged = run_until_converged(
+                pool, simulate_batch_combined,
+                lambda batch_index, size: (character_count, weapon_count, size, derive_seed(master_seed, batch_index)),
+                num_simulations, batch_size, tolerance)
+            print_convergence_summary(histogram, half_widths, tolerance, converged)
+            return histogram
+        if cache is not None:
+            # 结果缓存：已有足够样本时直接返回，否则只补充缺少的批次(出错时直接抛出，不回退)
+            return cached_histogram(
+                cache, cache_params_combined(character_count, weapon_count, "simulation"), num_simulations,
+                batch_size, master_seed,
+                lambda seed, batches: gacha_batch.run_batches(pool, single_simulation_combined,
+                                                              (character_count, weapon_count), seed, batches))
+
+        # 固定次数模拟：各批次的计数器先在本地合并，成功后才并入metrics
+        try:
+            histogram, batch_metrics = PullHistogram(), Metrics()
+            for partial in pool.imap_unordered(simulate_batch_combined, tasks):
+                if metrics is not None:
+                    partial, counts = partial
+                    batch_metrics.merge(counts)
+                histogram.merge(partial)
+        except Exception as e:
+            print("并行计算出错: {}".format(e))
+            # 出错时回退到串行计算（逐批执行相同的任务，结果与并行计算一致）
+            histogram, batch_metrics = PullHistogram(), Metrics()
+            for task in tasks:
+                partial = simulate_batch_combined(task)
+                if metrics is not None:
+                    partial, counts = partial
+                    batch_metrics.merge(counts)
+                histogram.merge(partial)
 
-                # 抽武器池
-                if weapon_gacha.up_five_star_count < weapon_count:
-                    weapon_gacha.pull_one()
+        if metrics is not None:
+            metrics.merge(batch_metrics)
+        return histogram
+    finally:
+        if own_pool:
+            pool.terminate()
+            pool.join()
 
-            # 返回总抽数（只需要角色抽数，因为武器是用票抽的）
-            return char_gacha.total_pulls + weapon_gacha.total_pulls
+def simulate_optimized_strategy_results(character_count, weapon_count, num_simulations=100000, batch_size=10000,
+                                        pool=None, seed=None):
+    """
+    与早期版本的simulate_optimized_strategy相同，返回每次模拟抽数的列表(按模拟序号排列)
+    相同的主种子与batch_size时，与simulate_optimized_strategy返回的直方图来自同一组模拟
+    """
+    master_seed = seed if seed is not None else new_master_seed()
+    own_pool = pool is None
+    if own_pool:
+        pool = Pool(processes=min(cpu_count(), 4))
+    try:
+        return list(gacha_batch.simulate_samples(pool, single_simulation_combined, (character_count, weapon_count),
+                                                 master_seed, num_simulations, batch_size))
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+
+# 角色池/武器池边缘分布缓存: {(目标数量, 起始状态): pmf}
+_character_pmf_cache = {}
+_weapon_pmf_cache = {}
+
+def calculate_exact_combined_distribution(character_count, weapon_count, state=None):
+    """
+    精确计算获得指定数量UP角色和UP武器所需总抽数的概率分布
+    角色池与武器池相互独立，总抽数分布即两个边缘分布的卷积；边缘分布按目标数量与起始状态缓存，多个目标组合共用
+    state: 起始保底状态 (角色池状态, 武器池状态)，见GachaCharacter.get_state/GachaWeapon.get_state；默认从零开始
+    返回: 列表pmf, pmf[n]为(从起始状态)总抽数恰好为n的概率
+    """
+    character_state, weapon_state = state if state is not None else (None, None)
+    character_key = (character_count, character_state)
+    weapon_key = (weapon_count, weapon_state)
+    if character_key not in _character_pmf_cache:
+        _character_pmf_cache[character_key] = mc_character.calculate_exact_distribution(
+            character_count, state=character_state)
+    if weapon_key not in _weapon_pmf_cache:
+        _weapon_pmf_cache[weapon_key] = mc_weapon.calculate_exact_distribution(weapon_count, state=weapon_state)
+
+    return convolve_pmf(_character_pmf_cache[character_key], _weapon_pmf_cache[weapon_key])
 
 def calculate_variance(data, mean):
     """
@@ -97,10 +227,17 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
     """
     创建分布报告（打印形式）
     """
+    create_histogram_report(build_histogram(data), character_count, weapon_count, num_simulations)
+
+def create_histogram_report(histogram, character_count, weapon_count, num_simulations):
+    """
+    根据抽数直方图创建分布报告（打印形式）
+    histogram[n]为恰好n抽达成目标的人数，精确分布时为期望人数
+    """
     # 计算基本统计数据
-    avg_pulls = sum(data) / float(len(data))
-    median_pulls = calculate_median(data)
-    variance = calculate_variance(data, avg_pulls)
+    avg_pulls = histogram_mean(histogram)
+    median_pulls = histogram_median(histogram)
+    variance = histogram_variance(histogram, avg_pulls)
     std_deviation = math.sqrt(variance)
     
     print("\n获得{}个UP角色+{}把UP武器的统计信息:".format(character_count, weapon_count))
@@ -109,32 +246,28 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
     print("方差: {:.2f}".format(variance))
     print("标准差: {:.2f}".format(std_deviation))
     # 计算并显示指定百分位数的抽数
-    sorted_data = sorted(data)
     percentiles = [10, 25, 50, 75, 90]
     print("\n分位数信息:")
     print("-" * 30)
     for p in percentiles:
-        index = int((p / 100.0) * (len(sorted_data) - 1))
-        percentile_value = sorted_data[index]
+        percentile_value = histogram_percentile(histogram, p)
         print("{}% 分位数: {} 抽".format(p, int(percentile_value)))
 
     # 按10抽为单位分组
-    max_pulls = max(data) if data else 0
+    max_pulls = histogram_max(histogram)
     if max_pulls == 0:
         print("无有效数据")
         return
     
     # 创建区间
     bins = range(1, max_pulls + 11, 10)
-    histogram = [0] * (len(bins) - 1)
-    max_pull_histogram = 0
+    bin_histogram = [0] * (len(bins) - 1)
+    max_pull_histogram = histogram[max_pulls]
     
     # 统计各区间的数量
-    for pulls in data:
-        bin_index = min(pulls // 10, len(histogram) - 1)
-        histogram[bin_index] += 1
-        if pulls == max_pulls:
-            max_pull_histogram += 1
+    for pulls in range(max_pulls + 1):
+        bin_index = min(pulls // 10, len(bin_histogram) - 1)
+        bin_histogram[bin_index] += histogram[pulls]
     
     # 打印分布表
     print("\n获得{}个UP角色+{}把UP武器所需抽数分布:".format(character_count, weapon_count))
@@ -146,8 +279,8 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
     max_bin_count = 0
     max_bin_range = ""
 
-    for i in range(len(histogram)):
-        count = histogram[i]
+    for i in range(len(bin_histogram)):
+        count = bin_histogram[i]
         if count > 0:
             percentage = count * 100.0 / num_simulations
             cumulative += count
@@ -165,7 +298,7 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
             
             print("{:<10} {:<10} {:<10} {:<15}".format(
                 "{}-{}".format(bins[i], bins[i]+9), 
-                count,
+                int(round(count)),
                 cumulative_percentage_str,
                 percentage_str
             ))
@@ -177,20 +310,90 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
         print("保底数据(保底人数大于5%时显示):")
         print("{:<10} {:<10} {:<15.2f}".format(
             "{}-{}".format(max_pulls-9, max_pulls),
-            max_pull_histogram,
+            int(round(max_pull_histogram)),
             max_pulls_percentage
         ))
     
     print("-" * 50)
-    print("累计人数: {}".format(cumulative))
+    print("累计人数: {}".format(int(round(cumulative))))
     print("累计占比: {:.2f}%".format(cumulative_percentage if 'cumulative_percentage' in locals() else 0))
     print("最大抽数区间: {} (人数: {}, 占比: {:.2f}%)".format(
-        max_bin_range, max_bin_count, max_bin_count * 100.0 / num_simulations))
+        max_bin_range, int(round(max_bin_count)), max_bin_count * 100.0 / num_simulations))
     print("=" * 50)
 
+def run_exact_combined(run, character_count, weapon_count):
+    """
+    边缘分布卷积精确计算(可使用结果缓存)
+    """
+    pmf = cached_value(run.options.get("cache"), cache_params_combined(character_count, weapon_count, "exact"),
+                       lambda: calculate_exact_combined_distribution(character_count, weapon_count))
+    create_histogram_report(pmf_to_histogram(pmf, run.num_simulations), character_count, weapon_count,
+                            run.num_simulations)
+
+def run_simulation_combined(run, character_count, weapon_count):
+    """
+    固定次数模拟、自适应停止(tolerance)或结果缓存(cache)，由simulate_optimized_strategy处理
+    """
+    histogram = simulate_optimized_strategy(character_count, weapon_count, run.num_simulations, run.batch_size,
+                                            pool=run.pool, tolerance=run.options.get("tolerance"),
+                                            cache=run.options.get("cache"), metrics=run.metrics)
+    create_histogram_report(histogram.counts, character_count, weapon_count, histogram.n)
+
+def run_samples_path_combined(run, character_count, weapon_count):
+    """
+    样本文件：每次模拟的结果写入内存映射文件(路径可含{character}和{weapon})，报告从文件分块流式统计
+    """
+    path = run.options["samples_path"].format(character=character_count, weapon=weapon_count)
+    master_seed = new_master_seed()
+    print("随机种子: {}".format(master_seed))
+    with gacha_batch.simulate_samples_to_file(run.pool, single_simulation_combined, SAMPLE_FIELDS, path,
+                                              (character_count, weapon_count), master_seed, run.num_simulations,
+                                              run.batch_size, run.options.get("sample_fields") or ("pulls",),
+                                              module=run.name) as sample_file:
+        create_distribution_report(sample_file, character_count, weapon_count, run.num_simulations)
+    print("样本已保存: {}".format(path))
+
+def run_raw_samples_combined(run, character_count, weapon_count):
+    """
+    保留原始样本：收集每次模拟的抽数(紧凑存储)，由create_distribution_report生成报告
+    """
+    master_seed = new_master_seed()
+    print("随机种子: {}".format(master_seed))
+    samples = gacha_batch.simulate_samples(run.pool, single_simulation_combined, (character_count, weapon_count),
+                                           master_seed, run.num_simulations, run.batch_size)
+    create_distribution_report(samples, character_count, weapon_count, run.num_simulations)
+
+# main的运行方式 -> 处理函数(见gacha_batch.distribution_mode)，没有单趟模式与方差缩减
+DISTRIBUTION_MODES = {
+    "exact": run_exact_combined,
+    "simulation": run_simulation_combined,
+    "tolerance": run_simulation_combined,
+    "cache": run_simulation_combined,
+    "samples_path": run_samples_path_combined,
+    "raw_samples": run_raw_samples_combined,
+}
+
 def main():
-    # 模拟次数
+    # 模拟次数（精确计算时用于换算报告中的人数）
     num_simulations = 1000000
+    # 计算方式: "simulation" 蒙特卡洛模拟; "exact" 边缘分布卷积精确计算
+    engine = "simulation"
+    # 自适应停止容差(抽)，为None时固定模拟num_simulations次，否则num_simulations为模拟次数上限
+    tolerance = None
+    # 结果缓存，例如 gacha_cache.ResultCache()，为None时不缓存
+    cache = None
+    # 保底机制计数器的保存路径(JSON)，为None时不记录
+    metrics_path = None
+    # 为True时保留每次模拟的抽数(紧凑存储)，由create_distribution_report生成报告
+    raw_samples = False
+    # 内存映射样本文件的路径(可含{character}和{weapon})，设置后每次模拟的结果写入文件，报告从文件分块流式统计
+    samples_path = None
+    # 样本文件保存的字段，可选SAMPLE_FIELDS，为None时只保存抽数
+    sample_fields = None
+    # 以上选项中的模拟方式互斥，各自只接受部分选项，不支持的组合抛出ValueError(见gacha_batch.distribution_mode)
+    mode = gacha_batch.distribution_mode(DISTRIBUTION_MODES, engine, False, tolerance=tolerance, cache=cache,
+                                         metrics_path=metrics_path, raw_samples=raw_samples,
+                                         samples_path=samples_path, sample_fields=sample_fields)
 
     # 定义要计算的目标组合
     targets = [
@@ -202,14 +405,29 @@ def main():
     print("开始鸣潮角色+武器模拟计算...")
     print("=" * 70)
 
+    # 所有目标组合共用一个进程池，避免每个目标重新创建进程
+    pool = Pool(processes=min(cpu_count(), 4)) if mode in gacha_batch.POOL_MODES else None
+    # 所有目标组合的计数合并在一起
+    metrics = Metrics() if metrics_path is not None else None
+    run = gacha_batch.DistributionRun(None, "mc_mix", pool, targets, None, num_simulations, 10000, metrics,
+                                      tolerance=tolerance, cache=cache, samples_path=samples_path,
+                                      sample_fields=sample_fields)
+
     # 对每个目标组合进行模拟
     for character_count, weapon_count in targets:
         print("\n" + "=" * 50)
         print("目标: {}个UP角色 + {}把UP武器".format(character_count, weapon_count))
         print("=" * 50)
 
-        total_pulls_list = simulate_optimized_strategy(character_count, weapon_count, num_simulations)
-        create_distribution_report(total_pulls_list, character_count, weapon_count, num_simulations)
+        DISTRIBUTION_MODES[mode](run, character_count, weapon_count)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if metrics is not None:
+        write_metrics(metrics_path, metrics, module="mc_mix", targets=targets, num_simulations=num_simulations)
+        print("计数器已保存: {}".format(metrics_path))
 
 if __name__ == "__main__":
     random.seed()
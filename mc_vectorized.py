@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+鸣潮角色池/武器池的NumPy向量化模拟
+整批玩家同步逐抽推进，计数器保存在数组中，每抽只做一次批量随机数生成，完成目标的玩家移出活跃集合
+"""
+import numpy as np
+from mc_character import GachaCharacter
+from mc_weapon import GachaWeapon
+
+def _five_star_rate_table(gacha):
+    """
+    卡池编译好的5星概率表(按距上次5星的抽数索引)
+    """
+    return np.array(gacha.five_star_rates)
+
+def _simulate_character_batch(target_up_count, batch_size, rates, gacha, rng):
+    results = np.zeros(batch_size, dtype=np.int64)
+    player = np.arange(batch_size)
+    pulls_since_five_star = np.zeros(batch_size, dtype=np.int64)
+    last_five_star_was_up = np.ones(batch_size, dtype=bool)
+    up_five_star_count = np.zeros(batch_size, dtype=np.int64)
+
+    current_pull = 0
+    while player.size:
+        current_pull += 1
+        pulls_since_five_star += 1
+        five_star_rate = rates[np.minimum(pulls_since_five_star, gacha.soft_pity)]
+
+        # 出5星时 u/five_star_rate 在[0,1)上均匀分布，复用同一随机数判定是否UP
+        u = rng.random_sample(player.size)
+        is_five_star = u <= five_star_rate
+        # 大小保底机制：如果上一个5星非UP，则下一个5星必定为UP
+        guaranteed = ~last_five_star_was_up if gacha.guarantee else False
+        is_up = is_five_star & (guaranteed | (u <= five_star_rate * gacha.up_rate))
+
+        pulls_since_five_star[is_five_star] = 0
+        last_five_star_was_up = np.where(is_five_star, is_up, last_five_star_was_up)
+        up_five_star_count += is_up
+
+        # 完成目标的玩家移出活跃集合
+        done = up_five_star_count >= target_up_count
+        if done.any():
+            results[player[done]] = current_pull
+            active = ~done
+            player = player[active]
+            pulls_since_five_star = pulls_since_five_star[active]
+            last_five_star_was_up = last_five_star_was_up[active]
+            up_five_star_count = up_five_star_count[active]
+
+    return results
+
+def _simulate_weapon_batch(target_up_count, batch_size, rates, gacha, rng):
+    results = np.zeros(batch_size, dtype=np.int64)
+    player = np.arange(batch_size)
+    pulls_since_five_star = np.zeros(batch_size, dtype=np.int64)
+    up_five_star_count = np.zeros(batch_size, dtype=np.int64)
+
+    current_pull = 0
+    while player.size:
+        current_pull += 1
+        pulls_since_five_star += 1
+        five_star_rate = rates[np.minimum(pulls_since_five_star, gacha.soft_pity)]
+
+        # 出5星时 u/five_star_rate 在[0,1)上均匀分布，复用同一随机数按up_rate判定是否UP
+        u = rng.random_sample(player.size)
+        is_five_star = u <= five_star_rate
+        is_up = u <= five_star_rate * gacha.up_rate
+        pulls_since_five_star[is_five_star] = 0
+        up_five_star_count += is_up
+
+        # 完成目标的玩家移出活跃集合
+        done = up_five_star_count >= target_up_count
+        if done.any():
+            results[player[done]] = current_pull
+            active = ~done
+            player = player[active]
+            pulls_since_five_star = pulls_since_five_star[active]
+            up_five_star_count = up_five_star_count[active]
+
+    return results
+
+def _simulate_population(batch_function, gacha, target_up_count, num_simulations, batch_size, seed):
+    rng = np.random.RandomState(seed)
+    if target_up_count <= 0:
+        return np.zeros(num_simulations, dtype=np.int64)
+
+    rates = _five_star_rate_table(gacha)
+    # 分批推进，限制单批数组占用的内存
+    results = []
+    for start in range(0, num_simulations, batch_size):
+        size = min(batch_size, num_simulations - start)
+        results.append(batch_function(target_up_count, size, rates, gacha, rng))
+    return np.concatenate(results) if results else np.zeros(0, dtype=np.int64)
+
+def simulate_character_population(target_up_count, num_simulations, batch_size=100000, seed=None, gacha=None):
+    """
+    向量化模拟num_simulations个玩家抽角色池直到获得target_up_count只UP
+    机制与GachaCharacter.pull_one一致（非5星的3/4星掉落不影响抽数，不再模拟）
+    返回: 每个玩家所需抽数的数组
+    """
+    if gacha is None:
+        gacha = GachaCharacter()
+    return _simulate_population(_simulate_character_batch, gacha, target_up_count, num_simulations, batch_size, seed)
+
+def simulate_weapon_population(target_up_count, num_simulations, batch_size=100000, seed=None, gacha=None):
+    """
+    向量化模拟num_simulations个玩家抽武器池直到获得target_up_count把UP
+    机制与GachaWeapon.pull_one一致（非5星的3/4星掉落不影响抽数，不再模拟）
+    返回: 每个玩家所需抽数的数组
+    """
+    if gacha is None:
+        gacha = GachaWeapon()
+    return _simulate_population(_simulate_weapon_batch, gacha, target_up_count, num_simulations, batch_size, seed)
+
+def population_histogram(results):
+    """
+    将抽数数组转换为报告使用的直方图
+    """
+    return np.bincount(results).tolist()
@@ -2,28 +2,43 @@
 import random
 from multiprocessing import Pool, cpu_count
 import math
+import sys
+import gacha_batch
+from banner import ZMD_CHARACTER, NO_PITY, EXACT_TAIL_TOLERANCE
+from gacha_rng import new_master_seed
+from gacha_metrics import Metrics, write_metrics
+from gacha_stats import build_histogram, histogram_max, histogram_mean, \
+    histogram_median, histogram_percentile, histogram_variance
+
+# 样本文件(gacha_samples)可保存的字段，与single_simulation(details=True)返回的元组一一对应
+SAMPLE_FIELDS = ("pulls", "six_star", "five_star", "weapon_ticket")
 
 class GachaCharacter(object):
-    def __init__(self):
+    def __init__(self, banner=None, rng=None, metrics=None):
         # 角色池
-        # 基础参数
-        self.six_star_rate = 0.008      # 基础6星角色概率 0.8%
-        self.up_rate = 0.5              # up6星角色概率 50% (出6星时有50%是up)
-        self.pity_threshold = 65        # 6星概率开始增长的抽数阈值 (出6星后重置概率，第66抽才开始增加)
-        self.rate_increase = 0.05       # 每抽6星概率增长 5%
+        # 基础参数 (见banner.ZMD_CHARACTER_SPEC)
+        if banner is None:
+            banner = ZMD_CHARACTER
+        self.banner = banner
+        self.rng = rng if rng is not None else random   # 随机数生成器 (默认使用全局random模块)
+        self.metrics = metrics                          # 保底机制计数器 (gacha_metrics.Metrics，None为不记录)
+        self.six_star_rate = banner["base_rate"]    # 基础6星角色概率
+        self.up_rate = banner["up_rate"]            # up6星角色概率 (出6星时为up的概率)
+        self.rate_ramp = banner["rate_ramp"]        # 6星概率增长阶段 [(起始抽数, 结束抽数, 每抽增长)]
 
-        self.soft_pity = 80             # 小保底 80抽 (连续未出6星80抽必出6星)
-        self.hard_pity = 120            # 大保底 120抽 (连续未出up120抽必出up，只作用一次，出up后消失)
-        self.free_pity = 240            # 每240的整数倍都会送一个up (这个赠送的up不影响小保底等等卡池机制，纯额外赠送)
+        self.soft_pity = banner["soft_pity"]        # 小保底 (连续未出6星该抽数必出6星)
+        self.hard_pity = banner.hard_pity           # 大保底 (连续未出up该抽数必出up，只作用一次，出up后消失)
+        self.free_pity = banner.free_pity           # 每该抽数的整数倍都会送一个up (纯额外赠送，不影响其他保底机制)
+        self.six_star_rates = banner.rates          # 6星概率表 (按距上次6星的抽数索引，不含大保底)
 
-        self.five_star_rate = 0.08      # 5星角色概率 8%
-                                        # 4星角色概率为1.0-6星概率-5星概率(动态变化，6星概率增长时会缩减4星概率，5星概率维持不变)
+        self.five_star_rate = banner["sub_rate"]    # 5星角色概率
+                                                    # 4星角色概率为1.0-6星概率-5星概率(动态变化，6星概率增长时会缩减4星概率，5星概率维持不变)
 
-        self.five_star_soft_pity = 10   # 连续10抽不出5星或以上，则第10抽必出5星
+        self.five_star_soft_pity = banner["sub_soft_pity"]  # 连续该抽数不出5星或以上，则该抽必出5星
 
-        self.six_star_weapon_ticket = 2000  # 抽到6星角色会获得2000武器池票
-        self.five_star_weapon_ticket = 200  # 抽到5星角色会获得200武器池票
-        self.four_star_weapon_ticket = 20   # 抽到4星角色会获得20武器池票
+        self.six_star_weapon_ticket = banner["ticket_yield"][6]     # 抽到6星角色获得的武器池票
+        self.five_star_weapon_ticket = banner["ticket_yield"][5]    # 抽到5星角色获得的武器池票
+        self.four_star_weapon_ticket = banner["ticket_yield"][4]    # 抽到4星角色获得的武器池票
 
         # 计数器
         self.total_pulls = 0                # 总抽数
@@ -42,6 +57,12 @@ class GachaCharacter(object):
 
         self.weapon_ticket = 0              # 当前武器票数量
 
+    def get_six_star_rate(self, pulls_since_six_star):
+        """
+        计算距上次6星第pulls_since_six_star抽时的6星概率（不含大保底）
+        """
+        return self.six_star_rates[min(pulls_since_six_star, self.soft_pity)]
+
     def pull_one(self):
         """
         单次抽卡
@@ -54,22 +75,19 @@ class GachaCharacter(object):
         if current_pull % self.free_pity == 0:
             # 免费UP不影响其他保底机制
             self.up_six_star_count += 1
+            if self.metrics is not None:
+                self.metrics.count("free_up")
 
-        # 计算当前6星概率
+        # 查表得到当前6星概率
         pulls_since_six_star = current_pull - self.last_six_star_pull
-        if pulls_since_six_star >= self.pity_threshold:
-            six_star_rate = self.six_star_rate + (pulls_since_six_star - self.pity_threshold) * self.rate_increase
-        else:
-            six_star_rate = self.six_star_rate
-
-        # 软保底：80抽必出6星
-        if pulls_since_six_star >= self.soft_pity:
-            six_star_rate = 1.0
+        six_star_rate = self.six_star_rates[pulls_since_six_star]
 
         # 大保底检查
         if self.has_hard_pity and (current_pull - self.last_up_six_star_pull) >= self.hard_pity:
             self.force_up = True
             six_star_rate = 1.0
+            if self.metrics is not None:
+                self.metrics.count("hard_pity")
 
         # 5星概率
         pull_since_five_star = current_pull - self.last_five_star_pull
@@ -79,7 +97,7 @@ class GachaCharacter(object):
             five_star_rate = self.five_star_rate + six_star_rate
 
         # 抽卡判定
-        pull_rate = random.random()
+        pull_rate = self.rng.random()
         if pull_rate <= six_star_rate:
             # 出6星
             self.six_star_count += 1
@@ -87,7 +105,7 @@ class GachaCharacter(object):
             self.last_five_star_pull = current_pull # 抽到6星也会同时重置5星的10抽保底
 
             # 判定是否UP
-            is_up = self.force_up or (random.random() <= self.up_rate)
+            is_up = self.force_up or (self.rng.random() <= self.up_rate)
 
             if is_up:
                 self.up_six_star_count += 1
@@ -95,31 +113,181 @@ class GachaCharacter(object):
                 self.has_hard_pity = False  # 出UP后大保底机制消失
                 self.force_up = False
             self.weapon_ticket += self.six_star_weapon_ticket
+            if self.metrics is not None:
+                self.count_six_star(pulls_since_six_star, is_up)
             return (6, is_up)
         elif pull_rate <= five_star_rate:
             # 未出6星
             self.five_star_count += 1
             self.last_five_star_pull = current_pull
             self.weapon_ticket += self.five_star_weapon_ticket
+            if self.metrics is not None:
+                self.metrics.count("five_star")
+                if pull_since_five_star >= self.five_star_soft_pity:
+                    self.metrics.count("five_star_guarantee")   # 10抽保底出5星
             return (5, False)  # 简化非6星掉落逻辑
         else:
             self.four_star_count += 1
             self.weapon_ticket += self.four_star_weapon_ticket
             return (4, False)
 
-def single_simulation(target_up_count):
+    def count_six_star(self, pulls_since_six_star, is_up):
+        """
+        记录一次出6星触发的机制(仅在启用计数器时调用)
+        """
+        metrics = self.metrics
+        metrics.count("six_star")
+        if pulls_since_six_star >= self.soft_pity:
+            metrics.count("soft_pity")
+        if is_up:
+            metrics.count("up")
+
+    def get_state(self):
+        """
+        当前的保底状态，用于从该状态继续计算剩余抽数的分布(见calculate_exact_distribution的state参数)
+        强制UP只在触发大保底的那一抽内有效，由是否还有大保底与总抽数确定，不单独记录
+        返回: (距上次6星的抽数, 距上次5星的抽数, 是否还有大保底, 总抽数)
+        """
+        return (self.total_pulls - self.last_six_star_pull, self.total_pulls - self.last_five_star_pull,
+                self.has_hard_pity, self.total_pulls)
+
+def single_simulation(target_up_count, record_all=False, rng=None, banner=None, metrics=None, details=False):
     """
     单次模拟函数，用于并行处理
     返回获得指定数量UP所需的抽数
+    record_all为True时返回列表，第k-1项为获得第k只UP时的抽数(k = 1..target_up_count)，
+    一次模拟即可同时得到所有较小目标的结果
+    rng: 随机数生成器，默认使用全局random模块
+    banner: 卡池参数(banner.Banner)，默认使用本模块的卡池
+    metrics: gacha_metrics.Metrics，记录模拟次数、抽数与保底机制的触发次数，默认不记录
+    details: 为True时(record_all为False)返回与SAMPLE_FIELDS对应的元组
     """
-    gacha = GachaCharacter()
+    gacha = GachaCharacter(banner=banner, rng=rng, metrics=metrics)
+    pulls_at_up = []
     
     # 持续抽卡直到获得目标数量的UP
     while gacha.up_six_star_count < target_up_count:
         gacha.pull_one()
+        if record_all:
+            # 一抽可能同时获得多个UP，本抽越过的每个UP数都记为当前抽数
+            while len(pulls_at_up) < min(gacha.up_six_star_count, target_up_count):
+                pulls_at_up.append(gacha.total_pulls)
     
+    if metrics is not None:
+        metrics.count("simulations")
+        metrics.count("pulls", gacha.total_pulls)
+    if record_all:
+        return pulls_at_up
+    if details:
+        return gacha.total_pulls, gacha.six_star_count, gacha.five_star_count, gacha.weapon_ticket
     return gacha.total_pulls
 
+def simulate_batch(args):
+    """
+    进程池任务：(目标, 本批次数, 种子[, 是否启用计数器])，见gacha_batch.simulate_batch
+    """
+    return gacha_batch.simulate_batch((single_simulation,) + tuple(args))
+
+def simulate_batch_multi(args):
+    """
+    进程池任务：(目标列表, 本批次数, 种子[, 是否启用计数器])，见gacha_batch.simulate_batch_multi
+    """
+    return gacha_batch.simulate_batch_multi((single_simulation,) + tuple(args))
+
+def cache_params(target_up_count, engine, gacha=None):
+    """
+    结果缓存的键参数：卡池参数(决定了GachaCharacter的全部基础参数)、目标与计算方式
+    """
+    if gacha is None:
+        gacha = GachaCharacter()
+    return {"module": "zmd_character", "banner": gacha.banner.spec, "target": target_up_count, "engine": engine}
+
+def replay_simulation(target_up_count, master_seed, index, batch_size=10000, record_all=False):
+    """
+    重放主种子为master_seed的模拟中第index次(从0开始)的结果
+    batch_size需与原模拟一致；单趟模式的结果用最大目标加record_all=True重放
+    """
+    return gacha_batch.replay_simulation(single_simulation, target_up_count, master_seed, index, batch_size,
+                                         record_all=record_all)
+
+def reduce_state(state, gacha=None, keep_five_star=False):
+    """
+    去掉精确计算用不到的状态差异，便于按状态缓存：
+    总抽数只用于每240抽赠送UP和大保底，没有大保底后只需要 总抽数 % 赠送周期(没有赠送UP时为0)；
+    距上次5星的抽数只影响武器票(zmd_mix)，keep_five_star为False时置为0
+    """
+    if gacha is None:
+        gacha = GachaCharacter()
+    pulls_since_six_star, pulls_since_five_star, has_hard_pity, total_pulls = state
+    if not has_hard_pity:
+        total_pulls = 0 if gacha.free_pity == NO_PITY else total_pulls % gacha.free_pity
+    return (pulls_since_six_star, pulls_since_five_star if keep_five_star else 0, has_hard_pity, total_pulls)
+
+def pull_transitions(gacha, banner_state, current_pull):
+    """
+    抽一抽的状态转移，精确计算与多卡池计划(gacha_campaign)共用
+    banner_state: (距上次6星的抽数, 是否还有大保底)
+    current_pull: 本抽是第几抽(从1开始)；未出过UP时距上次UP的抽数即该抽数，因此大保底与每240抽赠送UP都由它确定
+    返回: [(下一状态, 概率, 获得的UP数)]
+    """
+    pulls_since_six_star, has_hard_pity = banner_state
+    # 每240抽赠送一个UP，不影响其他保底机制，本抽照常判定
+    free_up = 1 if current_pull % gacha.free_pity == 0 else 0
+    pulls_since_six_star += 1
+    six_star_rate = gacha.six_star_rates[min(pulls_since_six_star, gacha.soft_pity)]
+    # 大保底：未出过UP时距上次UP的抽数即当前抽数
+    force_up = has_hard_pity and current_pull >= gacha.hard_pity
+    if force_up:
+        six_star_rate = 1.0
+    up_prob = six_star_rate if force_up else six_star_rate * gacha.up_rate
+    return [
+        ((pulls_since_six_star, has_hard_pity), 1.0 - six_star_rate, free_up),
+        ((0, False), up_prob, free_up + 1),
+        ((0, has_hard_pity), six_star_rate - up_prob, free_up),
+    ]
+
+def calculate_exact_distribution(target_up_count, gacha=None, state=None):
+    """
+    精确计算获得指定数量UP所需抽数的概率分布（动态规划，无需模拟）
+    状态: ((距上次6星的抽数, 是否还有大保底), 已获得UP数)，逐抽按pull_transitions转移
+    逐抽推进，当前抽数即总抽数，因此每240抽赠送UP和大保底(未出UP前距上次UP的抽数即总抽数)都由抽数直接确定
+    state: 起始保底状态 (距上次6星的抽数, 距上次5星的抽数, 是否还有大保底, 总抽数)，见GachaCharacter.get_state；
+           默认从零开始，target_up_count为还需要的UP数量
+    返回: 列表pmf, pmf[n]为从起始状态再抽n抽恰好获得第target_up_count只UP的概率
+    没有赠送UP(free_pity为None)且up_rate小于1时抽数无上界，剩余概率低于EXACT_TAIL_TOLERANCE时停止
+    """
+    if gacha is None:
+        gacha = GachaCharacter()
+    if target_up_count <= 0:
+        return [1.0]
+
+    # 大保底只有一次，之后只有赠送UP保证能获得UP
+    unbounded = gacha.free_pity == NO_PITY and gacha.up_rate < 1.0
+
+    pmf = [0.0]
+    pulls_since_six_star, _, has_hard_pity, current_pull = state if state is not None else (0, 0, True, 0)
+    states = {((pulls_since_six_star, has_hard_pity), 0): 1.0}
+    while states:
+        current_pull += 1
+        next_states = {}
+        finished = 0.0
+        for (banner_state, up_count), prob in states.items():
+            for next_state, transition_prob, up_gained in pull_transitions(gacha, banner_state, current_pull):
+                if transition_prob <= 0:
+                    continue
+                if up_count + up_gained >= target_up_count:
+                    finished += prob * transition_prob
+                else:
+                    key = (next_state, up_count + up_gained)
+                    next_states[key] = next_states.get(key, 0.0) + prob * transition_prob
+
+        pmf.append(finished)
+        states = next_states
+        if unbounded and sum(states.values()) < EXACT_TAIL_TOLERANCE:
+            break
+
+    return pmf
+
 def calculate_variance(data, mean):
     """
     计算方差
@@ -143,10 +311,17 @@ def create_distribution_report(data, target_up_count, num_simulations):
     """
     创建分布报告（打印形式）
     """
+    create_histogram_report(build_histogram(data), target_up_count, num_simulations)
+
+def create_histogram_report(histogram, target_up_count, num_simulations):
+    """
+    根据抽数直方图创建分布报告（打印形式）
+    histogram[n]为恰好n抽获得目标的人数，精确分布时为期望人数
+    """
     # 计算基本统计数据
-    avg_pulls = sum(data) / float(len(data))
-    median_pulls = calculate_median(data)
-    variance = calculate_variance(data, avg_pulls)
+    avg_pulls = histogram_mean(histogram)
+    median_pulls = histogram_median(histogram)
+    variance = histogram_variance(histogram, avg_pulls)
     std_deviation = math.sqrt(variance)
     
     print "\n获得{}只UP角色的统计信息:".format(target_up_count)
@@ -155,32 +330,28 @@ def create_distribution_report(data, target_up_count, num_simulations):
     print "方差: {:.2f}".format(variance)
     print "标准差: {:.2f}".format(std_deviation)
     # 计算并显示指定百分位数的抽数
-    sorted_data = sorted(data)
     percentiles = [10, 25, 50, 75, 90]
     print("\n分位数信息:")
     print("-" * 30)
     for p in percentiles:
-        index = int((p / 100.0) * (len(sorted_data) - 1))
-        percentile_value = sorted_data[index]
+        percentile_value = histogram_percentile(histogram, p)
         print("{}% 分位数: {} 抽".format(p, int(percentile_value)))
 
     # 按10抽为单位分组
-    max_pulls = max(data) if data else 0
+    max_pulls = histogram_max(histogram)
     if max_pulls == 0:
         print "无有效数据"
         return
     
     # 创建区间
     bins = range(1, max_pulls + 11, 10)
-    histogram = [0] * (len(bins) - 1)
-    max_pull_histogram = 0
+    bin_histogram = [0] * (len(bins) - 1)
+    max_pull_histogram = histogram[max_pulls]
     
     # 统计各区间的数量
-    for pulls in data:
-        bin_index = min((pulls - 1) // 10, len(histogram) - 1)
-        histogram[bin_index] += 1
-        if pulls == max_pulls:
-            max_pull_histogram += 1
+    for pulls in range(1, max_pulls + 1):
+        bin_index = min((pulls - 1) // 10, len(bin_histogram) - 1)
+        bin_histogram[bin_index] += histogram[pulls]
     
     # 打印分布表
     print "\n获得{}只UP角色所需抽数分布:".format(target_up_count)
@@ -192,8 +363,8 @@ def create_distribution_report(data, target_up_count, num_simulations):
     max_bin_count = 0
     max_bin_range = ""
     
-    for i in range(len(histogram)):
-        count = histogram[i]
+    for i in range(len(bin_histogram)):
+        count = bin_histogram[i]
         if count > 0:
             percentage = count * 100.0 / num_simulations
             cumulative += count
@@ -208,10 +379,10 @@ def create_distribution_report(data, target_up_count, num_simulations):
             stars = "█" * int(percentage / 1)
             percentage_str = "{:<7.2f}{}".format(percentage, stars)
             cumulative_percentage_str = "{:<7.2f}".format(cumulative_percentage)
-
+            
             print "{:<10} {:<10} {:<10} {:<15}".format(
                 "{}-{}".format(bins[i], bins[i]+9),
-                count,
+                int(round(count)),
                 cumulative_percentage_str,
                 percentage_str
             )
@@ -223,22 +394,51 @@ def create_distribution_report(data, target_up_count, num_simulations):
         print "保底数据(保底人数大于5%时显示):"
         print "{:<10} {:<10} {:<15.2f}".format(
             "{}-{}".format(max_pulls, max_pulls),
-            max_pull_histogram,
+            int(round(max_pull_histogram)),
             max_pulls_percentage
         )
     
     print "-" * 50
-    print "累计人数: {}".format(cumulative)
+    print "累计人数: {}".format(int(round(cumulative)))
     print "累计占比: {:.2f}%".format(cumulative_percentage if 'cumulative_percentage' in locals() else 0)
     print "最大抽数区间: {} (人数: {}, 占比: {:.2f}%)".format(
-        max_bin_range, max_bin_count, max_bin_count * 100.0 / num_simulations)
+        max_bin_range, int(round(max_bin_count)), max_bin_count * 100.0 / num_simulations)
     print "=" * 50
 
-def simulate_gacha_distribution(num_simulations=10000):
+# simulate_gacha_distribution的运行方式 -> 处理函数(见gacha_batch.distribution_mode)
+DISTRIBUTION_MODES = gacha_batch.DISTRIBUTION_MODES
+
+def simulate_gacha_distribution(num_simulations=10000, engine="simulation", batch_size=10000, single_pass=None,
+                                seed=None, variance_reduction=None, tolerance=None,
+                                cache=None, metrics_path=None, raw_samples=False,
+                                samples_path=None, sample_fields=None):
     """
     模拟抽卡分布并生成报告
+    engine之外的模拟方式(单趟、方差缩减、自适应停止、结果缓存、样本文件、原始样本)互斥，各自只接受说明中的选项，
+    不支持的参数组合抛出ValueError(见gacha_batch.distribution_mode)
+    :param num_simulations: 模拟次数（精确计算时用于换算报告中的人数）
+    :param engine: "simulation" 蒙特卡洛模拟; "exact" 动态规划精确计算
+    :param batch_size: 每个进程池任务连续模拟的次数
+    :param single_pass: 不设置其他模拟方式时默认为单趟模式：每次模拟只跑到最大目标，所有目标的报告来自同一批模拟；
+                        False为逐个目标普通模拟
+    :param seed: 主种子，相同的主种子与batch_size得到完全相同的结果(与进程数无关)，为None时随机生成
+    :param variance_reduction: 方差缩减方法 None/"antithetic"/"sobol"/"crn"(见gacha_variance)，
+                               启用时逐个目标模拟(各目标使用相同的批次种子即共同随机数)并报告标准误差，
+                               "crn"为普通模拟，报告与上一目标之差的标准误差(及独立模拟时的对照)
+    :param tolerance: 自适应停止的容差(抽)，设置后num_simulations作为模拟次数上限，逐个目标分轮模拟，
+                      直到期望与10/25/50/75/90分位数的95%置信区间半宽都不超过该值
+    :param cache: gacha_cache.ResultCache，命中时直接使用已保存的结果，模拟次数不足时只补充缺少的部分(也可用于精确计算)
+    :param metrics_path: 设置后各批次记录保底机制触发次数与用时，合并后保存到该JSON文件(仅用于单趟模式与普通模拟)
+    :param raw_samples: 为True时保留每次模拟的抽数(array('H')打包传输)，由create_distribution_report生成报告
+    :param samples_path: 设置后把每次模拟的结果写入该内存映射样本文件(可含{target}，按目标分别保存)，
+                         报告从文件分块流式统计，适合远超内存的模拟次数
+    :param sample_fields: 样本文件保存的字段，可选SAMPLE_FIELDS，默认只保存抽数(仅用于samples_path)
     """
     target_up_counts = [1,]
+    mode = gacha_batch.distribution_mode(DISTRIBUTION_MODES, engine, single_pass,
+                                         variance_reduction=variance_reduction, tolerance=tolerance, cache=cache,
+                                         metrics_path=metrics_path, raw_samples=raw_samples,
+                                         samples_path=samples_path, sample_fields=sample_fields)
 
     # 确定并行进程数
     num_processes = min(cpu_count(), 4)  # 限制最多使用4个进程，避免过度占用CPU
@@ -248,22 +448,31 @@ def simulate_gacha_distribution(num_simulations=10000):
     print "=" * 50
     print "模拟次数: {}".format(num_simulations)
 
+    # 主种子：每批的随机数种子都由它和批次序号派生
+    master_seed = seed if seed is not None else new_master_seed()
+    print "随机种子: {}".format(master_seed)
+
+    # 保底机制计数器：各批次在进程内计数，主进程合并
+    metrics = Metrics() if metrics_path is not None else None
+
+    # 所有目标共用一个进程池，避免每个目标重新创建进程
+    pool = Pool(processes=num_processes) if mode in gacha_batch.POOL_MODES else None
+    run = gacha_batch.DistributionRun(sys.modules[__name__], "zmd_character", pool, target_up_counts, master_seed,
+                                      num_simulations, batch_size, metrics,
+                                      variance_reduction=variance_reduction, tolerance=tolerance, cache=cache,
+                                      samples_path=samples_path, sample_fields=sample_fields)
+
     for target_up_count in target_up_counts:
         print "\n正在计算获得{}只UP的分布...".format(target_up_count)
-        
-        # 使用进程池进行并行计算
-        try:
-            pool = Pool(processes=num_processes)
-            tasks = [target_up_count] * num_simulations
-            results = pool.map(single_simulation, tasks)
-            pool.close()
-            pool.join()
-        except Exception as e:
-            print "并行计算出错: {}".format(e)
-            continue
-        
-        # 生成分布报告
-        create_distribution_report(results, target_up_count, num_simulations)
+        DISTRIBUTION_MODES[mode](run, target_up_count)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if metrics is not None:
+        write_metrics(metrics_path, metrics, module="zmd_character", seed=master_seed, num_simulations=num_simulations)
+        print "计数器已保存: {}".format(metrics_path)
     
     print "\n参数设置:"
     gacha = GachaCharacter()  # 创建实例只是为了访问参数
@@ -1,83 +1,356 @@
 # -*- coding: utf-8 -*-
 import random
 import math
-from zmd_character import GachaCharacter
+import gacha_batch
+import zmd_weapon
+from zmd_character import GachaCharacter, reduce_state
 from zmd_weapon import GachaWeapon
+from gacha_stats import build_histogram, pmf_to_histogram, histogram_max, histogram_mean, \
+    histogram_median, histogram_percentile, histogram_variance, PullHistogram
+from gacha_rng import new_master_seed, derive_seed, split_batches
+from gacha_adaptive import run_until_converged, print_convergence_summary
+from gacha_cache import cached_value, cached_histogram
+from gacha_metrics import Metrics, write_metrics
 from multiprocessing import Pool, cpu_count
 
-def single_simulation_combined(args):
+# 样本文件(gacha_samples)可保存的字段，与single_simulation_combined(details=True)返回的元组一一对应
+SAMPLE_FIELDS = ("pulls", "character_six_star", "weapon_six_star", "weapon_ticket")
+
+def single_simulation_combined(args, rng=None, ticket_threshold=None, metrics=None, details=False):
     """
     单次模拟函数，用于并行处理
     返回获得指定数量UP角色和UP武器所需的抽数
+    rng: 随机数生成器，默认使用全局random模块
+    ticket_threshold: 武器票达到该数量才抽武器池十连(见zmd_policy)，默认为一次十连所需的票数(有票就抽)
+    metrics: gacha_metrics.Metrics，记录保底机制与武器票十连的触发次数、角色池/武器池抽卡用时，默认不记录
+    details: 为True时返回与SAMPLE_FIELDS对应的元组
     """
     character_count, weapon_count = args
     # 创建新的角色池和武器池实例
-    char_gacha = GachaCharacter()
-    weapon_gacha = GachaWeapon()
+    char_gacha = GachaCharacter(rng=rng, metrics=metrics)
+    weapon_gacha = GachaWeapon(rng=rng, metrics=metrics)
+    if ticket_threshold is None:
+        ticket_threshold = weapon_gacha.draw_need_ticket
+    pull_character = char_gacha.pull_one
+    pull_weapon = weapon_gacha.pull_ten
+    if metrics is not None:
+        pull_character = metrics.timed("character_pulls", pull_character)
+        pull_weapon = metrics.timed("weapon_pulls", pull_weapon)
     
     # 模拟直到达到目标
     while (char_gacha.up_six_star_count < character_count or weapon_gacha.up_six_star_count < weapon_count):
         # 如果武器券不够抽一次十连，就抽角色池获取更多武器券
-        if char_gacha.weapon_ticket < weapon_gacha.draw_need_ticket:
-            char_gacha.pull_one()
+        if char_gacha.weapon_ticket < ticket_threshold:
+            pull_character()
         # 否则使用武器券抽武器池
         else:
             char_gacha.weapon_ticket -= weapon_gacha.draw_need_ticket
-            weapon_gacha.pull_ten()
+            pull_weapon()
     
+    if metrics is not None:
+        metrics.count("simulations")
+        metrics.count("pulls", char_gacha.total_pulls)
+    if details:
+        return char_gacha.total_pulls, char_gacha.six_star_count, weapon_gacha.six_star_count, char_gacha.weapon_ticket
     # 返回总抽数（只需要角色抽数，因为武器是用票抽的）
     return char_gacha.total_pulls
 
-def simulate_optimized_strategy(character_count, weapon_count, num_simulations=100000):
+def simulate_batch_combined(args):
+    """
+    进程池任务：(角色数, 武器数, 本批次数, 种子[, 是否启用计数器])，见gacha_batch.simulate_batch
+    """
+    character_count, weapon_count = args[:2]
+    return gacha_batch.simulate_batch((single_simulation_combined, (character_count, weapon_count)) + tuple(args[2:]))
+
+def cache_params_combined(character_count, weapon_count, engine, **extra):
+    """
+    结果缓存的键参数：角色池与武器池的卡池参数、目标与计算方式
+    """
+    params = {
+        "module": "zmd_mix",
+        "banner": [GachaCharacter().banner.spec, GachaWeapon().banner.spec],
+        "target": [character_count, weapon_count],
+        "engine": engine,
+    }
+    params.update(extra)
+    return params
+
+def replay_simulation_combined(character_count, weapon_count, master_seed, index, batch_size=10000):
+    """
+    重放主种子为master_seed的模拟中第index次(从0开始)的结果，batch_size需与原模拟一致
+    """
+    return gacha_batch.replay_simulation(single_simulation_combined, (character_count, weapon_count), master_seed,
+                                         index, batch_size)
+
+def simulate_optimized_strategy(character_count, weapon_count, num_simulations=100000, batch_size=10000,
+                                pool=None, seed=None, tolerance=None, cache=None, metrics=None):
     """
     模拟优化策略：利用角色抽卡获得的武器票抽取武器
     :param character_count: 需要的UP角色数量
     :param weapon_count: 需要的UP武器数量
     :param num_simulations: 模拟次数
-    :return: 平均抽数列表
+    :param batch_size: 每个进程池任务连续模拟的次数
+    :param pool: 共用的进程池，为None时临时创建
+    :param seed: 主种子，相同的主种子与batch_size得到完全相同的结果(与进程数无关)，为None时随机生成
+    :param tolerance: 自适应停止的容差(抽)，设置后num_simulations作为模拟次数上限，分轮模拟直到期望与
+                      10/25/50/75/90分位数的95%置信区间半宽都不超过该值
+    :param cache: gacha_cache.ResultCache，命中时直接使用已保存的结果，模拟次数不足时只补充缺少的部分
+    :param metrics: gacha_metrics.Metrics，设置后各批次记录保底机制触发次数与用时并合并到其中(仅用于固定次数模拟)
+    tolerance与cache不能同时使用，metrics不能与两者之一同时使用，否则抛出ValueError
+    并行计算出错时，固定次数模拟回退到串行计算(结果相同)；自适应停止与结果缓存直接抛出异常。临时创建的进程池总会关闭
+    :return: 抽数直方图累加器PullHistogram
+             (早期版本返回每次模拟抽数的列表，需要列表时使用simulate_optimized_strategy_results)
     """
-    
+    if tolerance is not None and cache is not None:
+        raise ValueError("tolerance, cache不能同时使用")
+    if metrics is not None and (tolerance is not None or cache is not None):
+        raise ValueError("metrics仅用于固定次数模拟，不能与tolerance或cache同时使用")
+
     # 确定并行进程数
     num_processes = min(cpu_count(), 4)  # 限制最多使用4个进程，避免过度占用CPU
     
     print("模拟次数: {}".format(num_simulations))
+
+    # 主种子：每批的随机数种子都由它和批次序号派生
+    master_seed = seed if seed is not None else new_master_seed()
+    print("随机种子: {}".format(master_seed))
+    tasks = [(character_count, weapon_count, size, derive_seed(master_seed, batch_index), metrics is not None)
+             for batch_index, size in split_batches(num_simulations, batch_size)]
     
     # 使用进程池进行并行计算
-    try:
+    own_pool = pool is None
+    if own_pool:
         pool = Pool(processes=num_processes)
-        tasks = [(character_count, weapon_count)] * num_simulations
-        results = pool.map(single_simulation_combined, tasks)
-        pool.close()
-        pool.join()
-        
-        return results
-    except Exception as e:
-        print("并行计算出错: {}".format(e))
-        # 出错时回退到串行计算
-        total_pulls_list = []
-        for i in range(num_simulations):
-            # 创建新的角色池和武器池实例
-            char_gacha = GachaCharacter()
-            weapon_gacha = GachaWeapon()
-            
-            # 模拟直到达到目标
-            while (char_gacha.up_six_star_count < character_count or weapon_gacha.up_six_star_count < weapon_count):
-                # 如果武器券不够抽一次十连，就抽角色池获取更多武器券
-                if char_gacha.weapon_ticket < weapon_gacha.draw_need_ticket:
-                    char_gacha.pull_one()
-                # 否则使用武器券抽武器池
-                else:
-                    char_gacha.weapon_ticket -= weapon_gacha.draw_need_ticket
-                    weapon_gacha.pull_ten()
-            
-            # 记录总抽数（只需要角色抽数，因为武器是用票抽的）
-            total_pulls_list.append(char_gacha.total_pulls)
-            
+    try:
+        if tolerance is not None:
+            # 自适应停止：分轮模拟，置信区间足够窄时提前结束(出错时直接抛出，不回退)
+            histogram, half_widths, converged = run_until_converged(
+                pool, simulate_batch_combined,
+                lambda batch_index, size: (character_count, weapon_count, size, derive_seed(master_seed, batch_index)),
+                num_simulations, batch_size, tolerance)
+            print_convergence_summary(histogram, half_widths, tolerance, converged)
+            return histogram
+        if cache is not None:
+            # 结果缓存：已有足够样本时直接返回，否则只补充缺少的批次(出错时直接抛出，不回退)
+            return cached_histogram(
+                cache, cache_params_combined(character_count, weapon_count, "simulation"), num_simulations,
+                batch_size, master_seed,
+                lambda seed, batches: gacha_batch.run_batches(pool, single_simulation_combined,
+                                                              (character_count, weapon_count), seed, batches))
+
+        # 固定次数模拟：各批次的计数器先在本地合并，成功后才并入metrics
+        try:
+            histogram, batch_metrics = PullHistogram(), Metrics()
+            for partial in pool.imap_unordered(simulate_batch_combined, tasks):
+                if metrics is not None:
+                    partial, counts = partial
+                    batch_metrics.merge(counts)
+                histogram.merge(partial)
+        except Exception as e:
+            print("并行计算出错: {}".format(e))
+            # 出错时回退到串行计算（逐批执行相同的任务，结果与并行计算一致）
+            histogram, batch_metrics = PullHistogram(), Metrics()
+            for task in tasks:
+                partial = simulate_batch_combined(task)
+                if metrics is not None:
+                    partial, counts = partial
+                    batch_metrics.merge(counts)
+                histogram.merge(partial)
+
             # 显示进度
-            if (i + 1) % (num_simulations // 10) == 0:
-                print("进度: {}/{} 次模拟完成".format(i + 1, num_simulations))
-        
-        return total_pulls_list
+            print("进度: {}/{} 次模拟完成".format(histogram.n, num_simulations))
+
+        if metrics is not None:
+            metrics.merge(batch_metrics)
+        return histogram
+    finally:
+        if own_pool:
+            pool.terminate()
+            pool.join()
+
+def simulate_optimized_strategy_results(character_count, weapon_count, num_simulations=100000, batch_size=10000,
+                                        pool=None, seed=None):
+    """
+    与早期版本的simulate_optimized_strategy相同，返回每次模拟抽数的列表(按模拟序号排列)
+    相同的主种子与batch_size时，与simulate_optimized_strategy返回的直方图来自同一组模拟
+    """
+    master_seed = seed if seed is not None else new_master_seed()
+    own_pool = pool is None
+    if own_pool:
+        pool = Pool(processes=min(cpu_count(), 4))
+    try:
+        return list(gacha_batch.simulate_samples(pool, single_simulation_combined, (character_count, weapon_count),
+                                                 master_seed, num_simulations, batch_size))
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+
+# 精确计算的中间结果缓存(默认卡池参数):
+# 武器池 {(武器数量, 武器池状态): 所需十连次数的累积分布}
+# 角色池 {(角色数量, 角色池状态, 武器票上限, 截断阈值): (逐抽的角色达成情况与获得的武器票, 截断丢弃的概率)}
+_ten_pull_cdf_cache = {}
+_character_ticket_cache = {}
+
+def ten_pull_cdf(weapon_count, weapon_state=None):
+    """
+    武器池从weapon_state出发获得weapon_count把UP所需十连次数N的累积分布: cdf[n] = P(N <= n)，按状态缓存
+    """
+    weapon_state = tuple(weapon_state) if weapon_state is not None else None
+    key = (weapon_count, weapon_state)
+    if key not in _ten_pull_cdf_cache:
+        weapon_pmf = zmd_weapon.calculate_exact_distribution(weapon_count, GachaWeapon(), weapon_state)
+        cdf = []
+        cumulative = 0.0
+        for n in range((len(weapon_pmf) - 1) // 10 + 1):
+            cumulative += weapon_pmf[n * 10]
+            cdf.append(cumulative)
+        _ten_pull_cdf_cache[key] = cdf
+    return _ten_pull_cdf_cache[key]
+
+def _ticket_cap(max_ten_pulls, draw_need_ticket, ticket_threshold):
+    """
+    N不超过max_ten_pulls时，累计武器票达到该值即可保证武器池达成
+    """
+    return (max_ten_pulls - 1) * draw_need_ticket + ticket_threshold if max_ten_pulls > 0 else 0
+
+def character_ticket_table(character_count, character_state, ticket_cap, tolerance=0.0):
+    """
+    角色池从character_state出发逐抽推进，记录角色是否达成及获得的武器票(从0计，超过ticket_cap后截断)
+    与武器池状态和起始武器票无关，按角色池状态缓存，同一角色池状态的不同查询只需与武器池的分布组合
+    状态: (距上次6星的抽数, 距上次5星的抽数, 是否还有大保底, 已获得UP数, 获得的武器票)
+    :return: (table, dropped) table[n] = (finished, tickets, active):
+             第n抽后角色已达成且获得的武器票达到ticket_cap的概率, 角色已达成的其余状态{获得的武器票: 概率},
+             角色未达成的概率; dropped为截断丢弃的总概率
+    """
+    character_state = reduce_state(character_state, keep_five_star=True)
+    key = (character_count, character_state, ticket_cap, tolerance)
+    if key in _character_ticket_cache:
+        return _character_ticket_cache[key]
+
+    char_gacha = GachaCharacter()
+    six_star_rates = char_gacha.six_star_rates
+
+    finished = 0.0      # 已确定完成的概率(角色达成目标且获得的武器票达到上限)
+    dropped = 0.0
+    table = [(0.0, {0: 1.0}, 0.0) if character_count <= 0 else (0.0, {}, 1.0)]
+    # {(距上次6星的抽数, 距上次5星的抽数, 是否还有大保底, 已获得UP数): {获得的武器票: 概率}}
+    pulls_since_six_star, pulls_since_five_star, has_hard_pity, current_pull = character_state
+    states = {(pulls_since_six_star, pulls_since_five_star, has_hard_pity, 0): {0: 1.0}}
+    while states:
+        current_pull += 1
+        next_states = {}
+        for (pulls_since_six_star, pulls_since_five_star, has_hard_pity, up_count), tickets in states.items():
+            # 每240抽赠送一个UP
+            if current_pull % char_gacha.free_pity == 0:
+                up_count = min(up_count + 1, character_count)
+
+            pulls_since_six_star += 1
+            pulls_since_five_star += 1
+            six_star_rate = six_star_rates[min(pulls_since_six_star, char_gacha.soft_pity)]
+            force_up = has_hard_pity and current_pull >= char_gacha.hard_pity
+            if force_up:
+                six_star_rate = 1.0
+            if pulls_since_five_star >= char_gacha.five_star_soft_pity:
+                five_star_prob = 1.0 - six_star_rate
+            else:
+                five_star_prob = min(char_gacha.five_star_rate + six_star_rate, 1.0) - six_star_rate
+            up_prob = six_star_rate if force_up else six_star_rate * char_gacha.up_rate
+
+            # (下一状态, 获得武器票, 转移概率)
+            transitions = [
+                ((0, 0, False, min(up_count + 1, character_count)), char_gacha.six_star_weapon_ticket, up_prob),
+                ((0, 0, has_hard_pity, up_count), char_gacha.six_star_weapon_ticket, six_star_rate - up_prob),
+                ((pulls_since_six_star, 0, has_hard_pity, up_count), char_gacha.five_star_weapon_ticket, five_star_prob),
+                ((pulls_since_six_star, pulls_since_five_star, has_hard_pity, up_count),
+                 char_gacha.four_star_weapon_ticket, 1.0 - six_star_rate - five_star_prob),
+            ]
+            for next_key, gain, transition_prob in transitions:
+                if transition_prob <= 0:
+                    continue
+                next_tickets = next_states.setdefault(next_key, {})
+                get = next_tickets.get
+                for weapon_ticket, prob in tickets.items():
+                    weapon_ticket += gain
+                    if weapon_ticket > ticket_cap:
+                        weapon_ticket = ticket_cap
+                    next_tickets[weapon_ticket] = get(weapon_ticket, 0.0) + prob * transition_prob
+
+        # 角色已达成且武器票足够最坏情况的状态不再推进
+        states = {}
+        done = {}
+        active = 0.0
+        for next_key, tickets in next_states.items():
+            up_count = next_key[3]
+            if up_count >= character_count:
+                finished += tickets.pop(ticket_cap, 0.0)
+            if tolerance > 0:
+                for weapon_ticket, prob in list(tickets.items()):
+                    if prob < tolerance:
+                        dropped += prob
+                        del tickets[weapon_ticket]
+            if not tickets:
+                continue
+            states[next_key] = tickets
+            if up_count >= character_count:
+                for weapon_ticket, prob in tickets.items():
+                    done[weapon_ticket] = done.get(weapon_ticket, 0.0) + prob
+            else:
+                active += sum(tickets.values())
+        table.append((finished, done, active))
+
+    _character_ticket_cache[key] = (table, dropped)
+    return table, dropped
+
+def calculate_exact_combined_distribution(character_count, weapon_count, tolerance=0.0, state=None,
+                                          ticket_threshold=None):
+    """
+    精确计算优化策略下获得指定数量UP角色和UP武器所需角色抽数的概率分布（动态规划）
+    武器池只用武器票十连抽，其结果不影响角色池，因此武器池只需要"达成目标所需的十连次数"N的分布；
+    角色抽数 = max(角色达成目标的抽数, 累计武器票首次达到N*draw_need_ticket的抽数)
+    武器票达到ticket_threshold才抽十连时，第N次十连在累计武器票达到(N-1)*draw_need_ticket+ticket_threshold时进行
+    角色池部分(character_ticket_table)与武器池部分(ten_pull_cdf)分别按各自的状态缓存，每次查询只做组合：
+    第n抽完成的概率 = sum(角色已达成且获得武器票为t的概率 * P(N <= 起始武器票+t可抽的十连次数))
+    :param tolerance: 概率低于该值的状态直接丢弃(有界误差截断)，0表示不截断
+    :param state: 起始状态 (角色池状态, 武器池状态, 当前武器票)，见GachaCharacter.get_state/GachaWeapon.get_state；
+                  默认从零开始，character_count/weapon_count为还需要的数量
+    :param ticket_threshold: 武器票达到该数量才抽十连(不小于draw_need_ticket)，默认有票就抽
+    :return: (pmf, dropped) pmf[n]为(从起始状态)角色抽数恰好为n的概率, dropped为截断丢弃的总概率
+    """
+    if character_count <= 0 and weapon_count <= 0:
+        return [1.0], 0.0
+
+    draw_need_ticket = GachaWeapon().draw_need_ticket
+    if ticket_threshold is None:
+        ticket_threshold = draw_need_ticket
+    if ticket_threshold < draw_need_ticket:
+        raise ValueError("ticket_threshold不能小于一次十连所需的武器票{}".format(draw_need_ticket))
+
+    character_state, weapon_state, weapon_ticket = state if state is not None else ((0, 0, True, 0), None, 0)
+    cdf_by_ten_pulls = ten_pull_cdf(weapon_count, weapon_state)
+    ticket_cap = _ticket_cap(len(cdf_by_ten_pulls) - 1, draw_need_ticket, ticket_threshold)
+    # 角色池的武器票上限取从零开始的武器池所需的上限(任何武器池状态所需的十连次数都不会更多)，各武器池状态共用
+    table_cap = max(_ticket_cap(len(ten_pull_cdf(weapon_count)) - 1, draw_need_ticket, ticket_threshold), ticket_cap)
+    table, dropped = character_ticket_table(character_count, tuple(character_state), table_cap, tolerance)
+
+    def ticket_cdf(weapon_ticket):
+        """
+        累计武器票为weapon_ticket时武器池已达成目标的概率: P(N <= 已能抽的十连次数)
+        """
+        if weapon_ticket < ticket_threshold:
+            return cdf_by_ten_pulls[0]
+        weapon_ticket = min(weapon_ticket, ticket_cap)
+        return cdf_by_ten_pulls[(weapon_ticket - ticket_threshold) // draw_need_ticket + 1]
+
+    cdf = []
+    for finished, tickets, active in table:
+        cdf.append(finished + sum(prob * ticket_cdf(weapon_ticket + gained) for gained, prob in tickets.items()))
+        # 角色都已达成且武器票都已足够，之后不再变化
+        if active == 0 and all(weapon_ticket + gained >= ticket_cap for gained in tickets):
+            break
+
+    pmf = [cdf[0]] + [cdf[n] - cdf[n - 1] for n in range(1, len(cdf))]
+    return pmf, dropped
 
 def calculate_variance(data, mean):
     """
@@ -102,10 +375,17 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
     """
     创建分布报告（打印形式）
     """
+    create_histogram_report(build_histogram(data), character_count, weapon_count, num_simulations)
+
+def create_histogram_report(histogram, character_count, weapon_count, num_simulations):
+    """
+    根据抽数直方图创建分布报告（打印形式）
+    histogram[n]为恰好n抽达成目标的人数，精确分布时为期望人数
+    """
     # 计算基本统计数据
-    avg_pulls = sum(data) / float(len(data))
-    median_pulls = calculate_median(data)
-    variance = calculate_variance(data, avg_pulls)
+    avg_pulls = histogram_mean(histogram)
+    median_pulls = histogram_median(histogram)
+    variance = histogram_variance(histogram, avg_pulls)
     std_deviation = math.sqrt(variance)
     
     print("\n获得{}个UP角色+{}把UP武器的统计信息:".format(character_count, weapon_count))
@@ -114,32 +394,28 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
     print("方差: {:.2f}".format(variance))
     print("标准差: {:.2f}".format(std_deviation))
     # 计算并显示指定百分位数的抽数
-    sorted_data = sorted(data)
     percentiles = [10, 25, 50, 75, 90]
     print("\n分位数信息:")
     print("-" * 30)
     for p in percentiles:
-        index = int((p / 100.0) * (len(sorted_data) - 1))
-        percentile_value = sorted_data[index]
+        percentile_value = histogram_percentile(histogram, p)
         print("{}% 分位数: {} 抽".format(p, int(percentile_value)))
 
     # 按10抽为单位分组
-    max_pulls = max(data) if data else 0
+    max_pulls = histogram_max(histogram)
     if max_pulls == 0:
         print("无有效数据")
         return
     
     # 创建区间
     bins = range(1, max_pulls + 11, 10)
-    histogram = [0] * (len(bins) - 1)
-    max_pull_histogram = 0
+    bin_histogram = [0] * (len(bins) - 1)
+    max_pull_histogram = histogram[max_pulls]
     
     # 统计各区间的数量
-    for pulls in data:
-        bin_index = min(pulls // 10, len(histogram) - 1)
-        histogram[bin_index] += 1
-        if pulls == max_pulls:
-            max_pull_histogram += 1
+    for pulls in range(max_pulls + 1):
+        bin_index = min(pulls // 10, len(bin_histogram) - 1)
+        bin_histogram[bin_index] += histogram[pulls]
     
     # 打印分布表
     print("\n获得{}个UP角色+{}把UP武器所需抽数分布:".format(character_count, weapon_count))
@@ -151,8 +427,8 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
     max_bin_count = 0
     max_bin_range = ""
 
-    for i in range(len(histogram)):
-        count = histogram[i]
+    for i in range(len(bin_histogram)):
+        count = bin_histogram[i]
         if count > 0:
             percentage = count * 100.0 / num_simulations
             cumulative += count
@@ -170,7 +446,7 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
             
             print("{:<10} {:<10} {:<10} {:<15}".format(
                 "{}-{}".format(bins[i], bins[i]+9), 
-                count,
+                int(round(count)),
                 cumulative_percentage_str,
                 percentage_str
             ))
@@ -182,20 +458,102 @@ def create_distribution_report(data, character_count, weapon_count, num_simulati
         print("保底数据(保底人数大于5%时显示):")
         print("{:<10} {:<10} {:<15.2f}".format(
             "{}-{}".format(max_pulls-9, max_pulls),
-            max_pull_histogram,
+            int(round(max_pull_histogram)),
             max_pulls_percentage
         ))
     
     print("-" * 50)
-    print("累计人数: {}".format(cumulative))
+    print("累计人数: {}".format(int(round(cumulative))))
     print("累计占比: {:.2f}%".format(cumulative_percentage if 'cumulative_percentage' in locals() else 0))
     print("最大抽数区间: {} (人数: {}, 占比: {:.2f}%)".format(
-        max_bin_range, max_bin_count, max_bin_count * 100.0 / num_simulations))
+        max_bin_range, int(round(max_bin_count)), max_bin_count * 100.0 / num_simulations))
     print("=" * 50)
 
+def run_exact_combined(run, character_count, weapon_count):
+    """
+    动态规划精确计算(截断阈值1e-12，可使用结果缓存)
+    """
+    pmf, dropped = cached_value(
+        run.options.get("cache"), cache_params_combined(character_count, weapon_count, "exact", tolerance=1e-12),
+        lambda: calculate_exact_combined_distribution(character_count, weapon_count, tolerance=1e-12))
+    print("截断误差: {:.2e}".format(dropped))
+    create_histogram_report(pmf_to_histogram(pmf, run.num_simulations), character_count, weapon_count,
+                            run.num_simulations)
+
+def run_vectorized_combined(run, character_count, weapon_count):
+    """
+    NumPy向量化模拟
+    """
+    import zmd_vectorized  # 需要NumPy，仅在使用向量化模拟时导入
+    results = zmd_vectorized.simulate_combined_population(character_count, weapon_count, run.num_simulations)
+    create_histogram_report(zmd_vectorized.population_histogram(results), character_count, weapon_count,
+                            run.num_simulations)
+
+def run_simulation_combined(run, character_count, weapon_count):
+    """
+    固定次数模拟、自适应停止(tolerance)或结果缓存(cache)，由simulate_optimized_strategy处理
+    """
+    histogram = simulate_optimized_strategy(character_count, weapon_count, run.num_simulations, run.batch_size,
+                                            pool=run.pool, tolerance=run.options.get("tolerance"),
+                                            cache=run.options.get("cache"), metrics=run.metrics)
+    create_histogram_report(histogram.counts, character_count, weapon_count, histogram.n)
+
+def run_samples_path_combined(run, character_count, weapon_count):
+    """
+    样本文件：每次模拟的结果写入内存映射文件(路径可含{character}和{weapon})，报告从文件分块流式统计
+    """
+    path = run.options["samples_path"].format(character=character_count, weapon=weapon_count)
+    master_seed = new_master_seed()
+    print("随机种子: {}".format(master_seed))
+    with gacha_batch.simulate_samples_to_file(run.pool, single_simulation_combined, SAMPLE_FIELDS, path,
+                                              (character_count, weapon_count), master_seed, run.num_simulations,
+                                              run.batch_size, run.options.get("sample_fields") or ("pulls",),
+                                              module=run.name) as sample_file:
+        create_distribution_report(sample_file, character_count, weapon_count, run.num_simulations)
+    print("样本已保存: {}".format(path))
+
+def run_raw_samples_combined(run, character_count, weapon_count):
+    """
+    保留原始样本：收集每次模拟的抽数(紧凑存储)，由create_distribution_report生成报告
+    """
+    master_seed = new_master_seed()
+    print("随机种子: {}".format(master_seed))
+    samples = gacha_batch.simulate_samples(run.pool, single_simulation_combined, (character_count, weapon_count),
+                                           master_seed, run.num_simulations, run.batch_size)
+    create_distribution_report(samples, character_count, weapon_count, run.num_simulations)
+
+# main的运行方式 -> 处理函数(见gacha_batch.distribution_mode)，没有单趟模式与方差缩减
+DISTRIBUTION_MODES = {
+    "exact": run_exact_combined,
+    "vectorized": run_vectorized_combined,
+    "simulation": run_simulation_combined,
+    "tolerance": run_simulation_combined,
+    "cache": run_simulation_combined,
+    "samples_path": run_samples_path_combined,
+    "raw_samples": run_raw_samples_combined,
+}
+
 def main():
-    # 模拟次数
+    # 模拟次数（精确计算时用于换算报告中的人数）
     num_simulations = 1000000
+    # 计算方式: "simulation" 蒙特卡洛模拟; "exact" 动态规划精确计算; "vectorized" NumPy向量化模拟
+    engine = "simulation"
+    # 自适应停止容差(抽)，为None时固定模拟num_simulations次，否则num_simulations为模拟次数上限
+    tolerance = None
+    # 结果缓存，例如 gacha_cache.ResultCache()，为None时不缓存
+    cache = None
+    # 保底机制计数器的保存路径(JSON)，为None时不记录
+    metrics_path = None
+    # 为True时保留每次模拟的抽数(紧凑存储)，由create_distribution_report生成报告
+    raw_samples = False
+    # 内存映射样本文件的路径(可含{character}和{weapon})，设置后每次模拟的结果写入文件，报告从文件分块流式统计
+    samples_path = None
+    # 样本文件保存的字段，可选SAMPLE_FIELDS，为None时只保存抽数
+    sample_fields = None
+    # 以上选项中的模拟方式互斥，各自只接受部分选项，不支持的组合抛出ValueError(见gacha_batch.distribution_mode)
+    mode = gacha_batch.distribution_mode(DISTRIBUTION_MODES, engine, False, tolerance=tolerance, cache=cache,
+                                         metrics_path=metrics_path, raw_samples=raw_samples,
+                                         samples_path=samples_path, sample_fields=sample_fields)
 
     # 定义要计算的目标组合
     targets = [
@@ -207,14 +565,29 @@ def main():
     print("开始终末地角色+武器模拟计算...")
     print("=" * 70)
 
+    # 所有目标组合共用一个进程池，避免每个目标重新创建进程
+    pool = Pool(processes=min(cpu_count(), 4)) if mode in gacha_batch.POOL_MODES else None
+    # 所有目标组合的计数合并在一起
+    metrics = Metrics() if metrics_path is not None else None
+    run = gacha_batch.DistributionRun(None, "zmd_mix", pool, targets, None, num_simulations, 10000, metrics,
+                                      tolerance=tolerance, cache=cache, samples_path=samples_path,
+                                      sample_fields=sample_fields)
+
     # 对每个目标组合进行模拟
     for character_count, weapon_count in targets:
         print("\n" + "=" * 50)
         print("目标: {}个UP角色 + {}把UP武器".format(character_count, weapon_count))
         print("=" * 50)
 
-        total_pulls_list = simulate_optimized_strategy(character_count, weapon_count, num_simulations)
-        create_distribution_report(total_pulls_list, character_count, weapon_count, num_simulations)
+        DISTRIBUTION_MODES[mode](run, character_count, weapon_count)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if metrics is not None:
+        write_metrics(metrics_path, metrics, module="zmd_mix", targets=targets, num_simulations=num_simulations)
+        print("计数器已保存: {}".format(metrics_path))
 
 if __name__ == "__main__":
     random.seed()
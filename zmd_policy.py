@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+zmd_mix 武器票使用策略的搜索
+策略为阈值规则：武器票达到阈值才抽一次武器池十连，阈值等于一次十连所需的票数即原有的"有票就抽"
+目标: "mean" 最小化期望角色抽数; "within" 最大化在budget角色抽数内达成目标的概率
+评估方式:
+    "exact"       每个候选策略做一次精确动态规划，所有候选作为一个作业提交到进程池
+    "simulation"  所有候选的所有批次作为一个作业提交；各候选的第b批使用相同种子(共同随机数)，
+                  候选之间的差异不受抽样噪声的独立叠加影响
+武器池的结果不影响角色池，推迟使用武器票只会让武器目标同样或更晚达成，
+因此在这两个目标下"有票就抽"都是最优的；搜索用于验证这一点，卡池参数变化时可重新检验
+"""
+import random
+from multiprocessing import Pool, cpu_count
+from zmd_weapon import GachaWeapon
+from zmd_mix import single_simulation_combined, calculate_exact_combined_distribution
+from gacha_stats import pmf_to_histogram, histogram_mean, histogram_percentile, histogram_total, PullHistogram
+from gacha_rng import new_master_seed, derive_seed, split_batches
+
+# 默认候选阈值: 一次十连所需票数的倍数
+DEFAULT_THRESHOLD_MULTIPLES = [1, 1.5, 2, 3]
+POLICY_PERCENTILES = [50, 90]
+
+def default_thresholds():
+    draw_need_ticket = GachaWeapon().draw_need_ticket
+    return [int(draw_need_ticket * multiple) for multiple in DEFAULT_THRESHOLD_MULTIPLES]
+
+def simulate_policy_batch(args):
+    """
+    进程池任务：按阈值策略模拟一批
+    返回: (阈值, PullHistogram)
+    """
+    character_count, weapon_count, ticket_threshold, batch_size, seed = args
+    rng = random.Random(seed)
+    histogram = PullHistogram()
+    for _ in range(batch_size):
+        histogram.add(single_simulation_combined((character_count, weapon_count), rng=rng,
+                                                 ticket_threshold=ticket_threshold))
+    return ticket_threshold, histogram
+
+def exact_policy(args):
+    """
+    进程池任务：精确计算阈值策略下角色抽数的概率分布
+    返回: (阈值, pmf)
+    """
+    character_count, weapon_count, ticket_threshold, tolerance = args
+    pmf, dropped = calculate_exact_combined_distribution(character_count, weapon_count, tolerance,
+                                                         ticket_threshold=ticket_threshold)
+    return ticket_threshold, pmf
+
+def evaluate_policies(character_count, weapon_count, thresholds=None, engine="exact", num_simulations=100000,
+                      batch_size=10000, seed=None, tolerance=1e-12, pool=None):
+    """
+    评估各候选阈值策略
+    :param engine: "exact" 精确计算; "simulation" 共同随机数的批量模拟
+    :param num_simulations: 每个候选的模拟次数(精确计算时用于换算分位数)
+    :param tolerance: 精确计算的截断阈值
+    :return: {阈值: 直方图列表}
+    """
+    thresholds = thresholds or default_thresholds()
+    own_pool = pool is None
+    if own_pool:
+        pool = Pool(processes=min(cpu_count(), 4))
+
+    try:
+        if engine == "exact":
+            tasks = [(character_count, weapon_count, threshold, tolerance) for threshold in thresholds]
+            results = dict((threshold, pmf_to_histogram(pmf, num_simulations))
+                           for threshold, pmf in pool.imap_unordered(exact_policy, tasks))
+        else:
+            master_seed = seed if seed is not None else new_master_seed()
+            # 相同批次序号使用相同种子(共同随机数)
+            tasks = [(character_count, weapon_count, threshold, size, derive_seed(master_seed, batch_index))
+                     for batch_index, size in split_batches(num_simulations, batch_size)
+                     for threshold in thresholds]
+            histograms = dict((threshold, PullHistogram()) for threshold in thresholds)
+            for threshold, partial in pool.imap_unordered(simulate_policy_batch, tasks):
+                histograms[threshold].merge(partial)
+            results = dict((threshold, histogram.counts) for threshold, histogram in histograms.items())
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+    return results
+
+def probability_within(histogram, budget):
+    """
+    直方图中抽数不超过budget的比例
+    """
+    total = histogram_total(histogram)
+    if total <= 0:
+        return 0.0
+    return sum(histogram[:budget + 1]) / float(total)
+
+def optimize_ticket_policy(character_count, weapon_count, objective="mean", budget=None, **kwargs):
+    """
+    搜索最优的武器票阈值
+    :param objective: "mean" 最小化期望角色抽数; "within" 最大化budget抽内达成的概率
+    :param kwargs: 传给evaluate_policies
+    :return: (最优阈值, 行列表 [{"threshold": 阈值, "mean": 期望, "percentiles": {p: 分位数}, "within": 概率}])
+    """
+    if objective == "within" and budget is None:
+        raise ValueError("objective为within时需要指定budget")
+    results = evaluate_policies(character_count, weapon_count, **kwargs)
+
+    rows = []
+    for threshold in sorted(results):
+        histogram = results[threshold]
+        rows.append({
+            "threshold": threshold,
+            "mean": histogram_mean(histogram),
+            "percentiles": dict((p, histogram_percentile(histogram, p)) for p in POLICY_PERCENTILES),
+            "within": probability_within(histogram, budget) if budget is not None else None,
+        })
+    if objective == "within":
+        best = max(rows, key=lambda row: row["within"])
+    else:
+        best = min(rows, key=lambda row: row["mean"])
+    return best["threshold"], rows
+
+def print_policy_table(rows, best_threshold, budget=None):
+    """
+    打印各候选策略的结果
+    """
+    header = "{:<12} {:<12}".format("武器票阈值", "期望抽数") + \
+        "".join("{:<8}".format("P{}".format(p)) for p in POLICY_PERCENTILES)
+    if budget is not None:
+        header += "{}抽内达成".format(budget)
+    print(header)
+    print("-" * 60)
+    for row in rows:
+        line = "{:<12} {:<12.2f}".format(row["threshold"], row["mean"]) + \
+            "".join("{:<8}".format(int(row["percentiles"][p])) for p in POLICY_PERCENTILES)
+        if budget is not None:
+            line += "{:.2f}%".format(row["within"] * 100)
+        if row["threshold"] == best_threshold:
+            line += "  <- 最优"
+        print(line)
+
+def main():
+    # 目标
+    character_count, weapon_count = 1, 1
+    # 优化目标: "mean" 期望角色抽数最少; "within" budget抽内达成概率最大
+    objective = "within"
+    budget = 120
+    # 评估方式: "exact" 精确计算; "simulation" 共同随机数的批量模拟
+    engine = "simulation"
+
+    print("=" * 60)
+    print("武器票策略搜索: {}个UP角色+{}把UP武器".format(character_count, weapon_count))
+    print("=" * 60)
+    best_threshold, rows = optimize_ticket_policy(character_count, weapon_count, objective, budget, engine=engine)
+    print_policy_table(rows, best_threshold, budget)
+
+if __name__ == "__main__":
+    main()
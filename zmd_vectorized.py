@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+终末地角色池+武器池(武器票策略)的NumPy向量化模拟
+整批玩家的角色池、武器池计数器与武器票余额保存在数组中同步推进：
+每一步武器票足够的玩家批量十连抽武器池，其余玩家抽一次角色池，完成目标的玩家移出活跃集合
+"""
+import numpy as np
+from zmd_character import GachaCharacter
+from zmd_weapon import GachaWeapon
+
+def _six_star_rate_table(gacha):
+    """
+    卡池编译好的6星概率表(按距上次6星的抽数索引，不含大保底)
+    """
+    return np.array(gacha.six_star_rates)
+
+class _Population(object):
+    """
+    一批玩家的角色池、武器池状态
+    """
+    def __init__(self, size):
+        self.player = np.arange(size)
+
+        # 角色池
+        self.total_pulls = np.zeros(size, dtype=np.int64)
+        self.pulls_since_six_star = np.zeros(size, dtype=np.int64)
+        self.pulls_since_five_star = np.zeros(size, dtype=np.int64)
+        self.pulls_since_up = np.zeros(size, dtype=np.int64)
+        self.up_six_star_count = np.zeros(size, dtype=np.int64)
+        self.has_hard_pity = np.ones(size, dtype=bool)
+        self.weapon_ticket = np.zeros(size, dtype=np.int64)
+
+        # 武器池
+        self.weapon_pulls_since_six_star = np.zeros(size, dtype=np.int64)
+        self.weapon_pulls_since_up = np.zeros(size, dtype=np.int64)
+        self.weapon_up_six_star_count = np.zeros(size, dtype=np.int64)
+
+    def keep(self, mask):
+        """
+        只保留mask为True的玩家
+        """
+        for name, value in self.__dict__.items():
+            setattr(self, name, value[mask])
+
+def _pull_character(pop, index, rates, gacha, rng):
+    """
+    index对应的玩家各抽一次角色池，机制与GachaCharacter.pull_one一致
+    """
+    pop.total_pulls[index] += 1
+    total_pulls = pop.total_pulls[index]
+
+    # 每240抽赠送一个UP，不影响其他保底机制
+    pop.up_six_star_count[index] += total_pulls % gacha.free_pity == 0
+
+    pulls_since_six_star = pop.pulls_since_six_star[index] + 1
+    pulls_since_five_star = pop.pulls_since_five_star[index] + 1
+    pulls_since_up = pop.pulls_since_up[index] + 1
+    has_hard_pity = pop.has_hard_pity[index]
+
+    six_star_rate = rates[np.minimum(pulls_since_six_star, gacha.soft_pity)]
+    # 大保底检查
+    force_up = has_hard_pity & (pulls_since_up >= gacha.hard_pity)
+    six_star_rate = np.where(force_up, 1.0, six_star_rate)
+    # 5星10抽保底
+    five_star_rate = np.where(pulls_since_five_star >= gacha.five_star_soft_pity, 1.0,
+                              gacha.five_star_rate + six_star_rate)
+
+    # 出6星时 u/six_star_rate 在[0,1)上均匀分布，复用同一随机数判定是否UP
+    u = rng.random_sample(index.size)
+    is_six_star = u <= six_star_rate
+    is_five_star = ~is_six_star & (u <= five_star_rate)
+    is_up = is_six_star & (force_up | (u <= six_star_rate * gacha.up_rate))
+
+    pop.pulls_since_six_star[index] = np.where(is_six_star, 0, pulls_since_six_star)
+    pop.pulls_since_five_star[index] = np.where(is_six_star | is_five_star, 0, pulls_since_five_star)
+    pop.pulls_since_up[index] = np.where(is_up, 0, pulls_since_up)
+    pop.has_hard_pity[index] = has_hard_pity & ~is_up
+    pop.up_six_star_count[index] += is_up
+    pop.weapon_ticket[index] += np.where(is_six_star, gacha.six_star_weapon_ticket,
+                                         np.where(is_five_star, gacha.five_star_weapon_ticket,
+                                                  gacha.four_star_weapon_ticket))
+
+def _pull_weapon_ten(pop, index, weapon_rates, weapon_gacha, rng):
+    """
+    index对应的玩家各十连抽一次武器池，机制与GachaWeapon.pull_ten一致
+    """
+    pulls_since_six_star = pop.weapon_pulls_since_six_star[index]
+    pulls_since_up = pop.weapon_pulls_since_up[index]
+    up_six_star_count = pop.weapon_up_six_star_count[index]
+    for i in range(10):
+        pulls_since_six_star += 1
+        pulls_since_up += 1
+
+        # 查表得到6星概率，大保底必出
+        force_up = pulls_since_up >= weapon_gacha.hard_pity
+        six_star_rate = np.where(force_up, 1.0,
+                                 weapon_rates[np.minimum(pulls_since_six_star, weapon_gacha.soft_pity)])
+
+        u = rng.random_sample(index.size)
+        is_six_star = u <= six_star_rate
+        is_up = is_six_star & (force_up | (u <= six_star_rate * weapon_gacha.up_rate))
+
+        pulls_since_six_star[is_six_star] = 0
+        pulls_since_up[is_up] = 0
+        up_six_star_count += is_up
+
+    pop.weapon_pulls_since_six_star[index] = pulls_since_six_star
+    pop.weapon_pulls_since_up[index] = pulls_since_up
+    pop.weapon_up_six_star_count[index] = up_six_star_count
+
+def _simulate_combined_batch(character_count, weapon_count, batch_size, rates, weapon_rates, char_gacha, weapon_gacha,
+                             rng):
+    results = np.zeros(batch_size, dtype=np.int64)
+    pop = _Population(batch_size)
+
+    while pop.player.size:
+        # 完成目标的玩家移出活跃集合
+        done = (pop.up_six_star_count >= character_count) & (pop.weapon_up_six_star_count >= weapon_count)
+        if done.any():
+            results[pop.player[done]] = pop.total_pulls[done]
+            pop.keep(~done)
+            if not pop.player.size:
+                break
+
+        # 武器票足够十连的玩家抽武器池，其余玩家抽角色池获取更多武器票
+        use_ticket = pop.weapon_ticket >= weapon_gacha.draw_need_ticket
+        weapon_index = np.flatnonzero(use_ticket)
+        char_index = np.flatnonzero(~use_ticket)
+        if weapon_index.size:
+            pop.weapon_ticket[weapon_index] -= weapon_gacha.draw_need_ticket
+            _pull_weapon_ten(pop, weapon_index, weapon_rates, weapon_gacha, rng)
+        if char_index.size:
+            _pull_character(pop, char_index, rates, char_gacha, rng)
+
+    return results
+
+def simulate_combined_population(character_count, weapon_count, num_simulations, batch_size=100000, seed=None):
+    """
+    向量化模拟zmd_mix.single_simulation_combined的武器票策略
+    返回: 每个玩家获得指定数量UP角色和UP武器所需角色抽数的数组
+    """
+    char_gacha = GachaCharacter()
+    weapon_gacha = GachaWeapon()
+    rates = _six_star_rate_table(char_gacha)
+    weapon_rates = _six_star_rate_table(weapon_gacha)
+    rng = np.random.RandomState(seed)
+
+    # 分批推进，限制单批数组占用的内存
+    results = []
+    for start in range(0, num_simulations, batch_size):
+        size = min(batch_size, num_simulations - start)
+        results.append(_simulate_combined_batch(character_count, weapon_count, size, rates, weapon_rates,
+                                                char_gacha, weapon_gacha, rng))
+    return np.concatenate(results) if results else np.zeros(0, dtype=np.int64)
+
+def population_histogram(results):
+    """
+    将抽数数组转换为报告使用的直方图
+    """
+    return np.bincount(results).tolist()